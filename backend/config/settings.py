@@ -83,6 +83,113 @@ DATABASES = {
     }
 }
 
+# Caches
+# "default" stays per-process; "shared" lives in Postgres so every worker
+# sees the same entries. Its table is created by `migrate` (migration
+# trips.0014); a DatabaseCache alias added later needs
+# `python manage.py createcachetable` once.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'hos_shared_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('SHARED_CACHE_MAX_ENTRIES', '5000')),
+        },
+    },
+}
+
+# ORS route cache (trips.services.ors.RouteCache)
+ORS_ROUTE_CACHE_ALIAS = 'shared'
+ORS_ROUTE_CACHE_SIZE = int(os.environ.get('ORS_ROUTE_CACHE_SIZE', '128'))
+ORS_ROUTE_CACHE_TTL = int(os.environ.get('ORS_ROUTE_CACHE_TTL', str(24 * 3600)))
+# Base URL of the ORS API (a self-hosted instance or `manage.py run_upstream_stub`)
+ORS_URL = os.environ.get('ORS_URL', 'https://api.openrouteservice.org')
+
+# Geocode search result cache (trips.services.geocode.GeocodeCache), keyed by
+# the normalized query for all clients; empty results are kept for an hour.
+GEOCODE_CACHE_ALIAS = 'shared'
+GEOCODE_CACHE_SIZE = int(os.environ.get('GEOCODE_CACHE_SIZE', '512'))
+GEOCODE_CACHE_TTL = int(os.environ.get('GEOCODE_CACHE_TTL', str(7 * 24 * 3600)))
+# Expired results are kept this much longer, served while Nominatim's rate limit is saturated
+GEOCODE_CACHE_STALE_TTL = int(os.environ.get('GEOCODE_CACHE_STALE_TTL', str(30 * 24 * 3600)))
+# Base URL of the Nominatim API (a self-hosted instance or `manage.py run_upstream_stub`)
+NOMINATIM_URL = os.environ.get('NOMINATIM_URL', 'https://nominatim.openstreetmap.org')
+
+# Offline gazetteer (trips.services.gazetteer) for geocode search/reverse:
+# "nominatim" (default), "local" or "local_then_nominatim". GAZETTEER_PATH is
+# a CSV/TSV places file (held in memory) or an SQLite file from
+# `manage.py build_gazetteer` (FTS5, for large datasets).
+GEOCODER_MODE = os.environ.get('GEOCODER_MODE', 'nominatim')
+GAZETTEER_PATH = os.environ.get('GAZETTEER_PATH', '')
+GEOCODE_REVERSE_MAX_KM = float(os.environ.get('GEOCODE_REVERSE_MAX_KM', '25'))
+
+# Outbound HTTP (trips.services.http_client): per-upstream timeouts, retries,
+# pool size and circuit breaker. Unset keys fall back to the client defaults.
+# async_pool_size caps concurrent connections of the async views' client.
+UPSTREAM_HTTP = {
+    'ors': {
+        'connect_timeout': float(os.environ.get('ORS_CONNECT_TIMEOUT', '3.05')),
+        'read_timeout': float(os.environ.get('ORS_READ_TIMEOUT', '20')),
+        'max_retries': 2,
+    },
+    'nominatim': {
+        'connect_timeout': float(os.environ.get('NOMINATIM_CONNECT_TIMEOUT', '3.05')),
+        'read_timeout': float(os.environ.get('NOMINATIM_READ_TIMEOUT', '5')),
+        'max_retries': 1,
+    },
+}
+
+# Single-flight coalescing (trips.services.single_flight): concurrent
+# identical upstream calls wait on one in-flight call, across workers through
+# a lock in this cache alias. Waiters give up and call upstream themselves
+# after `wait` seconds; `lock_ttl` bounds a crashed holder.
+SINGLE_FLIGHT = {
+    'ors': {'alias': 'shared', 'lock_ttl': 60.0, 'wait': 30.0, 'poll_interval': 0.2},
+    'nominatim': {'alias': 'shared', 'lock_ttl': 20.0, 'wait': 15.0, 'poll_interval': 0.05},
+}
+
+# Cluster-wide outbound rate limits (trips.services.rate_limit), kept in the
+# shared cache. Nominatim's usage policy allows 1 request/s; callers queue for
+# up to max_wait seconds before getting a stale result or a 503.
+UPSTREAM_RATE_LIMITS = {
+    'nominatim': {
+        'alias': 'shared',
+        'rate': float(os.environ.get('NOMINATIM_RATE_LIMIT', '1')),
+        'max_wait': float(os.environ.get('NOMINATIM_MAX_WAIT', '5')),
+    },
+}
+
+# Serve the geocode views as async views (config.asgi under an ASGI server
+# such as uvicorn): Nominatim round trips and rate-limit waits then run on
+# the event loop instead of blocking a thread each. Under WSGI every request would get its own event loop and
+# connection pool, so leave this off there.
+ASYNC_UPSTREAM_VIEWS = os.environ.get('ASYNC_UPSTREAM_VIEWS', 'False') == 'True'
+
+# Async trip planning (trips.services.plan_jobs). When enabled, POST /api/trips/
+# queues planning and returns 202; `manage.py run_plan_workers` executes jobs.
+TRIP_PLAN_ASYNC = os.environ.get('TRIP_PLAN_ASYNC', 'False') == 'True'
+PLAN_WORKERS = int(os.environ.get('PLAN_WORKERS', '2'))
+PLAN_JOB_TIMEOUT = int(os.environ.get('PLAN_JOB_TIMEOUT', '600'))
+
+# Daily log SVG rendering (trips.services.svg_log_sheet). Above 1, the days of
+# a trip render in a shared process pool; worthwhile only with spare cores.
+SVG_RENDER_WORKERS = int(os.environ.get('SVG_RENDER_WORKERS', '1'))
+
+# Generated log SVGs and PDFs live in a content-addressed store under
+# MEDIA_ROOT/artifacts (trips.services.artifacts). Past the size limit the
+# least recently used artifacts are evicted down to the low-water fraction.
+ARTIFACT_STORE_MAX_BYTES = int(os.environ.get('ARTIFACT_STORE_MAX_BYTES', str(512 * 1024 * 1024)))
+ARTIFACT_STORE_LOW_WATER = float(os.environ.get('ARTIFACT_STORE_LOW_WATER', '0.9'))
+
+# Daily log PDF export (trips.services.log_pdf)
+LOG_PDF_WORKERS = int(os.environ.get('LOG_PDF_WORKERS', '4'))
+# Stamp each day's overlay on a once-converted blank template instead of
+# converting every full page
+LOG_PDF_OVERLAY = os.environ.get('LOG_PDF_OVERLAY', 'True') == 'True'
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -1,6 +1,8 @@
 from django.contrib import admin
-from .models import Trip, TripLeg, TripSegmentStep
+from .models import Trip, TripLeg, TripSegmentStep, PlanJob, DailyLog
 
 admin.site.register(Trip)
 admin.site.register(TripLeg)
 admin.site.register(TripSegmentStep)
+admin.site.register(PlanJob)
+admin.site.register(DailyLog)
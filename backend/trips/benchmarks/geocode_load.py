@@ -0,0 +1,162 @@
+"""
+Load test: geocode search through the ASGI handler against the local
+Nominatim stand-in (benchmarks.upstream_stub).
+
+Requests go straight into django.core.handlers.asgi.ASGIHandler on one
+event loop (one ASGI worker, no server process), with up to `concurrency`
+in flight. Every query is a distinct single word, so each one misses the
+geocode cache, makes one upstream call (no first-word fallback) and waits
+`latency` seconds on the stub. For the duration of the run the
+caches are swapped for local memory and the Nominatim rate limit is
+lifted (the stub has no usage policy), so what is measured is how many
+upstream round trips one worker keeps in flight, and how many threads it
+takes to do so:
+
+async -> AsyncGeocodeSearchView: one coroutine per request, bounded by the
+         async client's pool
+sync  -> GeocodeSearchView, which Django runs under ASGI in a thread per
+         request, blocked on the upstream for the whole round trip
+
+Under ASGI Django also runs each request's sync middleware in a thread of
+that request's own, so the thread count is about one per request either
+way; with the async view those threads sit idle while the call is out.
+On a single core the two views are CPU-bound at similar throughput.
+"""
+import asyncio
+import statistics
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.handlers.asgi import ASGIHandler
+from django.test import override_settings
+from django.urls import path
+
+from trips.benchmarks.upstream_stub import UpstreamStub
+from trips.services import geocode
+from trips.views import AsyncGeocodeSearchView, GeocodeSearchView
+
+DEFAULT_REQUESTS = 1000
+DEFAULT_CONCURRENCY = 500
+DEFAULT_LATENCY = 0.5
+VIEWS = ("async", "sync")
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "loadtest-default"},
+    "shared": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "loadtest-shared"},
+}
+
+urlpatterns = [
+    path("async/geocode/search/", AsyncGeocodeSearchView.as_view()),
+    path("sync/geocode/search/", GeocodeSearchView.as_view()),
+]
+
+
+async def asgi_get(app, url_path, params, headers=()):
+    """Send one GET through an ASGI application in-process; returns the response status."""
+    query_string = urlencode(params).encode()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": url_path,
+        "raw_path": url_path.encode(),
+        "query_string": query_string,
+        "root_path": "",
+        "headers": [(b"host", b"loadtest"), *headers],
+        "client": ("127.0.0.1", 40000),
+        "server": ("loadtest", 80),
+    }
+    request_sent = False
+    finished = asyncio.Event()
+    status = None
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        finished.set()
+    return status
+
+
+async def _load(view, requests, concurrency, latency):
+    stub = await UpstreamStub(latency=latency).start()
+    app = ASGIHandler()
+    referer = getattr(settings, "TRUSTED_REFERER", "") or "http://loadtest"
+    headers = [(b"referer", referer.encode())]
+    limit = asyncio.Semaphore(concurrency)
+    latencies, statuses = [], Counter()
+    peak_threads = threading.active_count()
+
+    async def count_threads():
+        nonlocal peak_threads
+        while True:
+            peak_threads = max(peak_threads, threading.active_count())
+            await asyncio.sleep(0.05)
+
+    async def one(index):
+        async with limit:
+            start = time.perf_counter()
+            status = await asgi_get(app, f"/{view}/geocode/search/", {"q": f"{view}place{index}"}, headers)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+
+    sampler = asyncio.create_task(count_threads())
+    try:
+        with override_settings(**stub.settings()):
+            start = time.perf_counter()
+            await asyncio.gather(*(one(index) for index in range(requests)))
+            elapsed = time.perf_counter() - start
+    finally:
+        sampler.cancel()
+        await geocode.nominatim_async_client.aclose()
+        await stub.stop()
+
+    latencies.sort()
+    return {
+        "view": view,
+        "requests": requests,
+        "concurrency": concurrency,
+        "elapsed_s": elapsed,
+        "requests_per_s": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+        "upstream_calls": stub.requests["search"],
+        "upstream_max_in_flight": stub.max_in_flight,
+        "peak_threads": peak_threads,
+        "errors": requests - statuses[200],
+    }
+
+
+def run(requests=DEFAULT_REQUESTS, concurrency=DEFAULT_CONCURRENCY, latency=DEFAULT_LATENCY, views=("async",)):
+    """Return one result row per view in `views` ("async", "sync")."""
+    rows = []
+    rate = geocode.nominatim_bucket.rate
+    geocode.nominatim_bucket.rate = 0
+    try:
+        with override_settings(ROOT_URLCONF=__name__, ALLOWED_HOSTS=["loadtest"], CACHES=LOCMEM_CACHES,
+                               GEOCODER_MODE="nominatim"):
+            for view in views:
+                geocode.geocode_cache.clear_local()
+                for alias in LOCMEM_CACHES:
+                    caches[alias].clear()
+                rows.append(asyncio.run(_load(view, requests, concurrency, latency)))
+    finally:
+        geocode.nominatim_bucket.rate = rate
+    return rows
@@ -0,0 +1,56 @@
+"""
+Benchmark: per-day PDF conversion of daily log sheets.
+
+svg2pdf  -> cairosvg converts the full rendered page (template + day)
+overlay  -> cairosvg converts only the day's overlay, stamped onto the
+            blank template converted once beforehand (not timed)
+
+Needs a working cairosvg (libcairo installed).
+"""
+import tempfile
+import time
+from pathlib import Path
+
+import cairosvg
+from django.test import override_settings
+
+from trips.benchmarks.svg_render import synthetic_logs
+from trips.services import log_pdf
+from trips.services.svg_log_sheet import SVG_PATH, compile_template, render_svgs
+
+DEFAULT_DAYS = 7
+
+
+def run(days=DEFAULT_DAYS, repeat=3):
+    """Return best-of-`repeat` seconds per day for both paths and the speedup."""
+    template = compile_template(SVG_PATH)
+    with tempfile.TemporaryDirectory() as tmp, override_settings(MEDIA_ROOT=tmp):
+        out = Path(tmp)
+        svg_files = [out / f"day-{i}.svg" for i in range(days)]
+        render_svgs(synthetic_logs(days), svg_files, workers=1)
+        overlays = [template.overlay(svg_file.read_bytes()) for svg_file in svg_files]
+
+        start = time.perf_counter()
+        log_pdf.template_background(SVG_PATH)
+        background_s = time.perf_counter() - start
+
+        svg2pdf_s = overlay_s = float("inf")
+        target = out / "page.pdf"
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for svg_file in svg_files:
+                cairosvg.svg2pdf(url=str(svg_file), write_to=str(target))
+            svg2pdf_s = min(svg2pdf_s, (time.perf_counter() - start) / days)
+
+            start = time.perf_counter()
+            for overlay in overlays:
+                log_pdf.write_overlay_page(overlay, target)
+            overlay_s = min(overlay_s, (time.perf_counter() - start) / days)
+
+    return {
+        "days": days,
+        "background_s": background_s,
+        "svg2pdf_s": svg2pdf_s,
+        "overlay_s": overlay_s,
+        "speedup": svg2pdf_s / overlay_s,
+    }
@@ -0,0 +1,207 @@
+"""
+Benchmark suite: the trip planning and log rendering pipeline, stage by
+stage, on synthetic routes.
+
+Each case is a route length, a vertex count and a start cycle. The route
+is a synthetic ORS directions answer (benchmarks.upstream_stub) running
+west from Chicago with the pickup a fifth of the way, and goes through the
+stages plan_trip and the log views take it through:
+
+ingest      -> ors._parse_directions: polyline decode, cumulative miles and
+               step coordinates (build_cumulative_coords before route_ingest)
+hos         -> chunk_legs_by_hos
+daily_logs  -> build_daily_logs on the unsaved legs plan_trip would store
+               (generate_daily_logs without the query)
+svg         -> inject_duty_periods_into_svg
+pdf         -> build_logs_pdf on an empty artifact store: what download_logs
+               does for logs it has not merged before (needs cairosvg)
+
+Every stage reports its best-of-`repeat` seconds and the peak memory
+tracemalloc sees in one more, untimed, run (the SVG stage renders in
+process unless `workers` says otherwise, so its memory is seen too).
+
+run() returns a JSON-ready dict; compare() lists the stages of a run that
+are slower or use more memory than in a baseline run by more than a
+threshold, ignoring differences within NOISE_FLOOR.
+"""
+import copy
+import itertools
+import math
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.test import override_settings
+
+from trips.benchmarks.upstream_stub import MILES_PER_DEGREE, ROAD_FACTOR, directions_response
+from trips.models import Trip
+from trips.services import ors, route_ingest
+from trips.services.generate_daily_logs import build_daily_logs
+from trips.services.hos import chunk_legs_by_hos
+from trips.services.plan import _build_legs
+from trips.services.svg_log_sheet import SVG_PATH, compile_template, inject_duty_periods_into_svg
+
+# (route miles, vertices)
+DEFAULT_ROUTES = ((100, 1_000), (500, 10_000), (1_000, 100_000), (5_000, 1_000_000))
+DEFAULT_CYCLE_HOURS = (0, 35, 69)
+STAGES = ("ingest", "hos", "daily_logs", "svg", "pdf")
+DEFAULT_THRESHOLD = 0.25
+# Differences below these are noise, whatever the ratio
+NOISE_FLOOR = {"seconds": 0.005, "peak_bytes": 256 * 1024}
+ORIGIN = (-87.63, 41.88)
+DEPARTURE = datetime(2026, 3, 2, 6, 0, tzinfo=timezone.utc)
+
+
+def route_waypoints(miles):
+    """Current, pickup and dropoff [lon, lat], `miles` / ROAD_FACTOR apart in a straight line."""
+    lon, lat = ORIGIN
+    span = miles / ROAD_FACTOR / (MILES_PER_DEGREE * math.cos(math.radians(lat)))
+    return [[lon, lat], [round(lon - span / 5, 5), lat], [round(lon - span, 5), lat]]
+
+
+def case_name(miles, vertices, cycle_hours):
+    return f"{miles}mi-{vertices}v-{cycle_hours}h"
+
+
+def _measure(stage, make_args, repeat):
+    """Best-of-`repeat` seconds of stage(*make_args()), then its peak traced memory; setup is not measured."""
+    best = float("inf")
+    for _ in range(repeat):
+        args = make_args()
+        start = time.perf_counter()
+        result = stage(*args)
+        best = min(best, time.perf_counter() - start)
+
+    args = make_args()
+    tracemalloc.start()
+    try:
+        stage(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, {"seconds": best, "peak_bytes": peak}
+
+
+def _build_logs_pdf(svg_files, media_root):
+    # Imported here so the other stages run without libcairo
+    from trips.services.log_pdf import build_logs_pdf
+
+    with override_settings(MEDIA_ROOT=media_root):
+        return build_logs_pdf(svg_files)
+
+
+def run_case(miles, vertices, cycle_hours, payload, output_dir, stages=STAGES, repeat=3, workers=1):
+    """Measure the stages of one case on `payload`, its directions answer; each stage takes the last one's output."""
+    coordinates = route_waypoints(miles)
+    measured = {}
+
+    route, measured["ingest"] = _measure(ors._parse_directions, lambda: (copy.deepcopy(payload),), repeat)
+    geometry = route["geometry"]
+
+    def chunk(segments):
+        return chunk_legs_by_hos(segments, coordinates, cycle_hours, geometry, route["distance_miles"])
+
+    hos_legs, measured["hos"] = _measure(chunk, lambda: (copy.deepcopy(route["segments"]),), repeat)
+
+    trip = Trip(
+        name="Benchmark", current_location_label="Chicago, IL", pickup_location_label="Pickup",
+        dropoff_location_label="Dropoff", current_cycle_hours=cycle_hours, departure_time=DEPARTURE,
+        current_location_lon=coordinates[0][0], current_location_lat=coordinates[0][1],
+        pickup_location_lon=coordinates[1][0], pickup_location_lat=coordinates[1][1],
+        dropoff_location_lon=coordinates[2][0], dropoff_location_lat=coordinates[2][1],
+    )
+    legs, _ = _build_legs(trip, copy.deepcopy(hos_legs))
+    logs, measured["daily_logs"] = _measure(build_daily_logs, lambda: (legs,), repeat)
+
+    name = case_name(miles, vertices, cycle_hours)
+    if "svg" in stages or "pdf" in stages:
+        _, measured["svg"] = _measure(
+            lambda batch: inject_duty_periods_into_svg(batch, name, output_dir=output_dir, workers=workers),
+            lambda: (copy.deepcopy(logs),), repeat,
+        )
+    if "pdf" in stages:
+        svg_files = [Path(output_dir) / name / "logs" / f"output-{log['date']}.svg" for log in logs]
+        runs = itertools.count()
+        # A fresh MEDIA_ROOT per run, so every run converts and merges from scratch
+        _, measured["pdf"] = _measure(
+            _build_logs_pdf, lambda: (svg_files, Path(output_dir) / f"{name}-pdf-{next(runs)}"), repeat,
+        )
+
+    return {
+        "case": name,
+        "miles": miles,
+        "vertices": vertices,
+        "cycle_hours": cycle_hours,
+        "route_miles": geometry.total_miles,
+        "legs": len(legs),
+        "days": len(logs),
+        "stages": {stage: measured[stage] for stage in stages if stage in measured},
+    }
+
+
+def run(routes=DEFAULT_ROUTES, cycle_hours=DEFAULT_CYCLE_HOURS, stages=STAGES, repeat=3, workers=1):
+    """Return the results of every (route, cycle hours) case, with details of the run."""
+    compile_template(SVG_PATH)
+    cases = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for miles, vertices in routes:
+            # Building and encoding a long synthetic route is setup, shared by its cycles
+            payload = directions_response(
+                {"coordinates": route_waypoints(miles), **ors.DIRECTIONS_OPTIONS}, miles, vertices=vertices,
+            )
+            for hours in cycle_hours:
+                cases.append(run_case(miles, vertices, hours, payload, tmp, stages, repeat, workers))
+
+    return {
+        "meta": {
+            "commit": _commit(),
+            "python": platform.python_version(),
+            "numpy": route_ingest.np is not None,
+            "machine": platform.machine(),
+            "repeat": repeat,
+            "workers": workers,
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        },
+        "cases": cases,
+    }
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Stage measurements in `results` worse than the same case and stage in
+    `baseline` by more than `threshold` (0.25 = 25%), as dicts. Cases or
+    stages missing from the baseline are skipped.
+    """
+    before = {case["case"]: case["stages"] for case in baseline.get("cases", [])}
+    regressions = []
+    for case in results["cases"]:
+        for stage, measured in case["stages"].items():
+            old = before.get(case["case"], {}).get(stage)
+            if old is None:
+                continue
+            for metric, floor in NOISE_FLOOR.items():
+                current, previous = measured[metric], old[metric]
+                if current > previous * (1 + threshold) and current - previous > floor:
+                    regressions.append({
+                        "case": case["case"],
+                        "stage": stage,
+                        "metric": metric,
+                        "baseline": previous,
+                        "current": current,
+                        "change": current / previous - 1 if previous else math.inf,
+                    })
+    return regressions
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,79 @@
+"""
+Micro-benchmark: legacy route ingestion vs the batched NumPy pipeline.
+
+legacy   -> polyline.decode, rebuild (lon, lat) tuples, per-vertex haversine
+python   -> route_ingest pure-Python fallback (no NumPy)
+numpy    -> route_ingest NumPy path
+"""
+import random
+import time
+
+import polyline
+
+from trips.services import route_ingest
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+
+
+def synthetic_polyline(points: int, seed: int = 42) -> str:
+    """Encoded polyline of a random walk heading roughly east across the US."""
+    rnd = random.Random(seed)
+    lat, lon = 41.88, -87.63
+    coords = []
+    for _ in range(points):
+        lat += rnd.uniform(-0.0004, 0.0004)
+        lon += rnd.uniform(-0.0002, 0.0006)
+        coords.append((lat, lon))
+    return polyline.encode(coords, precision=5)
+
+
+def legacy_ingest(encoded: str):
+    decoded = polyline.decode(encoded, precision=5)
+    coords = [(lon, lat) for lat, lon in decoded]
+    cum = []
+    total = 0.0
+    prev_lon, prev_lat = coords[0]
+    cum.append((0.0, prev_lon, prev_lat))
+    for (lon, lat) in coords[1:]:
+        total += route_ingest.haversine_distance_miles(prev_lon, prev_lat, lon, lat)
+        cum.append((total, lon, lat))
+        prev_lon, prev_lat = lon, lat
+    return cum
+
+
+def python_ingest(encoded: str):
+    lons, lats = route_ingest._decode_polyline_python(encoded, 5)
+    return route_ingest._cumulative_miles_python(lons, lats)
+
+
+def numpy_ingest(encoded: str):
+    lons, lats = route_ingest._decode_polyline_numpy(encoded, 5)
+    return route_ingest._cumulative_miles_numpy(lons, lats)
+
+
+def _best_of(fn, arg, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(sizes=DEFAULT_SIZES, repeat=3):
+    """Return one result row per route size (best-of-`repeat` seconds)."""
+    rows = []
+    for size in sizes:
+        encoded = synthetic_polyline(size)
+        row = {
+            "points": size,
+            "legacy_s": _best_of(legacy_ingest, encoded, repeat),
+            "python_s": _best_of(python_ingest, encoded, repeat),
+            "numpy_s": None,
+            "speedup": None,
+        }
+        if route_ingest.np is not None:
+            row["numpy_s"] = _best_of(numpy_ingest, encoded, repeat)
+            row["speedup"] = row["legacy_s"] / row["numpy_s"]
+        rows.append(row)
+    return rows
@@ -0,0 +1,73 @@
+"""
+Benchmark: serial vs parallel daily log SVG rendering.
+
+serial    -> inject_duty_periods_into_svg(workers=1)
+parallel  -> inject_duty_periods_into_svg(workers=N), shared process pool
+
+The pool is warmed before timing, as it is in a long-running server.
+"""
+import copy
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from trips.services.svg_log_sheet import SVG_PATH, compile_template, inject_duty_periods_into_svg
+
+DEFAULT_DAYS = (1, 7, 30)
+STATUSES = ("off_duty", "sleeper_berth", "driving", "on_duty")
+
+
+def synthetic_logs(days: int, seed: int = 42):
+    """Daily logs with a random duty timeline per day."""
+    rnd = random.Random(seed)
+    logs = []
+    for day in range(days):
+        periods = []
+        minute = 0
+        while minute < 24 * 60 - 1:
+            end = min(minute + rnd.randint(15, 300), 24 * 60 - 1)
+            periods.append({
+                "status": rnd.choice(STATUSES),
+                "start": f"{minute // 60:02d}:{minute % 60:02d}",
+                "end": f"{end // 60:02d}:{end % 60:02d}",
+            })
+            minute = end
+        logs.append({
+            "date": f"2026-{1 + day // 28:02d}-{1 + day % 28:02d}",
+            "day": 1 + day % 28, "month": "January", "year": 2026,
+            "from_location": "Chicago, IL", "to_location": "Dallas, TX",
+            "duty_periods": periods, "total_miles": round(rnd.uniform(0, 700), 2),
+        })
+    return logs
+
+
+def _best_of(logs, workers, output_dir, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        batch = copy.deepcopy(logs)
+        start = time.perf_counter()
+        inject_duty_periods_into_svg(batch, "bench", output_dir=output_dir, workers=workers)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(days=DEFAULT_DAYS, workers=4, repeat=5):
+    """Return one result row per trip length (best-of-`repeat` seconds)."""
+    compile_template(SVG_PATH)
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        output_dir = Path(tmp)
+        # Warm the pool so fork and per-worker template compilation are not timed
+        inject_duty_periods_into_svg(synthetic_logs(workers * 2), "warmup", output_dir=output_dir, workers=workers)
+        for count in days:
+            logs = synthetic_logs(count)
+            serial_s = _best_of(logs, 1, output_dir, repeat)
+            parallel_s = _best_of(logs, workers, output_dir, repeat)
+            rows.append({
+                "days": count,
+                "serial_s": serial_s,
+                "parallel_s": parallel_s,
+                "speedup": serial_s / parallel_s,
+            })
+    return rows
@@ -0,0 +1,477 @@
+"""
+Local stand-in for the ORS and Nominatim APIs, so plan_trip, get_route and
+the geocode views can be benchmarked and load-tested offline.
+
+UpstreamStub is a small asyncio HTTP server answering
+
+  POST /v2/directions/<profile>   ORS directions (encoded polyline geometry)
+  POST /optimization              ORS optimization (jobs visited in order)
+  GET  /search, /reverse          Nominatim
+
+Point the app at it with the ORS_URL and NOMINATIM_URL settings
+(stub.settings()). Answers are replayed from recorded fixtures when a
+fixture directory holds one for the request, and synthetic otherwise:
+
+  - routes zig-zag between the requested waypoints, `route_miles` long in
+    all (default: the straight-line distance times ROAD_FACTOR) with
+    `vertices_per_mile` vertices;
+  - a search finds one place at a position derived from the query, and a
+    reverse lookup names the point it was given.
+
+With `record`, requests that have no fixture are forwarded to the real
+APIs and the answers saved as fixtures, so one online run (ORS_KEY set)
+captures a set of lanes for later offline runs.
+
+Every answer waits `latency` seconds plus up to `jitter` more, and a
+fraction `error_rate` of requests fails with `error_status` instead.
+
+Run it in-process (`await stub.start()`, or `with stub.running():` around
+sync code) or as a server: `manage.py run_upstream_stub`.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+from http import HTTPStatus
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+
+import httpx
+import polyline
+
+from trips.services import geocode, ors
+from trips.services.route_ingest import build_route_geometry
+
+ROAD_FACTOR = 1.2
+DEFAULT_VERTICES_PER_MILE = 10
+DEFAULT_MPH = 55.0
+STEP_MILES = 25.0
+MILES_PER_DEGREE = 69.0
+UNITS_PER_MILE = {"mi": 1.0, "km": 1.609344, "m": 1609.344}
+# Synthetic search results land in the continental US
+SEARCH_BOUNDS = ((25.0, 49.0), (-124.0, -67.0))
+
+StubRequest = namedtuple("StubRequest", "method path query body")
+
+
+def synthetic_route(waypoints, miles=None, vertices_per_mile=DEFAULT_VERTICES_PER_MILE, vertices=None,
+                    precision=5):
+    """
+    A route through `waypoints` ([lon, lat] pairs) as (lons, lats, way_points):
+    vertex coordinates, and the index of each waypoint among them.
+
+    Each leg zig-zags between its two waypoints so that the legs add up to
+    about `miles` (shared in proportion to their straight-line distances,
+    and never shorter than those). The route has `vertices` vertices if
+    given, else `vertices_per_mile` for every mile. Coordinates are rounded
+    to `precision` decimals, as an encoded polyline would carry them (None
+    keeps them exact; rounding adds length once vertices are closer than a
+    few meters).
+    """
+    straight = [_straight_miles(start, end) for start, end in zip(waypoints, waypoints[1:])]
+    total_straight = sum(straight)
+    if miles is None:
+        leg_miles = [distance * ROAD_FACTOR for distance in straight]
+    elif total_straight:
+        leg_miles = [miles * distance / total_straight for distance in straight]
+    else:
+        leg_miles = [miles / len(straight)] * len(straight)
+    total_miles = sum(leg_miles)
+
+    lons, lats, way_points = [], [], [0]
+    for (start, end), length in zip(zip(waypoints, waypoints[1:]), leg_miles):
+        if vertices is not None:
+            share = length / total_miles if total_miles else 1 / len(leg_miles)
+            count = max(2, round(vertices * share))
+        else:
+            count = max(2, round(length * vertices_per_mile) + 1)
+        leg_lons, leg_lats = _zigzag(start, end, length, count)
+        # Consecutive legs share the waypoint between them
+        skip = 1 if lons else 0
+        lons.extend(leg_lons[skip:])
+        lats.extend(leg_lats[skip:])
+        way_points.append(len(lons) - 1)
+
+    if precision is not None:
+        lons = [round(lon, precision) for lon in lons]
+        lats = [round(lat, precision) for lat in lats]
+    return lons, lats, way_points
+
+
+def _straight_miles(start, end):
+    (lon1, lat1), (lon2, lat2) = start, end
+    x_scale = MILES_PER_DEGREE * math.cos(math.radians((lat1 + lat2) / 2))
+    return math.hypot((lon2 - lon1) * x_scale, (lat2 - lat1) * MILES_PER_DEGREE)
+
+
+def _zigzag(start, end, miles, count):
+    """
+    `count` vertices from start to end along a triangle wave about `miles`
+    long. The wave is four straight quarters per tooth (out, back, out the
+    other side, back), and every quarter gets its share of the vertices, so
+    the corners are vertices and the length comes out as computed.
+    """
+    (lon1, lat1), (lon2, lat2) = start, end
+    x_scale = MILES_PER_DEGREE * math.cos(math.radians((lat1 + lat2) / 2))
+    dx, dy = (lon2 - lon1) * x_scale, (lat2 - lat1) * MILES_PER_DEGREE
+    straight = math.hypot(dx, dy)
+    ux, uy = (dx / straight, dy / straight) if straight else (1.0, 0.0)
+
+    intervals = count - 1
+    quarters = 4 * max(1, intervals // 8) if intervals >= 4 else 1
+    # Each tooth moves 4 * amplitude sideways
+    amplitude = math.sqrt(max(miles * miles - straight * straight, 0.0)) / quarters if quarters > 1 else 0.0
+    corners = [0.0, 1.0, 0.0, -1.0]
+
+    lons, lats = [], []
+    for quarter in range(quarters):
+        per_quarter = intervals // quarters + (1 if quarter < intervals % quarters else 0)
+        wave_from, wave_to = corners[quarter % 4], corners[(quarter + 1) % 4]
+        for i in range(per_quarter):
+            fraction = i / per_quarter
+            t = (quarter + fraction) / quarters
+            offset = amplitude * (wave_from + (wave_to - wave_from) * fraction)
+            x = t * dx - uy * offset
+            y = t * dy + ux * offset
+            lons.append(lon1 + x / x_scale)
+            lats.append(lat1 + y / MILES_PER_DEGREE)
+    lons.append(lon2)
+    lats.append(lat2)
+    return lons, lats
+
+
+def directions_response(payload, miles=None, vertices_per_mile=DEFAULT_VERTICES_PER_MILE, mph=DEFAULT_MPH,
+                        vertices=None):
+    """An ORS directions answer for a request body, with one segment per leg and a step per STEP_MILES."""
+    lons, lats, way_points = synthetic_route(payload["coordinates"], miles, vertices_per_mile, vertices)
+    cumulative = build_route_geometry(lons, lats).miles
+    unit = UNITS_PER_MILE[payload.get("units", "m")]
+
+    segments = []
+    for leg, (start, end) in enumerate(zip(way_points, way_points[1:])):
+        leg_miles = cumulative[end] - cumulative[start]
+        count = max(1, math.ceil(leg_miles / STEP_MILES))
+        bounds = [start + round(j * (end - start) / count) for j in range(count + 1)]
+        steps = []
+        for j, (first, last) in enumerate(zip(bounds, bounds[1:])):
+            step_miles = cumulative[last] - cumulative[first]
+            steps.append({
+                "distance": round(step_miles * unit, 1),
+                "duration": round(step_miles / mph * 3600, 1),
+                "type": 11 if j == 0 else 6,
+                "instruction": "Head out on Stub Highway" if j == 0 else "Continue on Stub Highway",
+                "name": "Stub Highway",
+                "way_points": [first, last],
+            })
+        steps.append({
+            "distance": 0.0,
+            "duration": 0.0,
+            "type": 10,
+            "instruction": f"Arrive at waypoint {leg + 1}",
+            "name": "-",
+            "way_points": [end, end],
+        })
+        segments.append({
+            "distance": round(leg_miles * unit, 1),
+            "duration": round(leg_miles / mph * 3600, 1),
+            "steps": steps,
+        })
+
+    return {
+        "routes": [{
+            "summary": {
+                "distance": round(cumulative[-1] * unit, 1),
+                "duration": round(cumulative[-1] / mph * 3600, 1),
+            },
+            "segments": segments,
+            "geometry": polyline.encode(list(zip(lats, lons)), precision=5),
+            "way_points": way_points,
+        }],
+        "metadata": {"service": "routing", "engine": {"version": "stub"}},
+    }
+
+
+def optimization_response(payload, miles=None, vertices_per_mile=DEFAULT_VERTICES_PER_MILE, mph=DEFAULT_MPH):
+    """An ORS optimization answer visiting the jobs in the order given."""
+    vehicle = payload["vehicles"][0]
+    jobs = payload.get("jobs", [])
+    waypoints = [vehicle["start"], *(job["location"] for job in jobs)]
+    if vehicle.get("end"):
+        waypoints.append(vehicle["end"])
+    lons, lats, way_points = synthetic_route(waypoints, miles, vertices_per_mile)
+    cumulative = build_route_geometry(lons, lats).miles
+
+    steps = [{"type": "start", "location": vehicle["start"], "arrival": 0, "duration": 0, "distance": 0}]
+    service = 0
+    for job, index in zip(jobs, way_points[1:]):
+        driven = round(cumulative[index] / mph * 3600)
+        steps.append({
+            "type": "job", "id": job["id"], "job": job["id"], "location": job["location"],
+            "service": job.get("service", 0), "arrival": driven + service, "duration": driven,
+            "distance": round(cumulative[index] * UNITS_PER_MILE["m"]),
+        })
+        service += job.get("service", 0)
+    duration = round(cumulative[-1] / mph * 3600)
+    distance = round(cumulative[-1] * UNITS_PER_MILE["m"])
+    if vehicle.get("end"):
+        steps.append({"type": "end", "location": vehicle["end"], "arrival": duration + service,
+                      "duration": duration, "distance": distance})
+
+    route = {
+        "vehicle": vehicle["id"], "cost": duration, "service": service,
+        "duration": duration, "distance": distance, "steps": steps,
+    }
+    if payload.get("options", {}).get("g"):
+        route["geometry"] = polyline.encode(list(zip(lats, lons)), precision=5)
+    return {
+        "code": 0,
+        "summary": {"cost": duration, "routes": 1, "unassigned": 0, "service": service,
+                    "duration": duration, "distance": distance},
+        "unassigned": [],
+        "routes": [route],
+    }
+
+
+def search_response(query):
+    """Nominatim search: one place per non-empty query, always at the same spot for the same query."""
+    q = query.get("q", "").strip()
+    if not q:
+        return []
+    digest = int(hashlib.sha256(q.lower().encode()).hexdigest(), 16)
+    (south, north), (west, east) = SEARCH_BOUNDS
+    lat = south + (digest % 10_000) / 10_000 * (north - south)
+    lon = west + (digest // 10_000 % 10_000) / 10_000 * (east - west)
+    return [{
+        "place_id": digest % 10 ** 9,
+        "osm_type": "node",
+        "lat": f"{lat:.5f}",
+        "lon": f"{lon:.5f}",
+        "display_name": f"{q.title()}, United States",
+        "class": "place",
+        "type": "city",
+        "importance": 0.5,
+    }]
+
+
+def reverse_response(query):
+    """Nominatim reverse: the point itself, named after its coordinates."""
+    lat, lon = float(query.get("lat", 0)), float(query.get("lon", 0))
+    return {
+        "place_id": abs(hash((round(lat, 4), round(lon, 4)))) % 10 ** 9,
+        "lat": f"{lat:.5f}",
+        "lon": f"{lon:.5f}",
+        "display_name": f"Stub Place {lat:.3f} {lon:.3f}, United States",
+    }
+
+
+class FixtureStore:
+    """Recorded upstream answers, one JSON file per distinct request."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    @staticmethod
+    def key(request: StubRequest) -> str:
+        raw = json.dumps([request.method, request.path, sorted(request.query.items()), request.body],
+                         sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:20]
+
+    def path(self, service: str, request: StubRequest) -> Path:
+        return self.directory / f"{service}-{self.key(request)}.json"
+
+    def load(self, service: str, request: StubRequest):
+        """(status, body) recorded for this request, or None."""
+        path = self.path(service, request)
+        if not path.exists():
+            return None
+        fixture = json.loads(path.read_text())
+        return fixture["status"], fixture["body"]
+
+    def save(self, service: str, request: StubRequest, status: int, body):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fixture = {"request": request._asdict(), "status": status, "body": body}
+        self.path(service, request).write_text(json.dumps(fixture, indent=1))
+
+
+class UpstreamStub:
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503,
+                 route_miles=None, vertices_per_mile=DEFAULT_VERTICES_PER_MILE, mph=DEFAULT_MPH,
+                 fixtures=None, record=False, ors_upstream=ors.ORS_URL,
+                 nominatim_upstream=geocode.NOMINATIM_URL, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.route_miles = route_miles
+        self.vertices_per_mile = vertices_per_mile
+        self.mph = mph
+        self.fixtures = FixtureStore(fixtures) if fixtures else None
+        self.record = record
+        self.upstreams = {"ors": ors_upstream.rstrip("/"), "nominatim": nominatim_upstream.rstrip("/")}
+        self.requests = Counter()
+        self.errors = 0
+        self.fixture_hits = 0
+        self.recorded = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.url = None
+        self._random = random.Random(seed)
+        self._server = None
+        self._writers = set()
+        self._recorder = None
+
+    def settings(self) -> dict:
+        """Settings that point the app's upstream clients at this stub."""
+        return {"ORS_URL": self.url, "NOMINATIM_URL": self.url}
+
+    async def start(self, host="127.0.0.1", port=0):
+        self._server = await asyncio.start_server(self._serve, host, port, backlog=4096)
+        host, port = self._server.sockets[0].getsockname()[:2]
+        self.url = f"http://{host}:{port}"
+        return self
+
+    async def stop(self):
+        self._server.close()
+        # wait_closed() also waits for keep-alive connections the clients still hold
+        for writer in self._writers:
+            writer.close()
+        await self._server.wait_closed()
+        if self._recorder is not None:
+            await self._recorder.aclose()
+            self._recorder = None
+
+    @contextmanager
+    def running(self, host="127.0.0.1", port=0):
+        """Serve from a background thread for the duration of the block, for sync callers."""
+        loop = asyncio.new_event_loop()
+        started = threading.Event()
+        failure = []
+
+        def serve():
+            try:
+                loop.run_until_complete(self.start(host, port))
+            except Exception as exc:
+                failure.append(exc)
+                started.set()
+                loop.close()
+                return
+            started.set()
+            loop.run_forever()
+            loop.run_until_complete(self.stop())
+            loop.close()
+
+        thread = threading.Thread(target=serve, name="upstream-stub", daemon=True)
+        thread.start()
+        started.wait()
+        if failure:
+            thread.join()
+            raise failure[0]
+        try:
+            yield self
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+
+    async def _serve(self, reader, writer):
+        self._writers.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                body = await reader.readexactly(length) if length else b""
+
+                method, target = request_line.decode("latin-1").split()[:2]
+                url = urlsplit(target)
+                request = StubRequest(method, url.path, dict(parse_qsl(url.query)), json.loads(body) if body else None)
+                status, answer = await self._answer(request)
+                payload = json.dumps(answer).encode()
+                writer.write(
+                    b"HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s"
+                    % (status, HTTPStatus(status).phrase.encode(), len(payload), payload)
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    def _route(self, request: StubRequest):
+        """(service, endpoint, synthetic answer) for a request, or None."""
+        if request.method == "POST" and "/v2/directions/" in request.path:
+            return "ors", "directions", lambda: directions_response(
+                request.body, self.route_miles, self.vertices_per_mile, self.mph)
+        if request.method == "POST" and request.path.endswith("/optimization"):
+            return "ors", "optimization", lambda: optimization_response(
+                request.body, self.route_miles, self.vertices_per_mile, self.mph)
+        if request.method == "GET" and request.path.endswith("/search"):
+            return "nominatim", "search", lambda: search_response(request.query)
+        if request.method == "GET" and request.path.endswith("/reverse"):
+            return "nominatim", "reverse", lambda: reverse_response(request.query)
+        return None
+
+    async def _answer(self, request: StubRequest):
+        route = self._route(request)
+        if route is None:
+            self.requests["unknown"] += 1
+            return 404, {"error": f"No stub for {request.method} {request.path}"}
+        service, endpoint, synthetic = route
+        self.requests[endpoint] += 1
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.errors += 1
+                return self.error_status, {"error": {"code": self.error_status, "message": "Injected by the stub"}}
+
+            if self.fixtures is not None:
+                recorded = self.fixtures.load(service, request)
+                if recorded is not None:
+                    self.fixture_hits += 1
+                    return recorded
+                if self.record:
+                    status, answer = await self._forward(service, request)
+                    self.fixtures.save(service, request, status, answer)
+                    self.recorded += 1
+                    return status, answer
+            if service == "ors":
+                # Long synthetic routes take a while to build; keep serving meanwhile
+                return 200, await asyncio.to_thread(synthetic)
+            return 200, synthetic()
+        finally:
+            self.in_flight -= 1
+
+    async def _forward(self, service: str, request: StubRequest):
+        if self._recorder is None:
+            self._recorder = httpx.AsyncClient(timeout=httpx.Timeout(30.0, connect=5.0))
+        if service == "ors":
+            headers = {"Authorization": os.getenv("ORS_KEY", ""), "Content-Type": "application/json"}
+        else:
+            headers = dict(geocode.NOMINATIM_HEADERS)
+        response = await self._recorder.request(
+            request.method, self.upstreams[service] + request.path,
+            params=request.query or None, json=request.body, headers=headers,
+        )
+        try:
+            answer = response.json()
+        except ValueError:
+            answer = {"error": response.text}
+        return response.status_code, answer
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from trips.benchmarks import log_pdf
+
+
+class Command(BaseCommand):
+    help = "Benchmark full-page svg2pdf against overlay-on-template PDF rendering"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=log_pdf.DEFAULT_DAYS)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        row = log_pdf.run(options["days"], options["repeat"])
+        self.stdout.write(f"blank template (once): {row['background_s']:.4f} s")
+        self.stdout.write(f"{'days':>5} {'svg2pdf (s/day)':>16} {'overlay (s/day)':>16} {'speedup':>8}")
+        self.stdout.write(
+            f"{row['days']:>5} {row['svg2pdf_s']:>16.4f} {row['overlay_s']:>16.4f} {row['speedup']:>7.1f}x"
+        )
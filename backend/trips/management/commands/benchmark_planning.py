@@ -0,0 +1,64 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from trips.benchmarks import planning
+
+
+def route(value):
+    miles, _, vertices = value.partition(":")
+    try:
+        return int(miles), int(vertices)
+    except ValueError:
+        raise CommandError(f"Routes are MILES:VERTICES, got {value!r}")
+
+
+class Command(BaseCommand):
+    help = "Benchmark planning and log rendering stage by stage on synthetic routes; compare with a baseline run"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--routes", nargs="+", default=[f"{miles}:{vertices}" for miles, vertices in planning.DEFAULT_ROUTES],
+            help="Routes as MILES:VERTICES (default: 100:1000 500:10000 1000:100000 5000:1000000)",
+        )
+        parser.add_argument("--cycle-hours", type=int, nargs="+", default=list(planning.DEFAULT_CYCLE_HOURS))
+        parser.add_argument("--stages", nargs="+", default=list(planning.STAGES), choices=planning.STAGES)
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--workers", type=int, default=1, help="SVG render workers (1 renders in process)")
+        parser.add_argument("--output", help="Write the results to this JSON file")
+        parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+        parser.add_argument("--threshold", type=float, default=planning.DEFAULT_THRESHOLD,
+                            help="Fail on stages slower or bigger than the baseline by more than this fraction")
+
+    def handle(self, *args, **options):
+        routes = [route(value) for value in options["routes"]]
+        if any(not 0 <= hours <= 70 for hours in options["cycle_hours"]):
+            raise CommandError("--cycle-hours must be between 0 and 70")
+        baseline = json.loads(Path(options["baseline"]).read_text()) if options["baseline"] else None
+
+        results = planning.run(routes, options["cycle_hours"], options["stages"], options["repeat"],
+                               options["workers"])
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(results, indent=1))
+
+        self.stdout.write(f"{'case':>24} {'legs':>5} {'days':>5} {'stage':>11} {'seconds':>10} {'peak (MiB)':>11}")
+        for case in results["cases"]:
+            for stage, measured in case["stages"].items():
+                self.stdout.write(
+                    f"{case['case']:>24} {case['legs']:>5} {case['days']:>5} {stage:>11} "
+                    f"{measured['seconds']:>10.4f} {measured['peak_bytes'] / 2 ** 20:>11.2f}"
+                )
+
+        if baseline is None:
+            return
+        regressions = planning.compare(results, baseline, options["threshold"])
+        if not regressions:
+            self.stdout.write(f"No regressions against {options['baseline']} (threshold {options['threshold']:.0%})")
+            return
+        for regression in regressions:
+            self.stdout.write(
+                f"REGRESSION {regression['case']} {regression['stage']} {regression['metric']}: "
+                f"{regression['baseline']:.6g} -> {regression['current']:.6g} ({regression['change']:+.0%})"
+            )
+        raise CommandError(f"{len(regressions)} regressions beyond {options['threshold']:.0%}")
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from trips.benchmarks import route_ingest
+
+
+class Command(BaseCommand):
+    help = "Benchmark route ingestion (polyline decode + cumulative miles) on synthetic routes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", type=int, nargs="+", default=list(route_ingest.DEFAULT_SIZES),
+            help="Route sizes in vertices (default: 10k 100k 1M)",
+        )
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        rows = route_ingest.run(options["sizes"], options["repeat"])
+        self.stdout.write(f"{'points':>10} {'legacy (s)':>11} {'python (s)':>11} {'numpy (s)':>10} {'speedup':>8}")
+        for row in rows:
+            numpy_s = f"{row['numpy_s']:.4f}" if row["numpy_s"] is not None else "n/a"
+            speedup = f"{row['speedup']:.1f}x" if row["speedup"] is not None else "n/a"
+            self.stdout.write(
+                f"{row['points']:>10} {row['legacy_s']:>11.4f} {row['python_s']:>11.4f} {numpy_s:>10} {speedup:>8}"
+            )
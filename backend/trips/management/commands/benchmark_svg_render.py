@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from trips.benchmarks import svg_render
+
+
+class Command(BaseCommand):
+    help = "Benchmark serial vs parallel daily log SVG rendering on synthetic trips"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, nargs="+", default=list(svg_render.DEFAULT_DAYS),
+            help="Trip lengths in days (default: 1 7 30)",
+        )
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows = svg_render.run(options["days"], options["workers"], options["repeat"])
+        self.stdout.write(f"{'days':>5} {'serial (s)':>11} {'parallel (s)':>13} {'speedup':>8}")
+        for row in rows:
+            self.stdout.write(
+                f"{row['days']:>5} {row['serial_s']:>11.4f} {row['parallel_s']:>13.4f} {row['speedup']:>7.2f}x"
+            )
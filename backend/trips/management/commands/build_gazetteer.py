@@ -0,0 +1,17 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from trips.services.gazetteer import build_sqlite_gazetteer, read_places
+
+
+class Command(BaseCommand):
+    help = "Build an SQLite (FTS5) gazetteer from a CSV/TSV places file, for GAZETTEER_PATH"
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", type=Path, help="CSV or tab-separated gazetteer (name, lat, lon columns)")
+        parser.add_argument("output", type=Path, help="SQLite file to write, e.g. places.sqlite")
+
+    def handle(self, *args, **options):
+        count = build_sqlite_gazetteer(read_places(options["source"]), options["output"])
+        self.stdout.write(f"Wrote {count} places to {options['output']}")
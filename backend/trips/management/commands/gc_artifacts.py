@@ -0,0 +1,74 @@
+"""
+Report and garbage-collect the generated log artifact store.
+"""
+import shutil
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from trips.models import Trip
+from trips.services.artifacts import get_store
+from trips.services.log_artifacts import orphaned_artifacts
+
+
+def legacy_log_dirs():
+    """
+    Output left by the per-trip layout used before the artifact store:
+    MEDIA_ROOT/<trip id>/logs for trips that no longer exist, and the old
+    MEDIA_ROOT/pdf-cache directory.
+    """
+    media_root = Path(settings.MEDIA_ROOT)
+    if not media_root.is_dir():
+        return []
+    trip_dirs = {
+        int(entry.name): entry
+        for entry in media_root.iterdir()
+        if entry.name.isdigit() and (entry / "logs").is_dir()
+    }
+    existing = set(Trip.objects.filter(id__in=trip_dirs).values_list("id", flat=True))
+    stale = [trip_dirs[trip_id] / "logs" for trip_id in sorted(trip_dirs.keys() - existing)]
+    if (media_root / "pdf-cache").is_dir():
+        stale.append(media_root / "pdf-cache")
+    return stale
+
+
+class Command(BaseCommand):
+    help = "Report artifact store usage and delete artifacts no trip refers to"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be deleted")
+        parser.add_argument(
+            "--min-age", type=float, default=3600,
+            help="Keep unreferenced artifacts younger than this many seconds (default: 3600)",
+        )
+        parser.add_argument(
+            "--evict", action="store_true",
+            help="Also evict least recently used artifacts down to the low-water mark",
+        )
+
+    def handle(self, *args, **options):
+        store = get_store()
+        dry_run = options["dry_run"]
+
+        for kind, row in sorted(store.usage().items()):
+            self.stdout.write(f"{kind}: {row['count']} artifacts, {row['bytes']} bytes")
+
+        orphans = orphaned_artifacts(store, min_age=options["min_age"])
+        freed = 0
+        for kind, path, size in orphans:
+            if dry_run:
+                freed += size
+            else:
+                freed += store.remove(path)
+        verb = "Would delete" if dry_run else "Deleted"
+        self.stdout.write(f"{verb} {len(orphans)} orphaned artifacts ({freed} bytes)")
+
+        for directory in legacy_log_dirs():
+            if not dry_run:
+                shutil.rmtree(directory, ignore_errors=True)
+            self.stdout.write(f"{verb} legacy directory {directory}")
+
+        if options["evict"] and not dry_run:
+            evicted = store.evict()
+            self.stdout.write(f"Evicted {len(evicted)} least recently used artifacts")
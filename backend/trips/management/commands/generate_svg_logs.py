@@ -1,7 +1,6 @@
 from django.core.management.base import BaseCommand
-from trips.services.generate_daily_logs import generate_daily_logs
 from trips.models import Trip
-from trips.services.svg_log_sheet import inject_duty_periods_into_svg
+from trips.services.log_artifacts import ensure_trip_svgs
 from django.shortcuts import get_object_or_404
 
 class Command(BaseCommand):
@@ -13,5 +12,6 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         trip_id = options["trip_id"]
         trip = get_object_or_404(Trip, id=trip_id)
-        logs = generate_daily_logs(trip)
-        inject_duty_periods_into_svg(logs)
+        pages = ensure_trip_svgs(trip)
+        for row, path in pages:
+            self.stdout.write(f"{row.date}: {path}")
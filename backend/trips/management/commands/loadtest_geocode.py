@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from trips.benchmarks import geocode_load
+
+
+class Command(BaseCommand):
+    help = "Load-test geocode search through the ASGI handler against a local stub Nominatim"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=geocode_load.DEFAULT_REQUESTS)
+        parser.add_argument("--concurrency", type=int, default=geocode_load.DEFAULT_CONCURRENCY)
+        parser.add_argument("--latency", type=float, default=geocode_load.DEFAULT_LATENCY,
+                            help="Seconds the stub takes to answer each call")
+        parser.add_argument("--views", default="async",
+                            help="Comma-separated: async, sync (sync holds a thread per in-flight call under ASGI)")
+
+    def handle(self, *args, **options):
+        views = [view.strip() for view in options["views"].split(",") if view.strip()]
+        unknown = set(views) - set(geocode_load.VIEWS)
+        if unknown:
+            raise CommandError(f"Unknown views: {', '.join(sorted(unknown))}")
+
+        rows = geocode_load.run(options["requests"], options["concurrency"], options["latency"], views)
+        self.stdout.write(
+            f"{'view':>6} {'requests':>9} {'elapsed (s)':>12} {'req/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} "
+            f"{'upstream calls':>15} {'max in flight':>14} {'peak threads':>13} {'errors':>7}"
+        )
+        for row in rows:
+            self.stdout.write(
+                f"{row['view']:>6} {row['requests']:>9} {row['elapsed_s']:>12.2f} {row['requests_per_s']:>8.1f} "
+                f"{row['p50_ms']:>9.0f} {row['p95_ms']:>9.0f} {row['upstream_calls']:>15} {row['upstream_max_in_flight']:>14} "
+                f"{row['peak_threads']:>13} "
+                f"{row['errors']:>7}"
+            )
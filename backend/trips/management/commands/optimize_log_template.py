@@ -0,0 +1,22 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from trips.services.svg_log_sheet import OPTIMIZED_SVG_PATH, SVG_PATH, optimize_template
+
+
+class Command(BaseCommand):
+    help = "Write the display-only optimized copy of the daily log template"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--source", type=Path, default=SVG_PATH)
+        parser.add_argument("--output", type=Path, default=OPTIMIZED_SVG_PATH)
+
+    def handle(self, *args, **options):
+        source = options["source"].read_bytes()
+        optimized = optimize_template(source)
+        options["output"].write_bytes(optimized)
+        self.stdout.write(
+            f"{options['output']}: {len(source)} -> {len(optimized)} bytes "
+            f"({100 * (1 - len(optimized) / len(source)):.1f}% smaller)"
+        )
@@ -0,0 +1,47 @@
+"""
+Run a pool of background workers for async trip planning.
+"""
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from trips.services.plan_jobs import worker_loop, default_worker_name
+
+
+class Command(BaseCommand):
+    help = "Run background workers that execute queued trip planning jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=getattr(settings, "PLAN_WORKERS", 2),
+            help="Number of worker threads (default: settings.PLAN_WORKERS)",
+        )
+        parser.add_argument("--poll-interval", type=float, default=1.0)
+
+    def handle(self, *args, **options):
+        stop_event = threading.Event()
+
+        def shutdown(signum, frame):
+            self.stdout.write("Stopping plan workers...")
+            stop_event.set()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        threads = [
+            threading.Thread(
+                target=worker_loop,
+                args=(default_worker_name(i), stop_event, options["poll_interval"]),
+                daemon=True,
+            )
+            for i in range(options["workers"])
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(self.style.SUCCESS(f"Started {len(threads)} plan worker(s)"))
+
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(timeout=1.0)
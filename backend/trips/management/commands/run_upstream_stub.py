@@ -0,0 +1,55 @@
+import asyncio
+
+from django.core.management.base import BaseCommand, CommandError
+
+from trips.benchmarks import upstream_stub
+
+
+class Command(BaseCommand):
+    help = "Serve local stand-ins for the ORS and Nominatim APIs (synthetic or recorded answers)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8090)
+        parser.add_argument("--latency", type=float, default=0.0, help="Seconds every answer waits")
+        parser.add_argument("--jitter", type=float, default=0.0, help="Up to this many seconds more, at random")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+        parser.add_argument("--error-status", type=int, default=503)
+        parser.add_argument("--route-miles", type=float, default=None,
+                            help="Length of synthetic routes (default: straight-line distance x 1.2)")
+        parser.add_argument("--vertices-per-mile", type=float, default=upstream_stub.DEFAULT_VERTICES_PER_MILE)
+        parser.add_argument("--fixtures", default=None, help="Directory of recorded answers to replay")
+        parser.add_argument("--record", action="store_true",
+                            help="Forward requests without a fixture to the real APIs and save the answers")
+        parser.add_argument("--seed", type=int, default=None, help="Seed for jitter and error injection")
+
+    def handle(self, *args, **options):
+        if not 0 <= options["error_rate"] <= 1:
+            raise CommandError("--error-rate must be between 0 and 1")
+        if options["record"] and not options["fixtures"]:
+            raise CommandError("--record needs --fixtures")
+
+        stub = upstream_stub.UpstreamStub(
+            latency=options["latency"], jitter=options["jitter"], error_rate=options["error_rate"],
+            error_status=options["error_status"], route_miles=options["route_miles"],
+            vertices_per_mile=options["vertices_per_mile"], fixtures=options["fixtures"],
+            record=options["record"], seed=options["seed"],
+        )
+        try:
+            asyncio.run(self.serve(stub, options["host"], options["port"]))
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(
+            f"Served {sum(stub.requests.values())} requests ({dict(stub.requests)}), "
+            f"{stub.errors} injected errors, {stub.fixture_hits} fixture hits, {stub.recorded} recorded"
+        )
+
+    async def serve(self, stub, host, port):
+        await stub.start(host, port)
+        for name, value in stub.settings().items():
+            self.stdout.write(f"{name}={value}")
+        self.stdout.write("Ctrl-C to stop")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await stub.stop()
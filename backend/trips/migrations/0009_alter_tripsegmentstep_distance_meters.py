@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-17 22:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0008_alter_tripleg_options_alter_tripsegmentstep_options'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tripsegmentstep',
+            name='distance_meters',
+            field=models.DecimalField(decimal_places=2, max_digits=10),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.15 on 2026-10-17 22:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0010_planjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('from_location', models.TextField(blank=True)),
+                ('to_location', models.TextField(blank=True)),
+                ('total_miles', models.FloatField()),
+                ('total_hours', models.FloatField()),
+                ('off_duty_total', models.FloatField()),
+                ('sleeper_berth_total', models.FloatField()),
+                ('driving_total', models.FloatField()),
+                ('on_duty_total', models.FloatField()),
+                ('duty_periods', models.JSONField(default=list)),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_logs', to='trips.trip')),
+            ],
+            options={
+                'ordering': ['date'],
+                'constraints': [models.UniqueConstraint(fields=('trip', 'date'), name='dailylog_trip_date_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-17 22:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0011_dailylog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailylog',
+            name='svg_key',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,199 @@
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+from django.db import migrations
+from django.utils.timezone import localtime
+
+# A frozen copy of trips.services.generate_daily_logs.build_daily_logs as of
+# this migration, so later changes to the service cannot change what it stores.
+# It reads only fields the historical TripLeg model has.
+
+SLOT = timedelta(minutes=15)
+SLOT_MINUTES = 15
+STATUS_PRIORITY = {"sleeper_berth": 1, "off_duty": 2, "driving": 3, "on_duty": 4}
+LEG_STATUS = {
+    "pickup": "on_duty",
+    "dropoff": "on_duty",
+    "fuel": "on_duty",
+    "break": "off_duty",
+    "rest": "sleeper_berth",
+    "cycle": "off_duty",
+    "drive": "driving",
+}
+
+
+def leg_status(leg):
+    notes = leg.notes.lower()
+    if "34-hour" in notes:
+        leg_type = "cycle"
+    elif leg.is_rest_stop:
+        leg_type = "rest"
+    elif leg.is_fuel_stop:
+        leg_type = "fuel"
+    elif "30-minute" in notes:
+        leg_type = "break"
+    elif "pickup" in notes:
+        leg_type = "pickup"
+    elif "dropoff" in notes:
+        leg_type = "dropoff"
+    elif leg.distance_miles > 0:
+        leg_type = "drive"
+    else:
+        leg_type = "rest"
+    return LEG_STATUS.get(leg_type, "off_duty")
+
+
+def clean_label(label, want_second_chunk=False):
+    if not label:
+        return ""
+    lowered = label.lower().strip()
+    if lowered.startswith("from "):
+        parts = label[5:].split(" to ")
+        if len(parts) == 2:
+            return parts[1 if want_second_chunk else 0].strip()
+        return label
+    if lowered.startswith(("pickup:", "dropoff:", "start:")):
+        return label.split(":", 1)[-1].strip()
+    return label.strip()
+
+
+def minutes_to_hhmm(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def merge_slot_runs(pieces):
+    runs = []  # [start_key, last_key, status]
+    for first_key, count, status in pieces:
+        last_key = first_key + SLOT_MINUTES * (count - 1)
+        if runs and first_key < runs[-1][1]:
+            return merge_slot_runs_by_key(pieces)
+
+        if runs and first_key == runs[-1][1]:
+            prev = runs[-1]
+            if STATUS_PRIORITY[status] < STATUS_PRIORITY[prev[2]]:
+                if prev[0] == first_key:
+                    runs.pop()
+                else:
+                    prev[1] = first_key - 1
+            else:
+                if count == 1:
+                    continue
+                first_key += SLOT_MINUTES
+
+        if runs and runs[-1][2] == status:
+            runs[-1][1] = last_key
+        else:
+            runs.append([first_key, last_key, status])
+
+    return [(run[0], run[2]) for run in runs]
+
+
+def merge_slot_runs_by_key(pieces):
+    slots = {}
+    for first_key, count, status in pieces:
+        for key in range(first_key, first_key + SLOT_MINUTES * count, SLOT_MINUTES):
+            existing = slots.get(key)
+            if not existing or STATUS_PRIORITY[status] < STATUS_PRIORITY[existing]:
+                slots[key] = status
+
+    runs = []
+    for key in sorted(slots):
+        if not runs or runs[-1][1] != slots[key]:
+            runs.append((key, slots[key]))
+    return runs
+
+
+def build_daily_log_fields(legs):
+    """{field: value} of each day's DailyLog, by date, for legs in departure order."""
+    legs = list(legs)
+    if not legs:
+        return []
+
+    trip_start_label = clean_label(legs[0].start_label, want_second_chunk=False)
+    trip_end_label = clean_label(legs[-1].end_label, want_second_chunk=True)
+
+    pieces_by_date = defaultdict(list)
+    miles_by_date = defaultdict(float)
+    last_legs = {}
+    for leg in legs:
+        current = localtime(leg.departure_time)
+        end_dt = localtime(leg.arrival_time)
+        status = leg_status(leg)
+        while current < end_dt:
+            day_start = datetime.combine(current.date(), time.min, tzinfo=current.tzinfo)
+            seg_end = min(end_dt, day_start + timedelta(days=1))
+
+            day_key = current.date().isoformat()
+            last_legs[day_key] = leg
+            slot_count = -((current - seg_end) // SLOT)
+            pieces_by_date[day_key].append((current.hour * 60 + current.minute, slot_count, status))
+
+            seg_hours = (seg_end - current).total_seconds() / 3600.0
+            if float(leg.duration_hours or 0) > 0:
+                miles_by_date[day_key] += float(leg.distance_miles) * seg_hours / float(leg.duration_hours)
+            current = seg_end
+
+    days = []
+    all_days = sorted(pieces_by_date)
+    for i, day_key in enumerate(all_days):
+        runs = merge_slot_runs(pieces_by_date[day_key])
+        periods = [
+            {"status": status, "start": minutes_to_hhmm(start), "end": minutes_to_hhmm(next_start)}
+            for (start, status), (next_start, _) in zip(runs, runs[1:])
+        ]
+        start_time = minutes_to_hhmm(runs[-1][0])
+        if i == len(all_days) - 1:
+            end_time = localtime(last_legs[day_key].arrival_time).strftime("%H:%M")
+        else:
+            end_time = "23:59"
+        if start_time != end_time:
+            periods.append({"status": runs[-1][1], "start": start_time, "end": end_time})
+
+        status_hours = defaultdict(float)
+        for period in periods:
+            h1, m1 = map(int, period["start"].split(":"))
+            h2, m2 = map(int, period["end"].split(":"))
+            start_minutes, end_minutes = h1 * 60 + m1, h2 * 60 + m2
+            if end_minutes < start_minutes:
+                end_minutes += 24 * 60
+            status_hours[period["status"]] += (end_minutes - start_minutes) / 60.0
+
+        days.append({
+            "date": date.fromisoformat(day_key),
+            "from_location": trip_start_label,
+            "to_location": trip_end_label,
+            "total_miles": round(miles_by_date[day_key], 2),
+            "total_hours": round(sum(status_hours.values()), 2),
+            "off_duty_total": round(status_hours["off_duty"], 2),
+            "sleeper_berth_total": round(status_hours["sleeper_berth"], 2),
+            "driving_total": round(status_hours["driving"], 2),
+            "on_duty_total": round(status_hours["on_duty"], 2),
+            "duty_periods": periods,
+        })
+    return days
+
+
+def backfill_daily_logs(apps, schema_editor):
+    """Store the daily logs of trips planned before plan_trip stored them."""
+    Trip = apps.get_model("trips", "Trip")
+    TripLeg = apps.get_model("trips", "TripLeg")
+    DailyLog = apps.get_model("trips", "DailyLog")
+
+    trips = Trip.objects.filter(legs__isnull=False, daily_logs__isnull=True).distinct()
+    for trip in trips.iterator():
+        legs = TripLeg.objects.filter(trip=trip).order_by("departure_time", "leg_order")
+        DailyLog.objects.bulk_create(
+            [DailyLog(trip=trip, **fields) for fields in build_daily_log_fields(legs)],
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0012_dailylog_svg_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_daily_logs, migrations.RunPython.noop),
+    ]
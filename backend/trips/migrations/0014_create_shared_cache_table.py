@@ -0,0 +1,22 @@
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_tables(apps, schema_editor):
+    """
+    Create the DatabaseCache tables in settings.CACHES (the "shared" tier of
+    the route and geocode caches). Existing tables are left alone, so
+    settings that add one later only need `manage.py createcachetable`.
+    """
+    call_command("createcachetable", database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0013_backfill_daily_logs'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_tables, migrations.RunPython.noop),
+    ]
@@ -75,7 +75,7 @@ class TripSegmentStep(models.Model):
     step_order = models.PositiveIntegerField()
 
     instruction = models.TextField(blank=True, default="")
-    distance_meters = models.DecimalField(max_digits=7, decimal_places=2)
+    distance_meters = models.DecimalField(max_digits=10, decimal_places=2)
     duration_seconds = models.DecimalField(max_digits=7, decimal_places=2)
 
     start_lat = models.FloatField()
@@ -90,3 +90,72 @@ class TripSegmentStep(models.Model):
 
     def __str__(self):
         return f"Step {self.step_order} of Leg {self.leg.id}"
+
+
+class DailyLog(models.Model):
+    """
+    One FMCSA daily log sheet of a planned trip, materialized by plan_trip in
+    the same transaction as the legs it is derived from.
+    """
+    trip = models.ForeignKey("Trip", on_delete=models.CASCADE, related_name="daily_logs")
+    date = models.DateField()
+
+    from_location = models.TextField(blank=True)
+    to_location = models.TextField(blank=True)
+
+    total_miles = models.FloatField()
+    total_hours = models.FloatField()
+    off_duty_total = models.FloatField()
+    sleeper_berth_total = models.FloatField()
+    driving_total = models.FloatField()
+    on_duty_total = models.FloatField()
+
+    # [{"status": ..., "start": "HH:MM", "end": "HH:MM"}, ...]
+    duty_periods = models.JSONField(default=list)
+    # Artifact store key of the rendered SVG page (blank until rendered)
+    svg_key = models.CharField(max_length=64, blank=True)
+
+    class Meta:
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(fields=["trip", "date"], name="dailylog_trip_date_uniq"),
+        ]
+
+    def __str__(self):
+        return f"Daily log {self.date} of Trip {self.trip_id}"
+
+
+class PlanJob(models.Model):
+    """
+    Background planning job for a trip (async planning mode).
+    Claimed by `run_plan_workers` with SELECT ... FOR UPDATE SKIP LOCKED.
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    trip = models.ForeignKey("Trip", on_delete=models.CASCADE, related_name="plan_jobs")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+    error = models.TextField(blank=True)
+
+    queued_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-queued_at']
+        indexes = [
+            models.Index(fields=["status", "queued_at"], name="planjob_status_queued_idx"),
+        ]
+
+    def __str__(self):
+        return f"PlanJob {self.id} for Trip {self.trip_id} ({self.status})"
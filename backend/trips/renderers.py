@@ -0,0 +1,18 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class SvgRenderer(BaseRenderer):
+    """
+    Serves ready-made SVG bytes, and selects the `.svg` format suffix.
+    Anything else (error details) is written as JSON.
+    """
+    media_type = "image/svg+xml"
+    format = "svg"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+        return json.dumps(data).encode("utf-8")
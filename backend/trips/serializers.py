@@ -1,8 +1,21 @@
 from rest_framework import serializers
-from .models import Trip, TripLeg, TripSegmentStep
+from .models import Trip, TripLeg, TripSegmentStep, PlanJob
 from drf_spectacular.utils import extend_schema_field
 
 
+class SparseFieldsetMixin:
+    """
+    Accepts an optional `fields` kwarg and drops every other field, so views
+    can honour ?fields=a,b,c without a serializer per combination.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
 class TripSegmentStepSerializer(serializers.ModelSerializer):
     """ Serializer for Trip Segment Steps"""
     class Meta:
@@ -40,7 +53,7 @@ class TripLegSerializer(serializers.ModelSerializer):
         return "other"
 
 
-class TripSerializer(serializers.ModelSerializer):
+class TripSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """ Serializer for Trips"""
     legs = TripLegSerializer(many=True, read_only=True)
 
@@ -50,6 +63,20 @@ class TripSerializer(serializers.ModelSerializer):
         read_only_fields = ["user", "planned_distance_miles", "planned_duration_hours", "planned_at"]
 
 
+class TripSummarySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """ Lightweight trip row for list views: no legs, steps or geometry"""
+
+    class Meta:
+        model = Trip
+        fields = [
+            "id", "user", "name",
+            "current_location_label", "pickup_location_label", "dropoff_location_label",
+            "current_cycle_hours", "planned_distance_miles", "planned_duration_hours",
+            "planned_at", "departure_time",
+        ]
+        read_only_fields = fields
+
+
 class DutyPeriodSerializer(serializers.Serializer):
     status = serializers.CharField()
     start = serializers.CharField()
@@ -95,3 +122,30 @@ class SvgLogListSerializer(serializers.Serializer):
         child=serializers.URLField(),
         help_text="List of URLs pointing to the generated daily log SVG files."
     )
+
+
+class PlanJobSerializer(serializers.ModelSerializer):
+    """ Status of a background planning job, with timings in seconds"""
+    job_id = serializers.IntegerField(source="id", read_only=True)
+    queue_seconds = serializers.SerializerMethodField()
+    run_seconds = serializers.SerializerMethodField()
+
+    class Meta:
+        model = PlanJob
+        fields = [
+            "job_id", "trip", "status", "attempts", "error",
+            "queued_at", "started_at", "finished_at", "queue_seconds", "run_seconds",
+        ]
+        read_only_fields = fields
+
+    @extend_schema_field(serializers.FloatField(allow_null=True))
+    def get_queue_seconds(self, obj):
+        if not obj.started_at:
+            return None
+        return round((obj.started_at - obj.queued_at).total_seconds(), 3)
+
+    @extend_schema_field(serializers.FloatField(allow_null=True))
+    def get_run_seconds(self, obj):
+        if not obj.started_at or not obj.finished_at:
+            return None
+        return round((obj.finished_at - obj.started_at).total_seconds(), 3)
@@ -0,0 +1,151 @@
+"""
+Content-addressed store for generated log artifacts (SVG pages, PDF pages,
+merged PDFs, the template background PDF).
+
+Artifacts live under MEDIA_ROOT/artifacts/<kind>/<key[:2]>/<key>.<ext>, so
+they are served from MEDIA_URL like the rest of the media files. Keys are
+hashes of the inputs an artifact was built from, which means identical pages
+are shared across trips and a hit never needs regenerating.
+
+The store is bounded by settings.ARTIFACT_STORE_MAX_BYTES. Reads refresh an
+artifact's mtime, and when a write takes the store over the limit the least
+recently used artifacts are evicted down to ARTIFACT_STORE_LOW_WATER of it.
+"""
+import os
+import threading
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+
+from ..utils import metrics
+
+ARTIFACT_DIRNAME = "artifacts"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_LOW_WATER = 0.9
+
+
+class ArtifactStore:
+
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES, low_water=DEFAULT_LOW_WATER):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self._approx_bytes = None  # filled by the first scan
+        self._lock = threading.Lock()
+
+    def path(self, kind: str, key: str, ext: str) -> Path:
+        return self.root / kind / key[:2] / f"{key}.{ext}"
+
+    def get(self, kind: str, key: str, ext: str):
+        """Path of a stored artifact (marking it recently used), or None."""
+        path = self.path(kind, key, ext)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            metrics.incr(f"artifacts.{kind}.misses")
+            return None
+        metrics.incr(f"artifacts.{kind}.hits")
+        return path
+
+    def temp_path(self, kind: str, key: str, ext: str) -> Path:
+        """Scratch file next to the artifact's final place, for put()."""
+        path = self.path(kind, key, ext)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+
+    def put(self, kind: str, key: str, ext: str, tmp: Path) -> Path:
+        """Publish a finished temp_path() file atomically under its key."""
+        path = self.path(kind, key, ext)
+        size = tmp.stat().st_size
+        os.replace(tmp, path)
+        metrics.incr(f"artifacts.{kind}.writes")
+        with self._lock:
+            if self._approx_bytes is None:
+                self._approx_bytes = self._scan_bytes()
+            else:
+                self._approx_bytes += size
+            over = self._approx_bytes > self.max_bytes
+        if over:
+            self.evict()
+        return path
+
+    def url(self, path: Path) -> str:
+        return f"{settings.MEDIA_URL}{path.relative_to(Path(settings.MEDIA_ROOT)).as_posix()}"
+
+    def entries(self):
+        """(kind, key, path, size, mtime) for every stored artifact."""
+        if not self.root.exists():
+            return
+        for kind_dir in self.root.iterdir():
+            if not kind_dir.is_dir():
+                continue
+            for shard in kind_dir.iterdir():
+                if not shard.is_dir():
+                    continue
+                for entry in os.scandir(shard):
+                    if entry.name.startswith(".") or not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    key = entry.name.split(".", 1)[0]
+                    yield kind_dir.name, key, Path(entry.path), stat.st_size, stat.st_mtime
+
+    def _scan_bytes(self) -> int:
+        return sum(size for _, _, _, size, _ in self.entries())
+
+    def usage(self):
+        """{kind: {"count": n, "bytes": b}} for reporting."""
+        totals = {}
+        for kind, _, _, size, _ in self.entries():
+            row = totals.setdefault(kind, {"count": 0, "bytes": 0})
+            row["count"] += 1
+            row["bytes"] += size
+        return totals
+
+    def remove(self, path: Path) -> int:
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            return 0
+        with self._lock:
+            if self._approx_bytes is not None:
+                self._approx_bytes -= size
+        return size
+
+    def evict(self, target_bytes=None):
+        """
+        Delete least recently used artifacts until the store holds at most
+        `target_bytes` (default: low_water * max_bytes). Returns the removed paths.
+        """
+        if target_bytes is None:
+            target_bytes = int(self.max_bytes * self.low_water)
+        entries = sorted(self.entries(), key=lambda entry: entry[4])
+        total = sum(entry[3] for entry in entries)
+        removed = []
+        for kind, _, path, size, _ in entries:
+            if total <= target_bytes:
+                break
+            total -= self.remove(path)
+            removed.append(path)
+            metrics.incr(f"artifacts.{kind}.evictions")
+        with self._lock:
+            self._approx_bytes = total
+        return removed
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store() -> ArtifactStore:
+    """The process-wide store for the current MEDIA_ROOT."""
+    root = Path(settings.MEDIA_ROOT) / ARTIFACT_DIRNAME
+    max_bytes = getattr(settings, "ARTIFACT_STORE_MAX_BYTES", DEFAULT_MAX_BYTES)
+    with _stores_lock:
+        store = _stores.get(root)
+        if store is None or store.max_bytes != max_bytes:
+            store = _stores[root] = ArtifactStore(
+                root, max_bytes, getattr(settings, "ARTIFACT_STORE_LOW_WATER", DEFAULT_LOW_WATER)
+            )
+        return store
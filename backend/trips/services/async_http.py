@@ -0,0 +1,162 @@
+"""
+Async counterpart of http_client.UpstreamClient for the async views.
+
+get_async_client(name) wraps the upstream's sync client and shares its
+timeouts, retries, rate limit, headers and circuit breaker, so a failing
+upstream is seen by both paths. Calls go through httpx.AsyncClients whose
+connection pool is sized for many concurrent calls ("async_pool_size" in
+settings.UPSTREAM_HTTP). Pooled connections belong to the event loop that
+opened them, so each running loop gets its own pool.
+
+httpcore scans every pooled connection whenever a request is queued or a
+connection frees up, which costs more CPU than the round trip itself once a
+pool holds hundreds of connections. The pool is therefore split into
+AsyncClients of POOL_SHARD_SIZE connections, taken in turn, which share
+one SSL context (building one per AsyncClient dominates their start-up).
+
+Transport errors are re-raised as the requests exceptions the sync client
+raises, so callers keep a single `except requests.RequestException`.
+"""
+import asyncio
+import itertools
+import ssl
+import threading
+import time
+import weakref
+
+import certifi
+import httpx
+import requests
+from django.conf import settings
+
+from .http_client import RETRY_STATUSES, UpstreamUnavailable, get_client
+from ..utils import metrics
+
+DEFAULT_ASYNC_POOL_SIZE = 500
+POOL_SHARD_SIZE = 10
+
+
+class AsyncUpstreamClient:
+
+    def __init__(self, client, pool_size=DEFAULT_ASYNC_POOL_SIZE, transport=None):
+        self.sync_client = client
+        self.name = client.name
+        self.breaker = client.breaker
+        self.max_retries = client.max_retries
+        connect_timeout, read_timeout = client.timeout
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.pool_size = pool_size
+        shard_size = min(pool_size, POOL_SHARD_SIZE)
+        self.shards = max(1, pool_size // shard_size)
+        self.limits = httpx.Limits(max_connections=shard_size, max_keepalive_connections=shard_size)
+        # requests drops headers set to None (ORS_KEY unset); httpx would reject them
+        self.headers = {key: value for key, value in client.session.headers.items() if value is not None}
+        self.transport = transport
+        self._pools = weakref.WeakKeyDictionary()
+        self._turn = itertools.count()
+        self._ssl_context = None
+        self._lock = threading.Lock()
+
+    def _client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            pool = self._pools.get(loop)
+            if pool is None:
+                if self._ssl_context is None:
+                    self._ssl_context = ssl.create_default_context(cafile=certifi.where())
+                pool = self._pools[loop] = [
+                    httpx.AsyncClient(
+                        headers=self.headers, timeout=self.timeout, limits=self.limits, transport=self.transport,
+                        verify=self._ssl_context,
+                    )
+                    for _ in range(self.shards)
+                ]
+            return pool[next(self._turn) % len(pool)]
+
+    async def request(self, method, url, **kwargs) -> httpx.Response:
+        """UpstreamClient.request() without blocking the event loop."""
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                metrics.incr(f"http.{self.name}.short_circuited")
+                raise UpstreamUnavailable(f"{self.name} circuit is open")
+
+            metrics.incr(f"http.{self.name}.requests")
+            start = time.perf_counter()
+            try:
+                response = await self._client().request(method, url, **kwargs)
+            except httpx.RequestError as exc:
+                metrics.observe(f"http.{self.name}.latency", time.perf_counter() - start)
+                metrics.incr(f"http.{self.name}.errors")
+                # Waiting too long for a pooled connection says nothing about the upstream
+                if isinstance(exc, httpx.PoolTimeout):
+                    self.breaker.cancel_trial()
+                else:
+                    self.breaker.record_failure()
+                # Only transport errors are retried, as in the sync client
+                if not isinstance(exc, httpx.TransportError) or attempt >= self.max_retries:
+                    raise _requests_error(exc) from exc
+            except BaseException:
+                # Cancelled (the caller went away) or a bug: no verdict on the upstream
+                self.breaker.cancel_trial()
+                raise
+            else:
+                metrics.observe(f"http.{self.name}.latency", time.perf_counter() - start)
+                if response.status_code >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                metrics.incr(f"http.{self.name}.errors")
+
+            metrics.incr(f"http.{self.name}.retries")
+            await asyncio.sleep(self.sync_client._backoff(attempt))
+            if self.sync_client.rate_limit is not None:
+                await self.sync_client.rate_limit.aacquire()
+            attempt += 1
+
+    async def get(self, url, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def aclose(self):
+        """Close the running loop's connection pool."""
+        with self._lock:
+            pool = self._pools.pop(asyncio.get_running_loop(), [])
+        for client in pool:
+            await client.aclose()
+
+
+def _requests_error(exc: httpx.RequestError) -> requests.RequestException:
+    """The requests exception the sync client would raise for an httpx error."""
+    if isinstance(exc, httpx.TimeoutException):
+        error = requests.exceptions.Timeout
+    elif isinstance(exc, httpx.TransportError):
+        error = requests.exceptions.ConnectionError
+    elif isinstance(exc, httpx.DecodingError):
+        error = requests.exceptions.ContentDecodingError
+    elif isinstance(exc, httpx.TooManyRedirects):
+        error = requests.exceptions.TooManyRedirects
+    else:
+        error = requests.RequestException
+    return error(str(exc) or type(exc).__name__)
+
+
+_async_clients = {}
+_async_clients_lock = threading.Lock()
+
+
+def get_async_client(name: str, headers=None) -> AsyncUpstreamClient:
+    """Return the process-wide async client for an upstream, creating it (and its sync twin) on first use."""
+    with _async_clients_lock:
+        client = _async_clients.get(name)
+        if client is None:
+            options = getattr(settings, "UPSTREAM_HTTP", {}).get(name, {})
+            client = _async_clients[name] = AsyncUpstreamClient(
+                get_client(name, headers=headers),
+                pool_size=options.get("async_pool_size", DEFAULT_ASYNC_POOL_SIZE),
+            )
+        return client
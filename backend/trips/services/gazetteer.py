@@ -0,0 +1,316 @@
+"""
+Offline US place lookup for geocode search and reverse geocoding.
+
+A gazetteer is a CSV/TSV of places (the Census "national places" gazetteer
+file works as is) or an SQLite database built from one with
+`manage.py build_gazetteer`:
+
+  - CSV/TSV -> MemoryGazetteer: every word-start suffix of each place's
+    search key sits in one sorted list, a flattened prefix trie, so a
+    keystroke is two bisections plus a ranking of the matching slice.
+  - SQLite  -> SqliteGazetteer: an FTS5 prefix index, for datasets too large
+    to hold in memory.
+
+Both answer reverse lookups from a grid of GRID_DEGREES cells, searching
+outwards ring by ring from the point's cell. Results have the shape of the
+Nominatim results the geocode views already return.
+"""
+import csv
+import heapq
+import math
+import re
+import sqlite3
+import threading
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+
+GRID_DEGREES = 0.1
+EARTH_RADIUS_KM = 6371.0
+DEFAULT_REVERSE_MAX_KM = 25.0
+
+# Column aliases, lowercased; the Census gazetteer uses the upper-case names
+COLUMNS = {
+    "place_id": ("place_id", "geoid", "id"),
+    "name": ("name",),
+    "state": ("state", "usps"),
+    "lat": ("lat", "latitude", "intptlat"),
+    "lon": ("lon", "lng", "longitude", "intptlong"),
+    "population": ("population", "pop"),
+    "display_name": ("display_name",),
+}
+# Legal/statistical descriptions the Census appends to place names
+CENSUS_SUFFIX = re.compile(r"\s+(city and borough|city|town|village|borough|municipality|CDP|comunidad|zona urbana)$")
+
+
+def search_key(text: str) -> str:
+    """Lowercase words separated by single spaces, punctuation dropped."""
+    return " ".join(re.findall(r"\w+", text.casefold()))
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def grid_cell(lat: float, lon: float):
+    return math.floor(lat / GRID_DEGREES), math.floor(lon / GRID_DEGREES)
+
+
+def _ring(cell, radius):
+    """Cells at Chebyshev distance `radius` around `cell`."""
+    y, x = cell
+    if radius == 0:
+        return [cell]
+    return [
+        (y + dy, x + dx)
+        for dy in range(-radius, radius + 1)
+        for dx in range(-radius, radius + 1)
+        if max(abs(dy), abs(dx)) == radius
+    ]
+
+
+def _cell_km(lat: float) -> float:
+    """Narrowest side of a grid cell at this latitude (cells narrow east-west away from the equator)."""
+    return 111.32 * GRID_DEGREES * max(math.cos(math.radians(min(abs(lat), 89.0))), 0.01)
+
+
+def _min_cell_km(cell_y: int, rows: int) -> float:
+    """Narrowest cell side within `rows` rows of row cell_y: the one at their poleward edge."""
+    return _cell_km(max(abs(cell_y - rows), abs(cell_y + rows + 1)) * GRID_DEGREES)
+
+
+def _max_rings(lat: float, max_km: float) -> int:
+    """Grid rings to search around a point to cover max_km, with cells as narrow as max_km poleward."""
+    return math.ceil(max_km / _cell_km(abs(lat) + max_km / 111.32))
+
+
+def read_places(path):
+    """
+    Yield place dicts (place_id, name, state, lat, lon, population,
+    display_name) from a CSV or tab-separated gazetteer file.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as handle:
+        sample = handle.readline()
+        handle.seek(0)
+        reader = csv.DictReader(handle, delimiter="\t" if "\t" in sample else ",")
+        fields = {name.strip().lower(): name for name in reader.fieldnames or []}
+        columns = {
+            column: next((fields[alias] for alias in aliases if alias in fields), None)
+            for column, aliases in COLUMNS.items()
+        }
+        if not (columns["name"] and columns["lat"] and columns["lon"]):
+            raise ValueError(f"{path}: needs name, lat and lon columns")
+
+        for number, row in enumerate(reader, start=1):
+            def value(column):
+                source = columns[column]
+                return (row.get(source) or "").strip() if source else ""
+
+            name = CENSUS_SUFFIX.sub("", value("name"))
+            state = value("state")
+            try:
+                lat, lon = float(value("lat")), float(value("lon"))
+            except ValueError:
+                continue
+            population = value("population")
+            yield {
+                "place_id": value("place_id") or str(number),
+                "name": name,
+                "state": state,
+                "lat": lat,
+                "lon": lon,
+                "population": int(float(population)) if population else 0,
+                "display_name": value("display_name") or (f"{name}, {state}" if state else name),
+            }
+
+
+def _result(place_id, display_name, lat, lon):
+    return {"place_id": f"gazetteer:{place_id}", "display_name": display_name, "lat": f"{lat:.6f}", "lon": f"{lon:.6f}"}
+
+
+class MemoryGazetteer:
+    """
+    Places held in parallel arrays, searched through a sorted list of
+    (suffix, place index) keys; see the module docstring.
+    """
+
+    def __init__(self, places):
+        self.place_ids, self.names = [], []
+        self.lats, self.lons = array("d"), array("d")
+        self.population = array("q")
+        self.grid = {}
+        entries = []
+        for index, place in enumerate(places):
+            self.place_ids.append(place["place_id"])
+            self.names.append(place["display_name"])
+            self.lats.append(place["lat"])
+            self.lons.append(place["lon"])
+            self.population.append(place["population"])
+            self.grid.setdefault(grid_cell(place["lat"], place["lon"]), []).append(index)
+
+            key = search_key(f"{place['name']} {place['state']}")
+            starts = [0] + [match.end() for match in re.finditer(" ", key)]
+            entries.extend((key[start:], index) for start in starts)
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.key_places = array("I", (index for _, index in entries))
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(read_places(path))
+
+    def __len__(self):
+        return len(self.names)
+
+    def _result(self, index):
+        return _result(self.place_ids[index], self.names[index], self.lats[index], self.lons[index])
+
+    def search(self, query: str, limit: int = 5):
+        prefix = search_key(query)
+        if not prefix:
+            return []
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + "\uffff", lo)
+        matches = set(self.key_places[lo:hi])
+        # Most populous first, then the shortest (closest) name
+        best = heapq.nsmallest(limit, matches, key=lambda i: (-self.population[i], len(self.names[i]), i))
+        return [self._result(index) for index in best]
+
+    def reverse(self, lat: float, lon: float, max_km: float = DEFAULT_REVERSE_MAX_KM):
+        center = grid_cell(lat, lon)
+        best, best_km = None, max_km
+        for radius in range(_max_rings(lat, max_km) + 1):
+            for cell in _ring(center, radius):
+                for index in self.grid.get(cell, ()):
+                    km = haversine_km(lat, lon, self.lats[index], self.lons[index])
+                    if km <= best_km:
+                        best, best_km = index, km
+            # Places in further rings are at least `radius` whole cells away, and
+            # cells narrow toward the pole, so count the narrowest one they reach
+            if best is not None and best_km <= radius * _min_cell_km(center[0], radius + 1):
+                break
+        return self._result(best) if best is not None else None
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE places (
+    id INTEGER PRIMARY KEY,
+    place_id TEXT NOT NULL,
+    display_name TEXT NOT NULL,
+    search_key TEXT NOT NULL,
+    lat REAL NOT NULL,
+    lon REAL NOT NULL,
+    population INTEGER NOT NULL DEFAULT 0,
+    cell_y INTEGER NOT NULL,
+    cell_x INTEGER NOT NULL
+);
+CREATE INDEX places_cell ON places (cell_y, cell_x);
+CREATE VIRTUAL TABLE places_fts USING fts5(
+    search_key, content='places', content_rowid='id', prefix='2 3 4'
+);
+"""
+
+
+def build_sqlite_gazetteer(places, path):
+    """Write places to a new SQLite gazetteer with its FTS5 and grid indexes. Returns the row count."""
+    path = Path(path)
+    path.unlink(missing_ok=True)
+    connection = sqlite3.connect(path)
+    try:
+        with connection:
+            connection.executescript(SQLITE_SCHEMA)
+            connection.executemany(
+                "INSERT INTO places (place_id, display_name, search_key, lat, lon, population, cell_y, cell_x) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        place["place_id"], place["display_name"],
+                        search_key(f"{place['name']} {place['state']}"),
+                        place["lat"], place["lon"], place["population"],
+                        *grid_cell(place["lat"], place["lon"]),
+                    )
+                    for place in places
+                ),
+            )
+            connection.execute("INSERT INTO places_fts (places_fts) VALUES ('rebuild')")
+        return connection.execute("SELECT count(*) FROM places").fetchone()[0]
+    finally:
+        connection.close()
+
+
+class SqliteGazetteer:
+    """Read-only queries against a database written by build_sqlite_gazetteer."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(
+                f"file:{self.path}?mode=ro", uri=True, check_same_thread=False
+            )
+        return connection
+
+    def __len__(self):
+        return self.connection.execute("SELECT count(*) FROM places").fetchone()[0]
+
+    def search(self, query: str, limit: int = 5):
+        words = search_key(query).split()
+        if not words:
+            return []
+        # Every word as a prefix, so the one still being typed matches too
+        match = " ".join(f'"{word}"*' for word in words)
+        rows = self.connection.execute(
+            "SELECT places.place_id, places.display_name, places.lat, places.lon "
+            "FROM places_fts JOIN places ON places.id = places_fts.rowid "
+            "WHERE places_fts MATCH ? "
+            "ORDER BY places.population DESC, length(places.display_name), places.id LIMIT ?",
+            (match, limit),
+        ).fetchall()
+        return [_result(*row) for row in rows]
+
+    def reverse(self, lat: float, lon: float, max_km: float = DEFAULT_REVERSE_MAX_KM):
+        cell_y, cell_x = grid_cell(lat, lon)
+        rings = _max_rings(lat, max_km)
+        rows = self.connection.execute(
+            "SELECT place_id, display_name, lat, lon FROM places "
+            "WHERE cell_y BETWEEN ? AND ? AND cell_x BETWEEN ? AND ?",
+            (cell_y - rings, cell_y + rings, cell_x - rings, cell_x + rings),
+        ).fetchall()
+        best, best_km = None, max_km
+        for row in rows:
+            km = haversine_km(lat, lon, row[2], row[3])
+            if km <= best_km:
+                best, best_km = row, km
+        return _result(*best) if best is not None else None
+
+
+def load_gazetteer(path):
+    """SqliteGazetteer for .sqlite/.sqlite3/.db files, MemoryGazetteer for anything else."""
+    path = Path(path)
+    if path.suffix.lower() in (".sqlite", ".sqlite3", ".db"):
+        return SqliteGazetteer(path)
+    return MemoryGazetteer.from_file(path)
+
+
+_gazetteers = {}
+_gazetteers_lock = threading.Lock()
+
+
+def get_gazetteer():
+    """The process-wide gazetteer for settings.GAZETTEER_PATH, loaded on first use; None if unset."""
+    path = getattr(settings, "GAZETTEER_PATH", "")
+    if not path:
+        return None
+    with _gazetteers_lock:
+        gazetteer = _gazetteers.get(path)
+        if gazetteer is None:
+            gazetteer = _gazetteers[path] = load_gazetteer(path)
+        return gazetteer
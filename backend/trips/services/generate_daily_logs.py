@@ -1,8 +1,15 @@
 from collections import defaultdict
-from datetime import timedelta, datetime, time
+from datetime import date, timedelta, datetime, time
 from django.utils.timezone import localtime
 import calendar
 
+from ..models import DailyLog
+
+# Grid the log is drawn on: each leg contributes one "HH:MM" key every
+# SLOT from its departure, and duty periods start and end on those keys.
+SLOT = timedelta(minutes=15)
+SLOT_MINUTES = 15
+
 STATUS_PRIORITY = {
     "sleeper_berth": 1,
     "off_duty": 2,
@@ -39,59 +46,123 @@ def map_status(status):
         "drive": "driving"
     }.get(status, "off_duty")
 
+def clean_label(label, want_second_chunk=False):
+    if not label:
+        return ""
+
+    ll = label.lower().strip()
+
+    if ll.startswith("from "):
+        # e.g. "From Chicago, IL to Dallas, TX"
+        after_from = label[5:]  # "Chicago, IL to Dallas, TX"
+        parts = after_from.split(" to ")
+        # parts == ["Chicago, IL", "Dallas, TX"]
+        if len(parts) == 2:
+            if want_second_chunk:
+                return parts[1].strip()
+            else:
+                return parts[0].strip()
+        return label
+
+    if ll.startswith("pickup:") or ll.startswith("dropoff:"):
+        return label.split(":", 1)[-1].strip()
+
+    if ll.startswith("start:"):
+        return label.split(":", 1)[-1].strip()
+
+    return label.strip()
+
+
+def minutes_to_hhmm(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def merge_slot_runs(pieces):
+    """
+    Resolve one day's pieces into runs of equal status.
+
+    `pieces` are (first_key, slot_count, status) in leg order, where keys are
+    minutes from midnight and a piece covers first_key, first_key + 15, ...
+    Where two pieces land on the same key the lower STATUS_PRIORITY wins and
+    ties keep the earlier piece, as the slot grid always did.
+
+    Returns [(start_key, status), ...]. Consecutive legs share at most their
+    boundary key, so this is a single pass; a day with truly overlapping legs
+    falls back to resolving key by key.
+    """
+    runs = []  # [start_key, last_key, status]
+    for first_key, count, status in pieces:
+        last_key = first_key + SLOT_MINUTES * (count - 1)
+        if runs and first_key < runs[-1][1]:
+            return _merge_slot_runs_by_key(pieces)
+
+        if runs and first_key == runs[-1][1]:
+            # Shared boundary key: one of the two statuses keeps it
+            prev = runs[-1]
+            if STATUS_PRIORITY[status] < STATUS_PRIORITY[prev[2]]:
+                if prev[0] == first_key:
+                    runs.pop()
+                else:
+                    prev[1] = first_key - 1
+            else:
+                if count == 1:
+                    continue
+                first_key += SLOT_MINUTES
+
+        if runs and runs[-1][2] == status:
+            runs[-1][1] = last_key
+        else:
+            runs.append([first_key, last_key, status])
+
+    return [(run[0], run[2]) for run in runs]
+
+
+def _merge_slot_runs_by_key(pieces):
+    slots = {}
+    for first_key, count, status in pieces:
+        for key in range(first_key, first_key + SLOT_MINUTES * count, SLOT_MINUTES):
+            existing = slots.get(key)
+            if not existing or STATUS_PRIORITY[status] < STATUS_PRIORITY[existing]:
+                slots[key] = status
+
+    runs = []
+    for key in sorted(slots):
+        if not runs or runs[-1][1] != slots[key]:
+            runs.append((key, slots[key]))
+    return runs
+
+
 def generate_daily_logs(trip):
+    """Build the daily logs of a trip from its stored legs."""
+    return build_daily_logs(trip.legs.all().order_by("departure_time", "leg_order"))
+
+
+def build_daily_logs(legs):
     """
-    1. For each leg, we assign day-based 15-min increments (no skipping).
+    1. Each leg's [departure, arrival) interval is cut at local midnights.
     2. Evening befores and morning afters both appear.
     3. We label every daily log with the trip's overall start_label and end_label
        (ignoring day-specific from/to).
     4. The final day ends at the actual arrival time; prior days clamp to 23:59.
+
+    `legs` are TripLeg instances (saved or not) ordered by departure time.
+    Work is O(legs + days): a leg's 15-minute slots on a day are an arithmetic
+    run of keys, so they are merged as runs instead of being written one by one.
     """
 
-    timeline = defaultdict(lambda: defaultdict(str))  # day_key -> {HH:MM -> status}
+    pieces_by_date = defaultdict(list)  # day_key -> [(first_key, slot_count, status)]
     miles_by_date = defaultdict(float)
-    hours_by_date = defaultdict(float)
-
-    # We'll still track earliest & latest leg per day internally
-    # but won't actually use them for from/to labels, as requested.
-    first_legs = {}
     last_legs = {}
 
-    legs = trip.legs.all().order_by("departure_time")
+    legs = list(legs)
     if not legs:
         return []
 
-    def clean_label(label, want_second_chunk=False):
-        if not label:
-            return ""
-
-        ll = label.lower().strip()
-
-        if ll.startswith("from "):
-            # e.g. "From Chicago, IL to Dallas, TX"
-            after_from = label[5:]  # "Chicago, IL to Dallas, TX"
-            parts = after_from.split(" to ")
-            # parts == ["Chicago, IL", "Dallas, TX"]
-            if len(parts) == 2:
-                if want_second_chunk:
-                    return parts[1].strip()
-                else:
-                    return parts[0].strip()
-            return label
-
-        if ll.startswith("pickup:") or ll.startswith("dropoff:"):
-            return label.split(":", 1)[-1].strip()
-
-        if ll.startswith("start:"):
-            return label.split(":", 1)[-1].strip()
-
-        return label.strip()
-
     # For the entire trip's start/end labeling
-    trip_start_label = clean_label(legs.first().start_label, want_second_chunk=False)
-    trip_end_label   = clean_label(legs.last().end_label,  want_second_chunk=True)
+    trip_start_label = clean_label(legs[0].start_label, want_second_chunk=False)
+    trip_end_label   = clean_label(legs[-1].end_label,  want_second_chunk=True)
 
-    # ---- PHASE 1: BUILD 15-MIN TIMELINE PER DAY
+    # ---- PHASE 1: CUT LEG INTERVALS AT LOCAL MIDNIGHTS
     for leg in legs:
         start_dt = localtime(leg.departure_time)
         end_dt   = localtime(leg.arrival_time)
@@ -104,21 +175,12 @@ def generate_daily_logs(trip):
             seg_end   = min(end_dt, day_end)
 
             day_key = current.date().isoformat()
-            if day_key not in first_legs:
-                first_legs[day_key] = leg
             last_legs[day_key] = leg
 
-            # fill 15-min blocks
-            time_cursor = current
-            while time_cursor < seg_end:
-                t_str = time_cursor.strftime("%H:%M")
-                existing = timeline[day_key].get(t_str)
-                if not existing or STATUS_PRIORITY[status] < STATUS_PRIORITY.get(existing, 99):
-                    timeline[day_key][t_str] = status
-
-                time_cursor += timedelta(minutes=15)
+            slot_count = -((current - seg_end) // SLOT)
+            pieces_by_date[day_key].append((current.hour * 60 + current.minute, slot_count, status))
 
-            # proportionally distribute distance/hours for that day
+            # proportionally distribute distance for that day
             seg_minutes = (seg_end - current).total_seconds() / 60.0
             seg_hours   = seg_minutes / 60.0
 
@@ -130,66 +192,28 @@ def generate_daily_logs(trip):
                 seg_miles = 0.0
 
             miles_by_date[day_key] += seg_miles
-            hours_by_date[day_key] += seg_hours
 
             current = seg_end
 
-    # ---- PHASE 2: CONVERT TIMELINE SLOTS -> PERIODS
+    # ---- PHASE 2: MERGE RUNS -> PERIODS
     logs = []
-    all_days = sorted(timeline.keys())
+    all_days = sorted(pieces_by_date)
 
     for i, day_key in enumerate(all_days):
-        day_slots = timeline[day_key]
-        sorted_times = sorted(day_slots)
-        periods = []
-
-        current_stat = None
-        start_time   = None
-
-        # group timeslots into [start, end) periods
-        for hhmm in sorted_times:
-            st = day_slots[hhmm]
-            if st != current_stat:
-                if current_stat and start_time != hhmm:
-                    periods.append({
-                        "status": current_stat,
-                        "start": start_time,
-                        "end": hhmm
-                    })
-                current_stat = st
-                start_time = hhmm
-
-        if current_stat and start_time:
-            # final chunk
-            # if it's the last day in the entire trip, we can do actual arrival
-            # otherwise, clamp to 23:59
-            if i == len(all_days) - 1:
-                # final day
-                last_leg_of_day = last_legs.get(day_key)
-                if last_leg_of_day:
-                    arr_str = localtime(last_leg_of_day.arrival_time).strftime("%H:%M")
-                    if start_time != arr_str:
-                        periods.append({
-                            "status": current_stat,
-                            "start": start_time,
-                            "end": arr_str
-                        })
-                else:
-                    # fallback if no leg found
-                    if start_time != "23:59":
-                        periods.append({
-                            "status": current_stat,
-                            "start": start_time,
-                            "end": "23:59"
-                        })
-            else:
-                # clamp to 23:59
-                if start_time != "23:59":
-                    periods.append({
-                        "status": current_stat,
-                        "start": start_time,
-                        "end": "23:59"
-                    })
+        runs = merge_slot_runs(pieces_by_date[day_key])
+        periods = [
+            {"status": status, "start": minutes_to_hhmm(start), "end": minutes_to_hhmm(next_start)}
+            for (start, status), (next_start, _) in zip(runs, runs[1:])
+        ]
+
+        # final chunk: the last day ends at the actual arrival, others clamp to 23:59
+        start_time = minutes_to_hhmm(runs[-1][0])
+        if i == len(all_days) - 1:
+            end_time = localtime(last_legs[day_key].arrival_time).strftime("%H:%M")
+        else:
+            end_time = "23:59"
+        if start_time != end_time:
+            periods.append({"status": runs[-1][1], "start": start_time, "end": end_time})
 
         # compute daily totals
         status_hours = defaultdict(float)
@@ -224,3 +248,68 @@ def generate_daily_logs(trip):
         })
 
     return logs
+
+
+def daily_log_rows(trip, logs):
+    """Unsaved DailyLog rows for the dicts returned by build_daily_logs."""
+    return [
+        DailyLog(
+            trip=trip,
+            date=date.fromisoformat(log["date"]),
+            from_location=log["from_location"],
+            to_location=log["to_location"],
+            total_miles=log["total_miles"],
+            total_hours=log["total_hours"],
+            off_duty_total=log["off_duty_total"],
+            sleeper_berth_total=log["sleeper_berth_total"],
+            driving_total=log["driving_total"],
+            on_duty_total=log["on_duty_total"],
+            duty_periods=log["duty_periods"],
+        )
+        for log in logs
+    ]
+
+
+def daily_log_as_dict(row: DailyLog):
+    """The build_daily_logs dict for a stored DailyLog row."""
+    return {
+        "date": row.date.isoformat(),
+        "day": row.date.day,
+        "month": calendar.month_name[row.date.month],
+        "year": row.date.year,
+        "from_location": row.from_location,
+        "to_location": row.to_location,
+        "duty_periods": row.duty_periods,
+        "total_miles": row.total_miles,
+        "total_hours": row.total_hours,
+        "off_duty_total": row.off_duty_total,
+        "sleeper_berth_total": row.sleeper_berth_total,
+        "driving_total": row.driving_total,
+        "on_duty_total": row.on_duty_total,
+    }
+
+
+def get_daily_log_rows(trip):
+    """
+    Stored DailyLog rows of a trip, by date. A trip planned without them
+    (migration 0013 stores them for older trips) gets unsaved rows built from
+    its legs; nothing is written.
+    """
+    rows = list(trip.daily_logs.all())
+    return rows or daily_log_rows(trip, generate_daily_logs(trip))
+
+
+def store_daily_log_rows(trip):
+    """
+    get_daily_log_rows(), storing the rows first if the trip has none.
+    Concurrent callers for the same trip store them once.
+    """
+    rows = list(trip.daily_logs.all())
+    if rows:
+        return rows
+    DailyLog.objects.bulk_create(daily_log_rows(trip, generate_daily_logs(trip)), ignore_conflicts=True)
+    return list(trip.daily_logs.all())
+
+
+def get_daily_logs(trip):
+    return [daily_log_as_dict(row) for row in get_daily_log_rows(trip)]
@@ -0,0 +1,549 @@
+"""
+Nominatim geocoding behind a shared result cache.
+
+Results are keyed by the normalized query only (not the client), so every
+user typing "chicago" after the first one is served from the cache. Besides
+exact hits, a prefix index maps every prefix of a cached query to that
+query, which lets an autocomplete keystroke such as "chica" be answered from
+the cached "chicago" results that still match it. Nominatim is called only
+when neither finds anything.
+
+settings.GEOCODER_MODE can put the offline gazetteer (see gazetteer.py) in
+front of all of this: "local" answers from it alone, "local_then_nominatim"
+falls back to the cached Nominatim path when it has no match, and
+"nominatim" (the default) does not use it.
+
+Every Nominatim call waits for a slot from the cluster-wide rate limit
+(rate_limit.py; the usage policy allows one request per second). While
+the limit is saturated, queries with an expired ("stale") cached result get
+that result instead of queueing, and the rest wait up to the limit's
+max_wait before RateLimited is raised. Stale results are also served when
+Nominatim fails; its errors are never cached.
+"""
+import asyncio
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from functools import partial
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+
+from .async_http import get_async_client
+from .gazetteer import DEFAULT_REVERSE_MAX_KM, get_gazetteer
+from .http_client import get_client
+from .rate_limit import RateLimited, get_bucket
+from .single_flight import get_flight
+from ..utils import metrics
+
+NOMINATIM_URL = "https://nominatim.openstreetmap.org"
+NOMINATIM_HEADERS = {
+    "User-Agent": "HOS-Trip-Planner/1.0 (https://hostp.webworkstt.com)",
+}
+nominatim_bucket = get_bucket("nominatim")
+# Retries wait for a rate-limit slot of their own
+nominatim_client = get_client("nominatim", headers=NOMINATIM_HEADERS, rate_limit=nominatim_bucket)
+nominatim_async_client = get_async_client("nominatim")
+nominatim_flight = get_flight("nominatim")
+
+MIN_QUERY_LENGTH = 3
+SEARCH_LIMIT = 5
+RESULT_FIELDS = ("place_id", "display_name", "lat", "lon")
+
+GEOCODER_NOMINATIM = "nominatim"
+GEOCODER_LOCAL = "local"
+GEOCODER_LOCAL_THEN_NOMINATIM = "local_then_nominatim"
+GEOCODER_MODES = (GEOCODER_NOMINATIM, GEOCODER_LOCAL, GEOCODER_LOCAL_THEN_NOMINATIM)
+
+
+def normalize_query(query: str) -> str:
+    """Case- and spacing-insensitive form of a search query, used as its cache key."""
+    query = unicodedata.normalize("NFKC", query).casefold()
+    query = re.sub(r"\s*,\s*", ", ", query)
+    return " ".join(query.split()).strip(", ")
+
+
+def _words(text: str):
+    return re.findall(r"\w+", text.casefold())
+
+
+def matches_prefix(query: str, display_name: str) -> bool:
+    """
+    Whether a result still matches a shorter query: every query word but the
+    last appears among the result's words, and the last starts one of them.
+    """
+    query_words = _words(query)
+    if not query_words:
+        return False
+    words = _words(display_name)
+    *complete, partial = query_words
+    return all(word in words for word in complete) and any(word.startswith(partial) for word in words)
+
+
+class GeocodeCache:
+    """
+    Two-tier cache of normalized query -> result list, laid out like
+    ors.RouteCache: a small in-process LRU in front of a Django cache alias
+    shared by every worker. `kind` separates search results ("results")
+    from reverse lookups ("reverse", keyed by rounded coordinates).
+
+    Non-empty entries are also kept in the shared tier for `stale_ttl`
+    after they expire; `get_stale()` reads them while Nominatim's rate
+    limit is saturated.
+
+    `index_prefix()` additionally records, under each prefix of a cached
+    query (at least MIN_QUERY_LENGTH characters), the most recent queries it
+    begins. The index is updated with a read-modify-write, so concurrent
+    writers can drop an entry; that only costs a later prefix hit.
+    """
+
+    def __init__(self, max_entries=512, ttl=7 * 86400, empty_ttl=3600, local_ttl=300,
+                 stale_ttl=30 * 86400, alias="shared", queries_per_prefix=8):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.empty_ttl = min(empty_ttl, ttl)
+        self.local_ttl = min(local_ttl, ttl)
+        self.alias = alias
+        self.queries_per_prefix = queries_per_prefix
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.alias] if self.alias else None
+
+    @staticmethod
+    def make_key(kind: str, normalized: str) -> str:
+        return f"geocode-{kind}:{hashlib.sha256(normalized.encode('utf-8')).hexdigest()}"
+
+    def _get_local(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None and entry[0] > now:
+                self._local.move_to_end(key)
+                return entry[1]
+            if entry is not None:
+                del self._local[key]
+        return None
+
+    def _store_local(self, key, results):
+        with self._lock:
+            self._local[key] = (time.monotonic() + self.local_ttl, results)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def get(self, normalized: str, kind="results"):
+        """Cached results for the exact query, or None."""
+        key = self.make_key(kind, normalized)
+        results = self._get_local(key)
+        if results is not None:
+            metrics.incr("geocode.cache.local_hits")
+            return results.copy()
+
+        shared = self.shared
+        results = shared.get(key) if shared is not None else None
+        if results is not None:
+            self._store_local(key, results)
+            metrics.incr("geocode.cache.shared_hits")
+            return results.copy()
+        return None
+
+    def get_stale(self, normalized: str, kind="results"):
+        """Results for the exact query kept past their expiry, or None."""
+        shared = self.shared
+        return shared.get(self.make_key(f"stale-{kind}", normalized)) if shared is not None else None
+
+    def get_by_prefix(self, normalized: str):
+        """Results of longer cached queries starting with this one that still match it, or None."""
+        shared = self.shared
+        if shared is None:
+            return None
+        candidates = shared.get(self.make_key("prefix", normalized)) or []
+        found = shared.get_many([self.make_key("results", query) for query in candidates])
+        results, seen = [], set()
+        for query in candidates:
+            for result in found.get(self.make_key("results", query), []):
+                if result["place_id"] not in seen and matches_prefix(normalized, result["display_name"]):
+                    seen.add(result["place_id"])
+                    results.append(result)
+        if not results:
+            return None
+        metrics.incr("geocode.cache.prefix_hits")
+        return results[:SEARCH_LIMIT]
+
+    def set(self, normalized: str, results, kind="results"):
+        key = self.make_key(kind, normalized)
+        self._store_local(key, results)
+        shared = self.shared
+        if shared is None:
+            return
+        shared.set(key, results, timeout=self.ttl if results else self.empty_ttl)
+        if results:
+            shared.set(self.make_key(f"stale-{kind}", normalized), results, timeout=self.ttl + self.stale_ttl)
+        if results and kind == "results":
+            self.index_prefix(normalized)
+
+    def index_prefix(self, normalized: str):
+        prefixes = {
+            self.make_key("prefix", normalized[:end]): normalized[:end]
+            for end in range(MIN_QUERY_LENGTH, len(normalized))
+        }
+        if not prefixes:
+            return
+        shared = self.shared
+        current = shared.get_many(list(prefixes))
+        updates = {}
+        for key in prefixes:
+            queries = [query for query in current.get(key, []) if query != normalized]
+            updates[key] = [normalized, *queries][:self.queries_per_prefix]
+        shared.set_many(updates, timeout=self.ttl)
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    def stats(self) -> dict:
+        local_hits = metrics.get_counter("geocode.cache.local_hits")
+        shared_hits = metrics.get_counter("geocode.cache.shared_hits")
+        prefix_hits = metrics.get_counter("geocode.cache.prefix_hits")
+        stale_hits = metrics.get_counter("geocode.cache.stale_hits")
+        misses = metrics.get_counter("geocode.cache.misses")
+        hits = local_hits + shared_hits + prefix_hits + stale_hits
+        return {
+            "local_hits": local_hits,
+            "shared_hits": shared_hits,
+            "prefix_hits": prefix_hits,
+            "stale_hits": stale_hits,
+            "misses": misses,
+            "hit_ratio": hits / (hits + misses) if hits + misses else 0.0,
+            "local_entries": len(self._local),
+        }
+
+
+geocode_cache = GeocodeCache(
+    max_entries=getattr(settings, "GEOCODE_CACHE_SIZE", 512),
+    ttl=getattr(settings, "GEOCODE_CACHE_TTL", 7 * 86400),
+    stale_ttl=getattr(settings, "GEOCODE_CACHE_STALE_TTL", 30 * 86400),
+    alias=getattr(settings, "GEOCODE_CACHE_ALIAS", "shared"),
+)
+
+
+def nominatim_url(path: str) -> str:
+    return f"{getattr(settings, 'NOMINATIM_URL', NOMINATIM_URL)}/{path}"
+
+
+def _search_params(q: str) -> dict:
+    return {
+        "q": q,
+        "format": "json",
+        "countrycodes": "us",
+        "addressdetails": 0,
+        "limit": SEARCH_LIMIT,
+        "dedupe": 0,
+        "accept-language": "en",
+    }
+
+
+def _search_data(response):
+    # Only a real answer may be cached; an error must not pass for "no places"
+    if response.status_code != 200:
+        raise requests.HTTPError(f"Nominatim search returned {response.status_code}", response=response)
+    return response.json()
+
+
+def _search_results(data):
+    return [{field: str(item.get(field, "")) for field in RESULT_FIELDS} for item in data]
+
+
+def _reverse_params(lat: float, lon: float) -> dict:
+    return {"format": "json", "lat": lat, "lon": lon, "countrycodes": "us"}
+
+
+def _reverse_result(response):
+    if response.status_code != 200:
+        raise requests.HTTPError(f"Nominatim reverse returned {response.status_code}", response=response)
+    data = response.json()
+    return {field: str(data.get(field, "")) for field in ("display_name", "lat", "lon")}
+
+
+def nominatim_get(path: str, params: dict, max_wait=None):
+    """GET a Nominatim endpoint in the next rate-limit slot within max_wait seconds."""
+    nominatim_bucket.acquire(max_wait)
+    return nominatim_client.get(nominatim_url(path), params=params)
+
+
+def nominatim_search(query: str, max_wait=None):
+    """
+    Nominatim search for a US place, falling back to the first word when the
+    full query finds nothing. Raises requests.RequestException if Nominatim
+    cannot be reached (requests.HTTPError for a non-200 answer), RateLimited
+    if no call slot is free within max_wait.
+    """
+
+    def search(q):
+        return _search_data(nominatim_get("search", _search_params(q), max_wait))
+
+    start = time.perf_counter()
+    try:
+        data = search(query)
+        # Optional fallback: use first word if original query returns nothing
+        if not data and " " in query:
+            data = search(query.split()[0])
+    finally:
+        metrics.observe("geocode.upstream.latency", time.perf_counter() - start)
+    return _search_results(data)
+
+
+def nominatim_reverse(lat: float, lon: float, max_wait=None):
+    """
+    Nominatim reverse geocode as {display_name, lat, lon}. Raises
+    requests.HTTPError for a non-200 answer, and otherwise like
+    nominatim_search.
+    """
+    return _reverse_result(nominatim_get("reverse", _reverse_params(lat, lon), max_wait))
+
+
+def _fetch_or_stale(normalized: str, kind: str, fetch):
+    """
+    Call fetch(max_wait) and cache what it returns. When a stale result is on
+    hand, only a rate-limit slot that is free right away is taken, and the
+    stale result is served if there is none or Nominatim fails.
+    """
+    stale = geocode_cache.get_stale(normalized, kind)
+    try:
+        results = fetch(0 if stale is not None else None)
+    except requests.RequestException:
+        if stale is None:
+            raise
+        metrics.incr("geocode.cache.stale_hits")
+        return stale
+    metrics.incr("geocode.cache.misses")
+    geocode_cache.set(normalized, results, kind)
+    return results
+
+
+def geocoder_mode() -> str:
+    mode = getattr(settings, "GEOCODER_MODE", GEOCODER_NOMINATIM)
+    if mode not in GEOCODER_MODES:
+        raise ImproperlyConfigured(f"GEOCODER_MODE must be one of {', '.join(GEOCODER_MODES)}, not {mode!r}")
+    return mode
+
+
+def local_gazetteer():
+    """The configured gazetteer, or None in "nominatim" mode."""
+    mode = geocoder_mode()
+    if mode == GEOCODER_NOMINATIM:
+        return None
+    gazetteer = get_gazetteer()
+    if gazetteer is None:
+        raise ImproperlyConfigured(f"GEOCODER_MODE={mode!r} needs GAZETTEER_PATH")
+    return gazetteer
+
+
+def _local_search(normalized: str):
+    """Gazetteer results, or None when GEOCODER_MODE leaves the query to Nominatim."""
+    gazetteer = local_gazetteer()
+    if gazetteer is None:
+        return None
+    results = gazetteer.search(normalized, SEARCH_LIMIT)
+    metrics.incr("geocode.local.hits" if results else "geocode.local.misses")
+    if results or geocoder_mode() == GEOCODER_LOCAL:
+        return results
+    return None
+
+
+def _cached_search(normalized: str):
+    results = geocode_cache.get(normalized)
+    if results is None:
+        results = geocode_cache.get_by_prefix(normalized)
+    return results
+
+
+def search_places(query: str):
+    """
+    Geocode search: the local gazetteer first if GEOCODER_MODE uses it, then
+    the cache (exact hit, then prefix hit), then Nominatim. Returns a list of
+    {place_id, display_name, lat, lon}; queries shorter than MIN_QUERY_LENGTH
+    get [] without a lookup.
+    """
+    normalized = normalize_query(query)
+    if len(normalized) < MIN_QUERY_LENGTH:
+        return []
+
+    results = _local_search(normalized)
+    if results is None:
+        results = _cached_search(normalized)
+    if results is not None:
+        return results
+
+    def fetch():
+        return _fetch_or_stale(normalized, "results", lambda max_wait: nominatim_search(normalized, max_wait))
+
+    # Users autocompleting the same place at the same moment share one call
+    return nominatim_flight.do(
+        geocode_cache.make_key("results", normalized), fetch, lookup=lambda: geocode_cache.get(normalized),
+    )
+
+
+def reverse_geocode(lat: float, lon: float):
+    """
+    Nominatim reverse geocode through the geocode cache, keyed by the
+    coordinates rounded to about 10 m. Raises like nominatim_reverse, or
+    RateLimited when the rate limit is saturated and nothing is cached.
+    """
+    normalized = f"{lat:.4f},{lon:.4f}"
+    cached = geocode_cache.get(normalized, "reverse")
+    if cached is not None:
+        return cached
+
+    def fetch():
+        return _fetch_or_stale(normalized, "reverse", lambda max_wait: nominatim_reverse(lat, lon, max_wait))
+
+    return nominatim_flight.do(
+        geocode_cache.make_key("reverse", normalized), fetch,
+        lookup=lambda: geocode_cache.get(normalized, "reverse"),
+    )
+
+
+def reverse_place(lat: float, lon: float):
+    """
+    Nearest gazetteer place within GEOCODE_REVERSE_MAX_KM as
+    {display_name, lat, lon, ...}, or None if there is none or GEOCODER_MODE
+    does not use the gazetteer.
+    """
+    gazetteer = local_gazetteer()
+    if gazetteer is None:
+        return None
+    place = gazetteer.reverse(lat, lon, getattr(settings, "GEOCODE_REVERSE_MAX_KM", DEFAULT_REVERSE_MAX_KM))
+    metrics.incr("geocode.local.reverse_hits" if place else "geocode.local.reverse_misses")
+    return place
+
+
+# Async versions for the ASGI views. Cache, gazetteer and rate-limit
+# bookkeeping runs in threads through sync_to_async (the shared cache is a
+# database table); only the Nominatim round trips and the waits for a
+# rate-limit slot or a coalesced call happen on the event loop. None of it
+# needs the request's thread, and under ASGI each request would otherwise
+# get a thread of its own for these short calls, so they go to the shared
+# executor (thread_sensitive=False).
+
+
+async def anominatim_get(path: str, params: dict, max_wait=None, reserved=None):
+    """nominatim_get() without holding a thread while queued or in flight."""
+    await nominatim_bucket.aacquire(max_wait, reserved)
+    return await nominatim_async_client.get(nominatim_url(path), params=params)
+
+
+async def anominatim_search(query: str, max_wait=None):
+    """
+    nominatim_search() for async callers. The first-word fallback is sent
+    alongside the full query rather than after it when the rate limit has a
+    slot free right away; its answer is only used if the full query finds
+    nothing, as before.
+    """
+
+    async def search(q, wait, reserved=None):
+        return _search_data(await anominatim_get("search", _search_params(q), wait, reserved))
+
+    async def speculate(q, primary_reserved):
+        # The full query gets the first rate-limit slot
+        await primary_reserved.wait()
+        return await search(q, 0)
+
+    start = time.perf_counter()
+    try:
+        primary_reserved = asyncio.Event()
+        primary = asyncio.create_task(search(query, max_wait, primary_reserved))
+        fallback = None
+        if " " in query:
+            fallback = asyncio.create_task(speculate(query.split()[0], primary_reserved))
+            # Nobody awaits a fallback that is no longer needed
+            fallback.add_done_callback(lambda task: task.cancelled() or task.exception())
+        try:
+            data = await primary
+        except BaseException:
+            if fallback is not None:
+                fallback.cancel()
+            raise
+        if fallback is not None:
+            if data:
+                fallback.cancel()
+            else:
+                try:
+                    data = await fallback
+                except RateLimited:
+                    # No slot was free to send it early: send it now
+                    data = await search(query.split()[0], max_wait)
+    finally:
+        metrics.observe("geocode.upstream.latency", time.perf_counter() - start)
+    return _search_results(data)
+
+
+async def anominatim_reverse(lat: float, lon: float, max_wait=None):
+    """nominatim_reverse() for async callers."""
+    return _reverse_result(await anominatim_get("reverse", _reverse_params(lat, lon), max_wait))
+
+
+async def _afetch_or_stale(normalized: str, kind: str, fetch):
+    """_fetch_or_stale() with an async fetch."""
+    stale = await sync_to_async(geocode_cache.get_stale, thread_sensitive=False)(normalized, kind)
+    try:
+        results = await fetch(0 if stale is not None else None)
+    except requests.RequestException:
+        if stale is None:
+            raise
+        metrics.incr("geocode.cache.stale_hits")
+        return stale
+    metrics.incr("geocode.cache.misses")
+    await sync_to_async(geocode_cache.set, thread_sensitive=False)(normalized, results, kind)
+    return results
+
+
+async def asearch_places(query: str):
+    """search_places() for async callers."""
+    normalized = normalize_query(query)
+    if len(normalized) < MIN_QUERY_LENGTH:
+        return []
+
+    results = await sync_to_async(_local_search, thread_sensitive=False)(normalized)
+    if results is None:
+        results = await sync_to_async(_cached_search, thread_sensitive=False)(normalized)
+    if results is not None:
+        return results
+
+    async def fetch():
+        return await _afetch_or_stale(
+            normalized, "results", lambda max_wait: anominatim_search(normalized, max_wait),
+        )
+
+    return await nominatim_flight.ado(
+        geocode_cache.make_key("results", normalized), fetch,
+        lookup=sync_to_async(partial(geocode_cache.get, normalized), thread_sensitive=False),
+    )
+
+
+async def areverse_geocode(lat: float, lon: float):
+    """reverse_geocode() for async callers."""
+    normalized = f"{lat:.4f},{lon:.4f}"
+    cached = await sync_to_async(geocode_cache.get, thread_sensitive=False)(normalized, "reverse")
+    if cached is not None:
+        return cached
+
+    async def fetch():
+        return await _afetch_or_stale(
+            normalized, "reverse", lambda max_wait: anominatim_reverse(lat, lon, max_wait),
+        )
+
+    return await nominatim_flight.ado(
+        geocode_cache.make_key("reverse", normalized), fetch,
+        lookup=sync_to_async(partial(geocode_cache.get, normalized, "reverse"), thread_sensitive=False),
+    )
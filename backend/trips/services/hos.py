@@ -1,63 +1,72 @@
-from decimal import Decimal
 from typing import List
 
+from .route_geometry import RouteGeometry
+
+# Planner units: time is kept in integer seconds and distance in integer
+# meters. Conversion to Decimal hours/miles happens only when TripLeg rows
+# are built (see plan.py), so the chunker never touches the Decimal context.
+SECONDS_PER_HOUR = 3600
+METERS_PER_MILE = 1609.344
+
 # FMCSA constants
-HOS_MAX_DRIVE_HOURS = Decimal("11.0")
-HOS_MAX_DUTY_HOURS = Decimal("14.0")
-HOS_REST_BREAK_HOURS = Decimal("10.0")
-HOS_BREAK_REQUIRED_AFTER_HOURS = Decimal("8.0")
-HOS_CYCLE_LIMIT_HOURS = Decimal("70.0")
-HOS_MIN_BREAK_DURATION = Decimal("0.5")
-FUEL_STOP_INTERVAL_MILES = Decimal("1000.0")
-FUEL_STOP_DURATION = Decimal("0.25")
-PICKUP_DROPOFF_DURATION = Decimal("1.0")
-
-def find_coord_at(cum_coords, target_miles):
-    """
-    Given the list of (cum_miles, lon, lat),
-    return an interpolated (lon, lat) for target_miles.
-    If target_miles is beyond the end, clamp to the last coordinate.
-    """
-    if target_miles <= 0:
-        return (cum_coords[0][1], cum_coords[0][2])  # (lon, lat)
+HOS_MAX_DRIVE_SECONDS = 11 * SECONDS_PER_HOUR
+HOS_MAX_DUTY_SECONDS = 14 * SECONDS_PER_HOUR
+HOS_REST_BREAK_SECONDS = 10 * SECONDS_PER_HOUR
+HOS_BREAK_REQUIRED_AFTER_SECONDS = 8 * SECONDS_PER_HOUR
+HOS_CYCLE_LIMIT_SECONDS = 70 * SECONDS_PER_HOUR
+HOS_CYCLE_RESET_SECONDS = 34 * SECONDS_PER_HOUR
+HOS_MIN_BREAK_SECONDS = 30 * 60
+FUEL_STOP_INTERVAL_METERS = 1_609_344  # 1000 miles
+FUEL_STOP_SECONDS = 15 * 60
+PICKUP_DROPOFF_SECONDS = 1 * SECONDS_PER_HOUR
+
+
+def hours_to_seconds(hours) -> int:
+    return int(round(float(hours) * SECONDS_PER_HOUR))
 
-    # If beyond end, clamp:
-    if target_miles >= cum_coords[-1][0]:
-        return (cum_coords[-1][1], cum_coords[-1][2])
 
-    # Otherwise, binary search or linear search.
-    # We'll do a simple linear approach here for clarity:
-    for i in range(len(cum_coords) - 1):
-        distA, lonA, latA = cum_coords[i]
-        distB, lonB, latB = cum_coords[i+1]
+def miles_to_meters(miles) -> int:
+    return int(round(float(miles) * METERS_PER_MILE))
 
-        if distA <= target_miles <= distB:
-            # We are in between i and i+1
-            ratio = (target_miles - distA) / (distB - distA)
-            # linear interpolation:
-            lon = lonA + ratio * (lonB - lonA)
-            lat = latA + ratio * (latB - latA)
-            return (lon, lat)
 
-    # Fallback (shouldn't happen if above checks are correct)
-    return (cum_coords[-1][1], cum_coords[-1][2])
+def meters_to_miles(meters: int) -> float:
+    return meters / METERS_PER_MILE
 
 
-def slice_geometry_for_leg(cum_coords, start_miles, end_miles):
+def _div_round(numerator: int, denominator: int) -> int:
+    """Integer division rounded half up (both operands non-negative)."""
+    return (2 * numerator + denominator) // (2 * denominator)
+
+
+def step_offsets_in_segment(seg_steps, route_geometry: RouteGeometry, seg_meters: int):
     """
-    Returns a slice of the geometry from cum_coords between start_miles and end_miles.
-    Converts to (lat, lon) tuples for Leaflet.
+    Locate each ORS step inside its segment, in planner meters from the segment
+    start, using the step's way_points into the route geometry. Geometry miles
+    are rescaled to the segment's ORS distance so offsets share the chunker's
+    distance scale. Steps without way_points get None.
     """
-    coords = []
-    for cum_mi, lon, lat in cum_coords:
-        if start_miles <= cum_mi <= end_miles:
-            coords.append((lat, lon))  # Flip to (lat, lon) for Leaflet
-        elif cum_mi > end_miles:
-            break
-    return coords
+    points = [step.get("way_points") or [] for step in seg_steps]
+    indices = [wp[0] for wp in points if len(wp) == 2]
+    ends = [wp[1] for wp in points if len(wp) == 2]
+    if not indices or not len(route_geometry):
+        return [None] * len(seg_steps)
+
+    miles = route_geometry.miles
+    seg_start = miles[min(indices)]
+    seg_span = miles[max(ends)] - seg_start
+
+    offsets = []
+    for wp in points:
+        if len(wp) != 2:
+            offsets.append(None)
+        elif seg_span <= 0:
+            offsets.append(0)
+        else:
+            offsets.append(int(round((miles[wp[0]] - seg_start) / seg_span * seg_meters)))
+    return offsets
 
 
-def chunk_legs_by_hos(segments, coordinates, start_cycle_hours, cum_coords, total_route_distance):
+def chunk_legs_by_hos(segments, coordinates, start_cycle_hours, route_geometry: RouteGeometry, total_route_distance):
     """
     A fully incremental approach that:
       - Slices each segment into smaller partial drive legs
@@ -65,35 +74,52 @@ def chunk_legs_by_hos(segments, coordinates, start_cycle_hours, cum_coords, tota
       - Respects 11-hr drive limit, 8-hr break, 70-hr cycle, etc.
       - Inserts rest breaks & fuel stops exactly when needed
       - Avoids negative leftover or weird 'OTHER' segments
+
+    route_geometry is built once by the caller; a forward-only cursor over it
+    follows progress_meters so position and slice lookups never rescan the route.
+
+    Each drive chunk carries only the ORS steps that start inside its own
+    stretch of the segment (the last chunk of a segment takes any remainder).
+
+    All counters are integers (seconds / meters). Each leg carries
+    "distance_meters" and "duration_seconds". Against the Decimal chunker
+    this replaced, chunk ends move by at most about a second: each chunk's
+    duration is within 1.5 s and its distance within what the segment's
+    speed covers in 1.5 s (0.03 mi at 70 mph). A segment's chunks sum
+    exactly to its ORS distance and duration rounded to whole meters/seconds.
+    A 30-minute break that falls due with a 34-hour reset is left out (the
+    reset is off duty already); the Decimal chunker emitted or skipped it
+    depending on its rounding drift.
     """
     legs = []
+    route_cursor = route_geometry.cursor()
     leg_order = 0
-    progress_miles = Decimal("0.0")  # how far along the route we are
+    progress_meters = 0  # how far along the route we are
 
     # Tracking
-    current_cycle_hours = Decimal(start_cycle_hours)
-    current_drive_hours = Decimal("0.0")
-    duty_hours_since_rest = Decimal("0.0")
-    drive_hours_since_break = Decimal("0.0")
-    miles_since_fuel = Decimal("0.0")
+    cycle_seconds = hours_to_seconds(start_cycle_hours)
+    drive_seconds = 0
+    duty_seconds_since_rest = 0
+    drive_seconds_since_break = 0
+    meters_since_fuel = 0
 
     pickup_stop_inserted = False
 
     def add_event_leg(label: str,
-                      duration_hrs: Decimal,
+                      duration_seconds: int,
                       note: str,
                       is_rest=False,
                       is_fuel=False):
         """
         Creates a zero-distance 'leg' at the end of the last leg's coordinates.
         """
-        nonlocal leg_order, current_cycle_hours, duty_hours_since_rest
-        nonlocal current_drive_hours, drive_hours_since_break, miles_since_fuel
+        nonlocal leg_order, cycle_seconds, duty_seconds_since_rest
+        nonlocal drive_seconds, drive_seconds_since_break
 
         last_leg = legs[-1] if legs else {}
         # We place the event at the "end" of the last drive leg
-        # so that is find_coord_at(cum_coords, progress_miles)
-        event_lon, event_lat = find_coord_at(cum_coords, float(progress_miles))
+        # so that is the route position at progress_meters
+        event_lon, event_lat = route_cursor.position_at(meters_to_miles(progress_meters))
 
         # If we already have a rest immediately prior, skip
         if is_rest and last_leg.get("is_rest_stop", False):
@@ -107,8 +133,8 @@ def chunk_legs_by_hos(segments, coordinates, start_cycle_hours, cum_coords, tota
             "start_lon": event_lon,
             "end_lat": event_lat,
             "end_lon": event_lon,
-            "distance_miles": 0.0,
-            "duration_hours": duration_hrs,
+            "distance_meters": 0,
+            "duration_seconds": duration_seconds,
             "is_rest_stop": is_rest,
             "is_fuel_stop": is_fuel,
             "notes": note,
@@ -117,33 +143,30 @@ def chunk_legs_by_hos(segments, coordinates, start_cycle_hours, cum_coords, tota
         leg_order += 1
 
         # Update counters
-        current_cycle_hours += duration_hrs
-        duty_hours_since_rest += duration_hrs
+        cycle_seconds += duration_seconds
+        duty_seconds_since_rest += duration_seconds
 
         if is_rest:
             # Reset daily drive counters after a 10-hr rest
-            current_drive_hours = Decimal("0.0")
-            duty_hours_since_rest = Decimal("0.0")
-            drive_hours_since_break = Decimal("0.0")
+            drive_seconds = 0
+            duty_seconds_since_rest = 0
+            drive_seconds_since_break = 0
 
     # Helper: create a partial drive chunk
-    def add_drive_leg(chunk_miles, duration_hrs, seg_index, steps=None):
-        nonlocal leg_order, current_cycle_hours, duty_hours_since_rest
-        nonlocal current_drive_hours, drive_hours_since_break, miles_since_fuel
-        nonlocal progress_miles
+    def add_drive_leg(chunk_meters, chunk_seconds, seg_index, steps=None):
+        nonlocal leg_order, cycle_seconds, duty_seconds_since_rest
+        nonlocal drive_seconds, drive_seconds_since_break, meters_since_fuel
+        nonlocal progress_meters
         if steps is None:
             steps = []
+        start_miles = meters_to_miles(progress_meters)
+        end_miles = meters_to_miles(progress_meters + chunk_meters)
         # Start coordinate
-        start_lon, start_lat = find_coord_at(cum_coords, float(progress_miles))
+        start_lon, start_lat = route_cursor.position_at(start_miles)
         # End coordinate
-        end_lon, end_lat = find_coord_at(cum_coords, float(progress_miles + chunk_miles))
-
+        end_lon, end_lat = route_geometry.position_at(end_miles, route_cursor.index)
 
-        geometry_slice = slice_geometry_for_leg(
-            cum_coords,
-            float(progress_miles),
-            float(progress_miles + chunk_miles)
-        )
+        geometry_slice = route_cursor.slice(start_miles, end_miles)
 
         legs.append({
             "leg_order": leg_order,
@@ -154,137 +177,134 @@ def chunk_legs_by_hos(segments, coordinates, start_cycle_hours, cum_coords, tota
             "start_lon": start_lon,
             "end_lat": end_lat,
             "end_lon": end_lon,
-            "distance_miles": chunk_miles,
-            "duration_hours": duration_hrs,
+            "distance_meters": chunk_meters,
+            "duration_seconds": chunk_seconds,
             "is_rest_stop": False,
             "is_fuel_stop": False,
             "notes": "",
             "steps": steps,
-            "polyline_geometry": geometry_slice,  # 👈 the new line!
+            "polyline_geometry": geometry_slice,
         })
 
         # advance the progress
-        progress_miles += chunk_miles
-        # update all your HOS counters, etc.
+        progress_meters += chunk_meters
 
         leg_order += 1
 
         # Update counters
-        current_cycle_hours += duration_hrs
-        duty_hours_since_rest += duration_hrs
-        current_drive_hours += duration_hrs
-        drive_hours_since_break += duration_hrs
-        miles_since_fuel += chunk_miles
+        cycle_seconds += chunk_seconds
+        duty_seconds_since_rest += chunk_seconds
+        drive_seconds += chunk_seconds
+        drive_seconds_since_break += chunk_seconds
+        meters_since_fuel += chunk_meters
 
     for i, segment in enumerate(segments):
-        seg_distance_miles = Decimal(segment["distance"])
-        seg_duration_hrs = Decimal(segment["duration"]) / 3600
+        seg_meters = miles_to_meters(segment["distance"])
+        seg_seconds = int(round(float(segment["duration"])))
         seg_steps = segment.get("steps", [])
+        step_offsets = step_offsets_in_segment(seg_steps, route_geometry, seg_meters)
+        next_step = 0
 
-        if i == 0 and not pickup_stop_inserted:
-            # We'll insert the pickup stop AFTER the first drive chunk of this segment, so let's keep a flag
-            pass
-
-        # The ratio from distance -> duration
-        # (assuming uniform speed across segment)
-        if seg_distance_miles > 0:
-            # hours per mile
-            speed_ratio = seg_duration_hrs / seg_distance_miles
-        else:
-            speed_ratio = Decimal("0.0")
+        # Position inside the segment. Time is derived from distance (and
+        # vice versa) against the segment start, assuming uniform speed, so
+        # rounding never accumulates from chunk to chunk.
+        seg_pos_meters = 0
+        seg_pos_seconds = 0
 
         # While we have distance left in this segment:
-        dist_left = seg_distance_miles
-        while dist_left > 0:
-            # 1) If we are near the 8-hour mark, do we need a break?
-            if drive_hours_since_break >= HOS_BREAK_REQUIRED_AFTER_HOURS:
-                add_event_leg("30-min Break", HOS_MIN_BREAK_DURATION, "30-minute required HOS break")
-                drive_hours_since_break = Decimal("0.0")
-
-            # 2) Check if we've exceeded the 70-hour cycle limit:
-            if current_cycle_hours >= HOS_CYCLE_LIMIT_HOURS:
+        while seg_pos_meters < seg_meters:
+            dist_left = seg_meters - seg_pos_meters
+
+            # 1) Past the 8-hour mark a 30-minute break is due
+            break_due = drive_seconds_since_break >= HOS_BREAK_REQUIRED_AFTER_SECONDS
+
+            # 2) Check if we've exceeded the 70-hour cycle limit, counting a due
+            #    break: a 34-hour reset right after it would make the break
+            #    pointless, so the reset takes its place
+            due_seconds = HOS_MIN_BREAK_SECONDS if break_due else 0
+            if cycle_seconds + due_seconds >= HOS_CYCLE_LIMIT_SECONDS:
                 # Insert 34-hour reset
-                add_event_leg("Cycle Reset", Decimal("34.0"), "34-hour off-duty reset to restart 70-hour cycle", is_rest=True)
+                add_event_leg("Cycle Reset", HOS_CYCLE_RESET_SECONDS, "34-hour off-duty reset to restart 70-hour cycle", is_rest=True)
 
                 # This rest fully resets your cycle counters
-                current_cycle_hours = Decimal("0.0")
-                duty_hours_since_rest = Decimal("0.0")
-                current_drive_hours = Decimal("0.0")
-                drive_hours_since_break = Decimal("0.0")
-                miles_since_fuel = Decimal("0.0")
-
-                # Continue after the cycle reset, so more driving can happen in the same while loop iteration
-                # or break if you prefer to let next iteration handle new chunk
-
-            # 3) If we are near the 11-hour or 14-hour daily limit, do a 10-hr rest
-            if (current_drive_hours >= HOS_MAX_DRIVE_HOURS
-            or duty_hours_since_rest >= HOS_MAX_DUTY_HOURS):
+                cycle_seconds = 0
+                duty_seconds_since_rest = 0
+                drive_seconds = 0
+                drive_seconds_since_break = 0
+                meters_since_fuel = 0
+            elif break_due:
+                add_event_leg("30-min Break", HOS_MIN_BREAK_SECONDS, "30-minute required HOS break")
+                drive_seconds_since_break = 0
+
+            # 3) If we are at the 11-hour or 14-hour daily limit, do a 10-hr rest
+            if (drive_seconds >= HOS_MAX_DRIVE_SECONDS
+            or duty_seconds_since_rest >= HOS_MAX_DUTY_SECONDS):
                 # Insert 10-hour rest
-                add_event_leg("Rest Break", HOS_REST_BREAK_HOURS, "Required 10-hour rest break", is_rest=True)
+                add_event_leg("Rest Break", HOS_REST_BREAK_SECONDS, "Required 10-hour rest break", is_rest=True)
                 # That resets daily counters, so we can keep going
 
-
-            # 3) Figure out how many hours remain in the daily 11-hour drive limit:
-            daily_drive_left = HOS_MAX_DRIVE_HOURS - current_drive_hours
-            if daily_drive_left <= 0:
-                # We must do a rest break
-                add_event_leg("Rest Break", HOS_REST_BREAK_HOURS, "Required 10-hour rest break", is_rest=True)
-                daily_drive_left = HOS_MAX_DRIVE_HOURS
-
-            # 4) Fuel check: how many miles until we must refuel?
-            fuel_miles_left = FUEL_STOP_INTERVAL_MILES - miles_since_fuel
-            if fuel_miles_left <= 0:
+            # 4) Fuel check: how many meters until we must refuel?
+            fuel_meters_left = FUEL_STOP_INTERVAL_METERS - meters_since_fuel
+            if fuel_meters_left <= 0:
                 # If we've already exceeded 1000 miles somehow, force a fuel stop
-                add_event_leg("Fuel Stop", FUEL_STOP_DURATION, "Fuel stop required every 1000 miles", is_fuel=True)
-                fuel_miles_left = FUEL_STOP_INTERVAL_MILES
+                add_event_leg("Fuel Stop", FUEL_STOP_SECONDS, "Fuel stop required every 1000 miles", is_fuel=True)
+                meters_since_fuel = 0
+                fuel_meters_left = FUEL_STOP_INTERVAL_METERS
 
             # 5) We can only drive the lesser of:
             #    - dist_left in segment
-            #    - fuel_miles_left
-            #    - daily_drive_left in miles
-            if speed_ratio == 0:
-                # Means no distance? We skip
-                chunk_miles = dist_left
-                chunk_hrs = Decimal("0.0")
+            #    - fuel_meters_left
+            #    - daily drive time left
+            #    - drive time left before the 30-min break
+            if seg_seconds == 0:
+                # Means no duration? Cover the rest of the segment instantly
+                chunk_meters = dist_left
+                chunk_seconds = 0
             else:
-                daily_drive_miles_left = HOS_MAX_DRIVE_HOURS - current_drive_hours
-                daily_drive_miles_left /= speed_ratio
-
-                fuel_miles_left = FUEL_STOP_INTERVAL_MILES - miles_since_fuel
-
-                break_miles_left = Decimal("Infinity")
-                if drive_hours_since_break < HOS_BREAK_REQUIRED_AFTER_HOURS:
-                    break_time_left = HOS_BREAK_REQUIRED_AFTER_HOURS - drive_hours_since_break
-                    break_miles_left = break_time_left / speed_ratio
-
-                # Compute how many miles we can safely drive before needing a break, fuel, or rest
-                chunk_miles = min(dist_left, fuel_miles_left, daily_drive_miles_left, break_miles_left)
-                chunk_hrs = chunk_miles * speed_ratio
-
-            # 6) Create a partial drive leg
-            start_coord = coordinates[i]
-            end_coord = coordinates[i + 1]
-            add_drive_leg(chunk_miles, chunk_hrs, i, seg_steps)
-
-            # 7) Subtract from the segment
-            dist_left -= chunk_miles
-            seg_duration_hrs -= chunk_hrs
+                time_left = min(
+                    HOS_MAX_DRIVE_SECONDS - drive_seconds,
+                    HOS_BREAK_REQUIRED_AFTER_SECONDS - drive_seconds_since_break,
+                )
+                target_meters = seg_pos_meters + min(dist_left, fuel_meters_left)
+                time_limited_meters = _div_round((seg_pos_seconds + time_left) * seg_meters, seg_seconds)
+
+                if time_limited_meters < target_meters:
+                    # A time limit binds first: drive exactly up to it
+                    chunk_seconds = time_left
+                    chunk_meters = time_limited_meters - seg_pos_meters
+                else:
+                    # A distance limit binds first (segment end or fuel)
+                    target_seconds = _div_round(target_meters * seg_seconds, seg_meters)
+                    chunk_seconds = max(target_seconds - seg_pos_seconds, 0)
+                    chunk_meters = target_meters - seg_pos_meters
+
+            # 6) Create a partial drive leg with the steps that start inside it
+            chunk_end = seg_pos_meters + chunk_meters
+            first_step = next_step
+            if chunk_end >= seg_meters:
+                next_step = len(seg_steps)
+            else:
+                while next_step < len(seg_steps) and (
+                    step_offsets[next_step] is None or step_offsets[next_step] < chunk_end
+                ):
+                    next_step += 1
+            add_drive_leg(chunk_meters, chunk_seconds, i, seg_steps[first_step:next_step])
 
-            # 8) If chunk_miles == fuel_miles_left => we hit 1000 exactly => fuel
-            #   Or if miles_since_fuel >= 1000
-            if miles_since_fuel >= FUEL_STOP_INTERVAL_MILES:
-                add_event_leg("Fuel Stop", FUEL_STOP_DURATION, "Fuel stop required every 1000 miles", is_fuel=True)
-                miles_since_fuel = Decimal("0.0")
+            # 7) Advance within the segment
+            seg_pos_meters += chunk_meters
+            seg_pos_seconds += chunk_seconds
 
-            # 9) If daily_drive_left == chunk_hrs => might need rest next loop
-            # We handle that at the top of next iteration or after we exit.
+            # 8) If we hit 1000 miles exactly => fuel
+            if meters_since_fuel >= FUEL_STOP_INTERVAL_METERS:
+                add_event_leg("Fuel Stop", FUEL_STOP_SECONDS, "Fuel stop required every 1000 miles", is_fuel=True)
+                meters_since_fuel = 0
 
         # Insert a 1-hr pickup stop if it's the first segment
         if i == 0 and not pickup_stop_inserted:
-            add_event_leg("Pickup Stop", PICKUP_DROPOFF_DURATION, "1-hour stop for pickup")
+            add_event_leg("Pickup Stop", PICKUP_DROPOFF_SECONDS, "1-hour stop for pickup")
             pickup_stop_inserted = True
 
     # After finishing all segments, we add final dropoff
-    add_event_leg("Dropoff Stop", PICKUP_DROPOFF_DURATION, "1-hour stop for dropoff")
+    add_event_leg("Dropoff Stop", PICKUP_DROPOFF_SECONDS, "1-hour stop for dropoff")
 
     return legs
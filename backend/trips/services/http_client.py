@@ -0,0 +1,181 @@
+"""
+Shared outbound HTTP client for third-party upstreams (ORS, Nominatim).
+
+Each upstream gets one UpstreamClient holding:
+  - a requests.Session with its own keep-alive connection pool
+  - connect/read timeouts applied to every call
+  - bounded retries with jittered exponential backoff, each waiting for a
+    slot of the upstream's rate limit when it has one (rate_limit.TokenBucket)
+  - a circuit breaker that fails fast while the upstream is down
+  - a latency histogram in trips.utils.metrics ("http.<name>.latency")
+"""
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from ..utils import metrics
+
+RETRY_STATUSES = {429, 502, 503, 504}
+RETRY_EXCEPTIONS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+DEFAULT_UPSTREAM_SETTINGS = {
+    "connect_timeout": 3.05,
+    "read_timeout": 10.0,
+    "max_retries": 2,
+    "backoff_base": 0.25,
+    "backoff_max": 2.0,
+    "pool_size": 10,
+    "failure_threshold": 5,
+    "reset_timeout": 30.0,
+}
+
+
+class UpstreamUnavailable(requests.exceptions.ConnectionError):
+    """Raised without touching the network while an upstream's circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Classic three-state breaker.
+
+    closed    -> calls pass; `failure_threshold` consecutive failures open it
+    open      -> calls fail fast until `reset_timeout` has elapsed
+    half-open -> one trial call; success closes, failure re-opens
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def cancel_trial(self):
+        """End a half-open trial that said nothing about the upstream (e.g. cancelled), so another call can try."""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+class UpstreamClient:
+
+    def __init__(self, name, headers=None, rate_limit=None, **options):
+        config = {**DEFAULT_UPSTREAM_SETTINGS, **options}
+        self.name = name
+        self.rate_limit = rate_limit
+        self.timeout = (config["connect_timeout"], config["read_timeout"])
+        self.max_retries = config["max_retries"]
+        self.backoff_base = config["backoff_base"]
+        self.backoff_max = config["backoff_max"]
+        self.breaker = CircuitBreaker(config["failure_threshold"], config["reset_timeout"])
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config["pool_size"], max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if headers:
+            self.session.headers.update(headers)
+
+    def _backoff(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, min(max, base * 2**attempt)]."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request(self, method, url, **kwargs) -> requests.Response:
+        """
+        Send a request, retrying connection errors, timeouts and 429/5xx
+        gateway statuses. The final response is returned even if it is an
+        error status; callers keep checking status_code as before. The
+        first call's rate-limit slot is the caller's to take; every retry
+        takes its own (rate_limit.RateLimited if none is free in time).
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                metrics.incr(f"http.{self.name}.short_circuited")
+                raise UpstreamUnavailable(f"{self.name} circuit is open")
+
+            metrics.incr(f"http.{self.name}.requests")
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.RequestException as exc:
+                metrics.observe(f"http.{self.name}.latency", time.perf_counter() - start)
+                metrics.incr(f"http.{self.name}.errors")
+                # Every failure counts (and ends a half-open trial); only connection errors and timeouts are retried
+                self.breaker.record_failure()
+                if not isinstance(exc, RETRY_EXCEPTIONS) or attempt >= self.max_retries:
+                    raise
+            except BaseException:
+                self.breaker.cancel_trial()
+                raise
+            else:
+                metrics.observe(f"http.{self.name}.latency", time.perf_counter() - start)
+                if response.status_code >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                metrics.incr(f"http.{self.name}.errors")
+
+            metrics.incr(f"http.{self.name}.retries")
+            time.sleep(self._backoff(attempt))
+            if self.rate_limit is not None:
+                self.rate_limit.acquire()
+            attempt += 1
+
+    def get(self, url, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(name: str, headers=None, rate_limit=None) -> UpstreamClient:
+    """Return the process-wide client for an upstream, creating it on first use."""
+    with _clients_lock:
+        client = _clients.get(name)
+        if client is None:
+            options = getattr(settings, "UPSTREAM_HTTP", {}).get(name, {})
+            client = _clients[name] = UpstreamClient(name, headers=headers, rate_limit=rate_limit, **options)
+        return client
@@ -0,0 +1,161 @@
+"""
+Daily log SVG pages in the artifact store.
+
+A page's key hashes the log data it is drawn from together with the template
+version, so re-running generation for an unchanged trip renders nothing, and
+two trips with an identical day share one file. DailyLog.svg_key records
+which artifact belongs to each day.
+
+Documents built from a trip's pages (the multi-day SVG here, the merged PDF
+in log_pdf) are keyed by the bundle digest of the page keys in order.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+
+from ..models import DailyLog
+from .artifacts import get_store
+from .generate_daily_logs import daily_log_as_dict, store_daily_log_rows
+from .svg_log_sheet import SVG_PATH, compile_template, render_log_document, render_svgs
+
+SVG_KIND = "svg"
+DOCUMENT_KIND = "svg-doc"
+
+
+def svg_key(log, svg_input=SVG_PATH) -> str:
+    payload = json.dumps(log, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(f"{compile_template(svg_input).version}\n{payload}".encode("utf-8")).hexdigest()
+
+
+def bundle_digest(page_keys) -> str:
+    return hashlib.sha256("\n".join(page_keys).encode("ascii")).hexdigest()
+
+
+def pdf_overlay_mode() -> bool:
+    return getattr(settings, "LOG_PDF_OVERLAY", True)
+
+
+def page_key(svg_key: str) -> str:
+    """The "pdf-page" key for the SVG stored under svg_key, in the current conversion mode."""
+    # The background is stored per template version; a whole-page conversion uses none
+    mode = f"overlay:{compile_template(SVG_PATH).version}" if pdf_overlay_mode() else "whole"
+    return hashlib.sha256(f"{svg_key}\n{mode}".encode("ascii")).hexdigest()
+
+
+def pdf_etag(svg_keys) -> str:
+    """Bundle digest (and ETag) of the merged PDF for the SVGs stored under svg_keys."""
+    return bundle_digest([page_key(svg_key) for svg_key in svg_keys])
+
+
+def ensure_trip_svgs(trip, workers=None):
+    """
+    Make sure every daily log of the trip has its SVG in the store, rendering
+    only the missing ones. Returns [(DailyLog, path)] by date.
+    """
+    store = get_store()
+    rows = store_daily_log_rows(trip)
+    logs = [daily_log_as_dict(row) for row in rows]
+    keys = [svg_key(log) for log in logs]
+    paths = [store.get(SVG_KIND, key, "svg") for key in keys]
+
+    missing = [i for i, path in enumerate(paths) if path is None]
+    if missing:
+        # Several days can share one key; render each key once
+        first_of = {}
+        for i in missing:
+            first_of.setdefault(keys[i], i)
+        todo = list(first_of.values())
+        tmp_files = [store.temp_path(SVG_KIND, keys[i], "svg") for i in todo]
+        try:
+            render_svgs([logs[i] for i in todo], tmp_files, workers=workers)
+            for i, tmp in zip(todo, tmp_files):
+                store.put(SVG_KIND, keys[i], "svg", tmp)
+        finally:
+            for tmp in tmp_files:
+                tmp.unlink(missing_ok=True)
+        for i in missing:
+            paths[i] = store.path(SVG_KIND, keys[i], "svg")
+
+    changed = []
+    for row, key in zip(rows, keys):
+        if row.svg_key != key:
+            row.svg_key = key
+            changed.append(row)
+    if changed:
+        DailyLog.objects.bulk_update(changed, ["svg_key"])
+
+    return list(zip(rows, paths))
+
+
+def rendered_trip_svgs(trip):
+    """
+    [(DailyLog, path)] for a trip whose SVGs have been generated, re-rendering
+    any that were evicted since; empty if they were never generated.
+    """
+    rows = list(trip.daily_logs.all())
+    if not rows or not all(row.svg_key for row in rows):
+        return []
+    store = get_store()
+    paths = [store.get(SVG_KIND, row.svg_key, "svg") for row in rows]
+    if any(path is None for path in paths):
+        return ensure_trip_svgs(trip)
+    return list(zip(rows, paths))
+
+
+def trip_log_document(pages):
+    """
+    (path, key) of the single multi-day SVG for [(DailyLog, path)] pages as
+    returned by rendered_trip_svgs, built from the stored pages on a miss.
+    """
+    store = get_store()
+    key = bundle_digest([row.svg_key for row, _ in pages])
+    document = store.get(DOCUMENT_KIND, key, "svg")
+    if document is not None:
+        return document, key
+
+    tmp = store.temp_path(DOCUMENT_KIND, key, "svg")
+    try:
+        tmp.write_bytes(render_log_document([path.read_bytes() for _, path in pages]))
+        return store.put(DOCUMENT_KIND, key, "svg", tmp), key
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def live_artifact_keys():
+    """
+    {kind: keys still referenced}: every day's SVG and PDF page, each trip's
+    merged PDF (bundle digest of its page keys) and the current background.
+    PDF pages and merged PDFs count in the current conversion mode only.
+    """
+    pages = {}
+    for trip_id, key in (
+        DailyLog.objects.exclude(svg_key="").order_by("trip_id", "date").values_list("trip_id", "svg_key")
+    ):
+        pages.setdefault(trip_id, []).append(key)
+    svg_keys = {key for keys in pages.values() for key in keys}
+    bundles = {bundle_digest(keys) for keys in pages.values()}
+    return {
+        SVG_KIND: svg_keys,
+        DOCUMENT_KIND: bundles,
+        "pdf-page": {page_key(key) for key in svg_keys},
+        "pdf": {pdf_etag(keys) for keys in pages.values()},
+        "pdf-background": {compile_template(SVG_PATH).version},
+    }
+
+
+def orphaned_artifacts(store=None, min_age=0):
+    """
+    Stored artifacts no live key refers to, as (kind, path, size). Anything
+    modified within the last `min_age` seconds is left alone, so a render whose
+    DailyLog.svg_key update has not landed yet is not collected under it.
+    """
+    store = store or get_store()
+    live = live_artifact_keys()
+    cutoff = time.time() - min_age
+    return [
+        (kind, path, size)
+        for kind, key, path, size, mtime in store.entries()
+        if mtime < cutoff and key not in live.get(kind, ())
+    ]
@@ -0,0 +1,129 @@
+"""
+Daily log PDF export backed by the artifact store.
+
+Every SVG page is converted once and stored as a "pdf-page" artifact under
+its page key, a hash of the SVG's key and of how it was converted (overlay
+on which template background, or the whole page), so unchanged days are
+reused across requests and trips but never across conversion modes. The
+merged document is a "pdf" artifact keyed by the bundle digest, a hash of
+the page keys in order; it doubles as the download's ETag
+(log_artifacts.pdf_etag).
+
+Pages rendered from the log-book template are not converted whole: the blank
+template is converted to PDF once, and each day only converts its own small
+overlay (duty lines and text), which is stamped onto a copy of that page.
+"""
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+import cairosvg
+from django.conf import settings
+from PyPDF2 import PdfMerger, PdfReader, PdfWriter
+
+from .artifacts import get_store
+from .log_artifacts import bundle_digest, page_key, pdf_overlay_mode
+from .svg_log_sheet import SVG_PATH, compile_template
+
+
+def file_digest(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def _store_converted(kind, key, convert):
+    """Run convert(tmp_path) and publish the result under kind/key."""
+    store = get_store()
+    tmp = store.temp_path(kind, key, "pdf")
+    try:
+        convert(tmp)
+        return store.put(kind, key, "pdf", tmp)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+_backgrounds = {}
+_backgrounds_lock = threading.Lock()
+
+
+def template_background(svg_input=SVG_PATH) -> bytes:
+    """
+    The blank template as a one-page PDF. Converted once per template
+    version, then kept in the artifact store and in process memory.
+    """
+    template = compile_template(svg_input)
+    with _backgrounds_lock:
+        if template.version not in _backgrounds:
+            background = get_store().get("pdf-background", template.version, "pdf")
+            if background is None:
+                svg_bytes = Path(svg_input).read_bytes()
+                background = _store_converted(
+                    "pdf-background", template.version,
+                    lambda tmp: cairosvg.svg2pdf(bytestring=svg_bytes, write_to=str(tmp)),
+                )
+            _backgrounds[template.version] = background.read_bytes()
+        return _backgrounds[template.version]
+
+
+def write_overlay_page(overlay_svg: bytes, target: Path, svg_input=SVG_PATH):
+    """Convert only the overlay and stamp it onto a copy of the template page."""
+    drawn = BytesIO()
+    cairosvg.svg2pdf(bytestring=overlay_svg, write_to=drawn)
+    drawn.seek(0)
+    page = PdfReader(BytesIO(template_background(svg_input))).pages[0]
+    page.merge_page(PdfReader(drawn).pages[0])
+    writer = PdfWriter()
+    writer.add_page(page)
+    with open(target, "wb") as out:
+        writer.write(out)
+
+
+def convert_page(svg_file: Path, key: str) -> Path:
+    """PDF for one SVG, converted only if no page with this page key is stored."""
+    page = get_store().get("pdf-page", key, "pdf")
+    if page is not None:
+        return page
+
+    overlay = None
+    if pdf_overlay_mode():
+        overlay = compile_template(SVG_PATH).overlay(svg_file.read_bytes())
+
+    def convert(tmp):
+        if overlay is None:
+            cairosvg.svg2pdf(url=str(svg_file), write_to=str(tmp))
+        else:
+            write_overlay_page(overlay, tmp)
+
+    return _store_converted("pdf-page", key, convert)
+
+
+def build_logs_pdf(svg_files, keys=None):
+    """
+    Return (path, etag) of the merged PDF for `svg_files`, in order. `keys`
+    are the SVGs' artifact keys; without them the files' own digests are used.
+    On a miss, missing pages are converted concurrently and merged once.
+    """
+    svg_files = [Path(svg_file) for svg_file in svg_files]
+    if keys is None:
+        keys = [file_digest(svg_file) for svg_file in svg_files]
+    keys = [page_key(key) for key in keys]
+    etag = bundle_digest(keys)
+    merged = get_store().get("pdf", etag, "pdf")
+    if merged is not None:
+        return merged, etag
+
+    workers = max(1, min(getattr(settings, "LOG_PDF_WORKERS", 4), len(svg_files)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pages = list(pool.map(convert_page, svg_files, keys))
+
+    def merge(tmp):
+        merger = PdfMerger()
+        try:
+            for page in pages:
+                merger.append(str(page))
+            merger.write(str(tmp))
+        finally:
+            merger.close()
+
+    return _store_converted("pdf", etag, merge), etag
@@ -1,16 +1,161 @@
+import hashlib
+import json
 import os
-import requests
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+
 from decimal import Decimal
-import polyline
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from .route_ingest import ingest_polyline
+from .route_geometry import RouteGeometry
+from .async_http import get_async_client
+from .http_client import get_client
+from .single_flight import get_flight
+from ..utils import metrics
 
 ORS_KEY = os.getenv("ORS_KEY")
-ORS_BASE_URL = "https://api.openrouteservice.org/v2/directions/driving-hgv"
+ORS_URL = "https://api.openrouteservice.org"
+DIRECTIONS_PATH = "v2/directions/driving-hgv"
+OPTIMIZATION_PATH = "optimization"
 
 HEADERS = {
     "Authorization": ORS_KEY,
     "Content-Type": "application/json"
 }
 
+ors_client = get_client("ors", headers=HEADERS)
+ors_async_client = get_async_client("ors")
+# Concurrent requests for the same route (a double-clicked "Plan") share one call
+ors_flight = get_flight("ors")
+
+
+class RouteCache:
+    """
+    Two-tier cache for parsed ORS routes.
+
+    - local: in-process LRU of pickled results (bounded by entry count)
+    - shared: a Django cache alias (database cache by default) shared by all
+      workers, so a lane planned by one worker is a hit for every other one
+
+    Values are the fully parsed route dicts (RouteGeometry included), so a hit
+    skips both the HTTP round trip and the polyline decode. Entries are stored
+    pickled and unpickled per hit, so callers can never mutate a cached route.
+    Local entries live at most `local_ttl` seconds, which bounds how long an
+    explicit invalidation takes to reach other workers.
+    """
+
+    def __init__(self, max_entries=128, ttl=86400, local_ttl=300, alias="shared", precision=4):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.local_ttl = min(local_ttl, ttl)
+        self.alias = alias
+        self.precision = precision
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.alias] if self.alias else None
+
+    def make_key(self, kind: str, coordinates, options: dict) -> str:
+        """Key on the quantized waypoints plus the profile/request options."""
+        quantized = [[round(float(c), self.precision) for c in coord] for coord in coordinates]
+        raw = json.dumps([kind, quantized, options], sort_keys=True, separators=(",", ":"))
+        return f"ors-route:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
+    def get(self, key, record_miss=True):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None and entry[0] > now:
+                self._local.move_to_end(key)
+                metrics.incr("ors.route_cache.local_hits")
+                return pickle.loads(entry[1])
+            if entry is not None:
+                del self._local[key]
+
+        shared = self.shared
+        blob = shared.get(key) if shared is not None else None
+        if blob is not None:
+            self._store_local(key, blob)
+            metrics.incr("ors.route_cache.shared_hits")
+            return pickle.loads(blob)
+
+        if record_miss:
+            metrics.incr("ors.route_cache.misses")
+        return None
+
+    def set(self, key, value):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self._store_local(key, blob)
+        shared = self.shared
+        if shared is not None:
+            shared.set(key, blob, timeout=self.ttl)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._local.pop(key, None)
+        shared = self.shared
+        if shared is not None:
+            shared.delete(key)
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    def _store_local(self, key, blob):
+        with self._lock:
+            self._local[key] = (time.monotonic() + self.local_ttl, blob)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def stats(self) -> dict:
+        local_hits = metrics.get_counter("ors.route_cache.local_hits")
+        shared_hits = metrics.get_counter("ors.route_cache.shared_hits")
+        misses = metrics.get_counter("ors.route_cache.misses")
+        lookups = local_hits + shared_hits + misses
+        return {
+            "local_hits": local_hits,
+            "shared_hits": shared_hits,
+            "misses": misses,
+            "hit_ratio": (local_hits + shared_hits) / lookups if lookups else 0.0,
+            "local_entries": len(self._local),
+        }
+
+
+route_cache = RouteCache(
+    max_entries=getattr(settings, "ORS_ROUTE_CACHE_SIZE", 128),
+    ttl=getattr(settings, "ORS_ROUTE_CACHE_TTL", 86400),
+    alias=getattr(settings, "ORS_ROUTE_CACHE_ALIAS", "shared"),
+)
+
+DIRECTIONS_OPTIONS = {
+    "instructions": True,
+    "geometry": True,
+    "geometry_simplify": False,
+    "units": "mi",
+    "profile": "driving-hgv",
+}
+
+
+def ors_url(path: str) -> str:
+    return f"{getattr(settings, 'ORS_URL', ORS_URL)}/{path}"
+
+
+def invalidate_route(coordinates, optimized=False):
+    """Drop the cached route for these waypoints from both cache tiers."""
+    if optimized:
+        key = route_cache.make_key("optimization", coordinates, {"profile": "driving-hgv"})
+    else:
+        key = route_cache.make_key("directions", coordinates, DIRECTIONS_OPTIONS)
+    route_cache.invalidate(key)
+
 
 def get_route(coordinates):
     """
@@ -21,22 +166,30 @@ def get_route(coordinates):
     if len(coordinates) < 2:
         raise ValueError("At least two coordinates are required.")
 
-    payload = {
-        "coordinates": coordinates,
-        "instructions": True,
-        "geometry": True,
-        "geometry_simplify": False,
-        "units": "mi",
-        "profile": "driving-hgv",
+    cache_key = route_cache.make_key("directions", coordinates, DIRECTIONS_OPTIONS)
+    cached = route_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    return ors_flight.do(
+        cache_key,
+        lambda: _fetch_route(coordinates, cache_key),
+        lookup=lambda: route_cache.get(cache_key, record_miss=False),
+    )
 
-    }
 
-    response = requests.post(ORS_BASE_URL, json=payload, headers=HEADERS)
+def _fetch_route(coordinates, cache_key):
+    response = ors_client.post(ors_url(DIRECTIONS_PATH), json={"coordinates": coordinates, **DIRECTIONS_OPTIONS})
 
     if response.status_code != 200:
         raise Exception(f"ORS Error: {response.status_code} - {response.text}")
 
-    data = response.json()
+    result = _parse_directions(response.json())
+    route_cache.set(cache_key, result)
+    return result
+
+
+def _parse_directions(data):
     route = data["routes"][0]
     segments = route["segments"]
 
@@ -44,29 +197,28 @@ def get_route(coordinates):
     geometry = route.get("geometry", "")
 
     if isinstance(geometry, str):
-        # Decode the encoded polyline string with correct precision
-        decoded = polyline.decode(geometry, precision=5)
-        coords = [(lon, lat) for lat, lon in decoded]
+        # Decode the encoded polyline straight into flat arrays + cumulative miles
+        route_geometry = ingest_polyline(geometry, precision=5)
     else:
-        coords = []
+        route_geometry = RouteGeometry([], [], [])
 
     # Step objects don't have coordinates, only waypoints
+    lons, lats = route_geometry.lons, route_geometry.lats
     for segment in segments:
         for step in segment["steps"]:
             wp = step.get("way_points", [])
             if len(wp) == 2:
                 start_idx, end_idx = wp
-                start_coord = coords[start_idx]
-                end_coord = coords[end_idx]
-                step["start_lon"], step["start_lat"] = start_coord
-                step["end_lon"], step["end_lat"] = end_coord
+                step["start_lon"], step["start_lat"] = lons[start_idx], lats[start_idx]
+                step["end_lon"], step["end_lat"] = lons[end_idx], lats[end_idx]
 
-    return {
+    result = {
         "distance_miles": Decimal(route["summary"]["distance"]),
         "duration_hours": Decimal(route["summary"]["duration"]) / 3600,
         "segments": segments,
-        "geometry": coords,  # optional, for entire trip polyline
+        "geometry": route_geometry,  # entire trip polyline, indexed by cumulative miles
     }
+    return result
 
 
 def get_optimized_route(coordinates):
@@ -76,9 +228,31 @@ def get_optimized_route(coordinates):
     - 1 vehicle starting at current location
     - 2 jobs: pickup and dropoff
     """
-    url = "https://api.openrouteservice.org/optimization"
+    cache_key = route_cache.make_key("optimization", coordinates, {"profile": "driving-hgv"})
+    cached = route_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    return ors_flight.do(
+        cache_key,
+        lambda: _fetch_optimized_route(coordinates, cache_key),
+        lookup=lambda: route_cache.get(cache_key, record_miss=False),
+    )
+
+
+def _fetch_optimized_route(coordinates, cache_key):
+    response = ors_client.post(ors_url(OPTIMIZATION_PATH), json=_optimization_payload(coordinates))
 
-    payload = {
+    if response.status_code != 200:
+        raise Exception(f"ORS Optimization Error: {response.status_code} - {response.text}")
+
+    result = _parse_optimization(response.json())
+    route_cache.set(cache_key, result)
+    return result
+
+
+def _optimization_payload(coordinates):
+    return {
         "jobs": [
             {
                 "id": 1,
@@ -103,21 +277,52 @@ def get_optimized_route(coordinates):
         }
     }
 
-    response = requests.post(url, json=payload, headers=HEADERS)
 
-    if response.status_code != 200:
-        raise Exception(f"ORS Optimization Error: {response.status_code} - {response.text}")
-
-    data = response.json()
+def _parse_optimization(data):
     route = data["routes"][0]
 
-    decoded_geometry = polyline.decode(route["geometry"], precision=5)
-    coords = [(lon, lat) for lat, lon in decoded_geometry]
+    route_geometry = ingest_polyline(route["geometry"], precision=5)
 
-    return {
+    result = {
         "distance_miles": Decimal(route["distance"]) / Decimal("1609.34"),  # meters to miles
         "duration_hours": Decimal(route["duration"]) / 3600,
-        "geometry": coords,
+        "geometry": route_geometry,
         "steps": [],  # optional, may use for future
         "segments": [],
     }
+    return result
+
+
+async def aget_route(coordinates):
+    """get_route() for async callers: the ORS round trip holds no thread."""
+    if len(coordinates) < 2:
+        raise ValueError("At least two coordinates are required.")
+
+    cache_key = route_cache.make_key("directions", coordinates, DIRECTIONS_OPTIONS)
+    return await _acached_route(cache_key, ors_url(DIRECTIONS_PATH), {"coordinates": coordinates, **DIRECTIONS_OPTIONS},
+                                _parse_directions, "ORS Error")
+
+
+async def aget_optimized_route(coordinates):
+    """get_optimized_route() for async callers."""
+    cache_key = route_cache.make_key("optimization", coordinates, {"profile": "driving-hgv"})
+    return await _acached_route(cache_key, ors_url(OPTIMIZATION_PATH), _optimization_payload(coordinates),
+                                _parse_optimization, "ORS Optimization Error")
+
+
+async def _acached_route(cache_key, url, payload, parse, error):
+    cached = await sync_to_async(route_cache.get, thread_sensitive=False)(cache_key)
+    if cached is not None:
+        return cached
+
+    async def fetch():
+        response = await ors_async_client.post(url, json=payload)
+        if response.status_code != 200:
+            raise Exception(f"{error}: {response.status_code} - {response.text}")
+        # Decoding a long polyline is CPU work; keep it off the event loop
+        result = await sync_to_async(parse, thread_sensitive=False)(response.json())
+        await sync_to_async(route_cache.set, thread_sensitive=False)(cache_key, result)
+        return result
+
+    lookup = sync_to_async(partial(route_cache.get, cache_key, record_miss=False), thread_sensitive=False)
+    return await ors_flight.ado(cache_key, fetch, lookup=lookup)
@@ -1,10 +1,46 @@
 from .ors import get_route, get_optimized_route
-from ..models import Trip, TripLeg, TripSegmentStep
+from ..models import Trip, TripLeg, TripSegmentStep, DailyLog
+from .generate_daily_logs import build_daily_logs, daily_log_rows
 from decimal import Decimal
-from .hos import chunk_legs_by_hos
+from .hos import chunk_legs_by_hos, METERS_PER_MILE, SECONDS_PER_HOUR
 from datetime import timedelta
+from django.db import transaction
 from django.utils import timezone
-from math import radians, sin, cos, sqrt, atan2
+
+TWO_PLACES = Decimal("0.01")
+
+
+def _meters_to_decimal_miles(meters: int) -> Decimal:
+    """Persistence boundary: integer planner meters -> TripLeg.distance_miles."""
+    return (Decimal(meters) / Decimal(str(METERS_PER_MILE))).quantize(TWO_PLACES)
+
+
+def _seconds_to_decimal_hours(seconds: int) -> Decimal:
+    """Persistence boundary: integer planner seconds -> TripLeg.duration_hours."""
+    return (Decimal(seconds) / SECONDS_PER_HOUR).quantize(TWO_PLACES)
+
+
+def _build_steps(leg_steps, leg: TripLeg):
+    """
+    Turn the ORS steps assigned to one drive chunk into unsaved TripSegmentStep
+    rows. ORS reports step distance in miles (units=mi) and duration in seconds.
+    """
+    rows = []
+    for order, step in enumerate(leg_steps):
+        meters = Decimal(str(step.get("distance", 0))) * Decimal(str(METERS_PER_MILE))
+        rows.append(TripSegmentStep(
+            step_order=order,
+            instruction=step.get("instruction", ""),
+            distance_meters=meters.quantize(TWO_PLACES),
+            duration_seconds=Decimal(str(step.get("duration", 0))).quantize(TWO_PLACES),
+            start_lat=step.get("start_lat", leg.start_lat),
+            start_lon=step.get("start_lon", leg.start_lon),
+            end_lat=step.get("end_lat", leg.end_lat),
+            end_lon=step.get("end_lon", leg.end_lon),
+            waypoints=step.get("way_points", []),
+        ))
+    return rows
+
 
 def _resolve_label(leg_data, which: str) -> str:
     """
@@ -30,7 +66,7 @@ def _resolve_label(leg_data, which: str) -> str:
     # If it's not drive, fuel, break, rest, etc., default to empty string
     return ""
 
-def plan_trip(trip: Trip):
+def plan_trip(trip: Trip, on_save=None):
     """
     Hybrid approach:
       - For drive segments, we label them 'Pickup Leg X' vs. 'Dropoff Leg X'
@@ -38,6 +74,8 @@ def plan_trip(trip: Trip):
       - For non-drive segments (fuel, break, rest, pickup, dropoff),
         we re-use the old _resolve_label() logic to get the nice wording.
       - No reverse_geocode calls, no time.sleep calls.
+    on_save, if given, is called first thing in the transaction that stores
+    the plan; an exception from it discards the plan.
     """
 
     # Coordinates: 0 => current, 1 => pickup, 2 => dropoff
@@ -52,66 +90,30 @@ def plan_trip(trip: Trip):
         result = get_optimized_route(coordinates)
     else:
         result = get_route(coordinates)
-        geometry = result.get("geometry", [])
-
-    def haversine_distance_miles(lon1, lat1, lon2, lat2):
-        """
-        Compute the great-circle distance between two geographic points (in miles)
-        using the Haversine formula.
-
-        Parameters:
-        - lon1, lat1: Longitude and latitude of the first point
-        - lon2, lat2: Longitude and latitude of the second point
-
-        Returns:
-        - Distance in miles as a float
-            """
-        R = 3958.8  # Radius of Earth in miles
-        dlon = radians(lon2 - lon1)
-        dlat = radians(lat2 - lat1)
-        a = sin(dlat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon/2)**2
-        c = 2 * atan2(sqrt(a), sqrt(1-a))
-        return R * c
-
-    def build_cumulative_coords(route_coords):
-        """
-        route_coords is your entire polyline: [ (lon,lat), (lon,lat), ... ]
-        Returns a list of (cum_miles, lon, lat).
-        """
-        cum = []
-        total = 0.0
-        prev_lon, prev_lat = route_coords[0]
-        cum.append((0.0, prev_lon, prev_lat))
-
-        for (lon, lat) in route_coords[1:]:
-            dist_mi = haversine_distance_miles(prev_lon, prev_lat, lon, lat)
-            total += dist_mi
-            cum.append((total, lon, lat))
-            prev_lon, prev_lat = lon, lat
-
-        return cum
-
-    # Save trip-level summary
-    trip.planned_distance_miles = result["distance_miles"]
-    trip.planned_duration_hours = result["duration_hours"]
-    trip.save()
 
-    geometry = result.get("geometry", [])
-    cum_coords = build_cumulative_coords(geometry)
-
-    trip.legs.all().delete()
+    # Built once during ingestion; chunk_legs_by_hos walks it with a forward-only cursor
+    route_geometry = result["geometry"]
 
     # Break the route into segments, then chunk by HOS with interpolation support
     segments = result.get("segments", [])
     hos_legs = chunk_legs_by_hos(
         segments=segments,
         coordinates=coordinates,
-        start_cycle_hours=Decimal(trip.current_cycle_hours),
-        cum_coords=cum_coords,
-        total_route_distance=Decimal(result["distance_miles"])
+        start_cycle_hours=trip.current_cycle_hours,
+        route_geometry=route_geometry,
+        total_route_distance=result["distance_miles"]
     )
 
+    new_legs, new_steps = _build_legs(trip, hos_legs)
+    _save_plan(trip, result, new_legs, new_steps, on_save)
+
 
+def _build_legs(trip: Trip, hos_legs):
+    """
+    Turn chunk_legs_by_hos output into unsaved TripLegs, back to back from
+    the trip's departure time, and the unsaved steps of each (new_steps[i]
+    belongs to new_legs[i]). Consumes the dicts in `hos_legs`.
+    """
     current_time = trip.departure_time
 
     # We'll track how many drive legs we have for pickup vs dropoff
@@ -123,6 +125,8 @@ def plan_trip(trip: Trip):
     last_known_lon = trip.current_location_lon
     last_known_label = trip.current_location_label or "Starting Location"
 
+    new_legs = []
+    new_steps = []
     for idx, leg_data in enumerate(hos_legs):
         # chunk_legs_by_hos often sets segment_index so we know whether it's part of:
         # 0 => current->pickup, 1 => pickup->dropoff
@@ -130,7 +134,7 @@ def plan_trip(trip: Trip):
 
         # Distinguish drive vs. non-drive
         is_drive = (
-            leg_data.get("distance_miles", 0) > 0
+            leg_data.get("distance_meters", 0) > 0
             and not leg_data.get("is_rest_stop")
             and not leg_data.get("is_fuel_stop")
         )
@@ -179,20 +183,66 @@ def plan_trip(trip: Trip):
         leg_data.pop("start_label", None)
         leg_data.pop("end_label", None)
 
-        # Calculate times
-        duration_hrs = leg_data["duration_hours"]
-        duration_seconds = float(duration_hrs) * 3600
+        # Calculate times straight from the planner's integer seconds
+        duration_seconds = leg_data.pop("duration_seconds")
+        distance_meters = leg_data.pop("distance_meters")
         leg_data["departure_time"] = current_time
         current_time += timedelta(seconds=duration_seconds)
         leg_data["arrival_time"] = current_time
 
-        # Create the DB record
-        new_leg = TripLeg.objects.create(
+        # Only now convert to the Decimal columns TripLeg stores
+        leg_data["distance_miles"] = _meters_to_decimal_miles(distance_meters)
+        leg_data["duration_hours"] = _seconds_to_decimal_hours(duration_seconds)
+
+        # Build the rows in memory; _save_plan writes them all in one batch
+        new_leg = TripLeg(
             trip=trip,
             **leg_data,
             start_label=start_label,
             end_label=end_label,
         )
+        new_legs.append(new_leg)
+        new_steps.append(_build_steps(leg_steps, new_leg))
+
+    return new_legs, new_steps
+
+
+def _save_plan(trip: Trip, result, new_legs, new_steps, on_save=None):
+    """
+    Persist a computed plan atomically with a fixed number of statements,
+    independent of trip length (up to 100 old legs): update the trip
+    summary, drop the old plan,
+    insert every leg in one bulk INSERT, every step in another and the
+    daily logs derived from the legs in a third.
+    new_steps[i] holds the unsaved steps for new_legs[i].
+    """
+    trip.planned_distance_miles = result["distance_miles"]
+    trip.planned_duration_hours = result["duration_hours"]
+
+    # Legs are already in departure order; logs are built before the transaction opens
+    log_rows = daily_log_rows(trip, build_daily_logs(new_legs))
+
+    with transaction.atomic():
+        if on_save is not None:
+            on_save()
+        trip.save(update_fields=["planned_distance_miles", "planned_duration_hours"])
+
+        # The collector selects the legs once and removes their steps in one
+        # fast DELETE (TripSegmentStep has no cascades or signals of its own)
+        TripLeg.objects.filter(trip=trip).delete()
+
+        TripLeg.objects.bulk_create(new_legs)
+
+        # bulk_create filled in the leg primary keys, so steps can point at them
+        step_rows = []
+        for leg, steps in zip(new_legs, new_steps):
+            for step in steps:
+                step.leg = leg
+                step_rows.append(step)
+        TripSegmentStep.objects.bulk_create(step_rows)
+
+        DailyLog.objects.filter(trip=trip).delete()
+        DailyLog.objects.bulk_create(log_rows)
 
 
 def _label_from_index(i, trip: Trip) -> str:
@@ -0,0 +1,131 @@
+"""
+Async trip planning backed by the PlanJob table in Postgres.
+
+The API enqueues a job and returns 202; `python manage.py run_plan_workers`
+runs a pool of worker threads that claim queued jobs with
+SELECT ... FOR UPDATE SKIP LOCKED and run plan_trip on them. No broker or
+extra service is needed.
+"""
+import logging
+import os
+import socket
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import PlanJob
+from .plan import plan_trip
+
+logger = logging.getLogger(__name__)
+
+
+def async_planning_requested(request) -> bool:
+    """Async mode is opt-in: globally via settings, or per request with ?async=true."""
+    if getattr(settings, "TRIP_PLAN_ASYNC", False):
+        return True
+    return request.query_params.get("async", "").lower() in ("1", "true", "yes")
+
+
+def enqueue_plan(trip) -> PlanJob:
+    return PlanJob.objects.create(trip=trip)
+
+
+def claim_next_job(worker_name: str):
+    """
+    Atomically move the oldest runnable job to RUNNING and return it.
+    Jobs stuck in RUNNING longer than PLAN_JOB_TIMEOUT (a crashed worker)
+    are claimable again until they run out of attempts.
+    """
+    timeout = getattr(settings, "PLAN_JOB_TIMEOUT", 600)
+    max_attempts = getattr(settings, "PLAN_JOB_MAX_ATTEMPTS", 3)
+    stale_before = timezone.now() - timedelta(seconds=timeout)
+
+    PlanJob.objects.filter(
+        status=PlanJob.RUNNING, started_at__lt=stale_before, attempts__gte=max_attempts
+    ).update(status=PlanJob.FAILED, error="Timed out", finished_at=timezone.now())
+
+    runnable = PlanJob.objects.filter(
+        Q(status=PlanJob.QUEUED)
+        | Q(status=PlanJob.RUNNING, started_at__lt=stale_before, attempts__lt=max_attempts)
+    ).order_by("queued_at")
+
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            runnable = runnable.select_for_update(skip_locked=True)
+        job = runnable.first()
+        if job is None:
+            return None
+        job.status = PlanJob.RUNNING
+        job.started_at = timezone.now()
+        job.attempts += 1
+        job.worker = worker_name
+        job.save(update_fields=["status", "started_at", "attempts", "worker"])
+    return job
+
+
+class JobReclaimed(Exception):
+    """The job was claimed again (it looked stale) while this worker ran it."""
+
+
+def _owned(job: PlanJob):
+    """The job's row, as long as it is still this claim's: same worker, same attempt, still running."""
+    return PlanJob.objects.filter(
+        pk=job.pk, worker=job.worker, attempts=job.attempts, status=PlanJob.RUNNING
+    )
+
+
+def run_job(job: PlanJob):
+    """
+    Run plan_trip for a claimed job and record the outcome, unless another
+    worker has reclaimed the job in the meantime: then this run's plan and
+    status are discarded and the newer claim's are kept.
+    """
+    def mark_done():
+        # Runs in the transaction that stores the plan, so the plan and DONE
+        # are committed together, and the row lock keeps the job from being
+        # reclaimed (SKIP LOCKED) until then
+        updated = _owned(job).update(status=PlanJob.DONE, error="", finished_at=timezone.now())
+        if not updated:
+            raise JobReclaimed
+
+    try:
+        plan_trip(job.trip, on_save=mark_done)
+    except JobReclaimed:
+        logger.warning("Planning job %s was reclaimed by another worker; discarding this run", job.id)
+    except Exception as exc:
+        logger.exception("Planning job %s failed", job.id)
+        updated = _owned(job).update(
+            status=PlanJob.FAILED, error=f"{type(exc).__name__}: {exc}", finished_at=timezone.now()
+        )
+        if not updated:
+            logger.warning("Planning job %s was reclaimed by another worker; not recording the failure", job.id)
+    job.refresh_from_db()
+    return job
+
+
+def worker_loop(worker_name: str, stop_event: threading.Event, poll_interval: float = 1.0):
+    """Claim and run jobs until stop_event is set; sleeps only when idle or after a failed claim."""
+    try:
+        while not stop_event.is_set():
+            try:
+                job = claim_next_job(worker_name)
+            except Exception:
+                # e.g. the database restarting: drop the broken connection and retry later
+                logger.exception("Worker %s could not claim a planning job", worker_name)
+                connection.close()
+                stop_event.wait(poll_interval)
+                continue
+            if job is None:
+                stop_event.wait(poll_interval)
+                continue
+            run_job(job)
+    finally:
+        connection.close()
+
+
+def default_worker_name(index: int) -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
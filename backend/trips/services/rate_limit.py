@@ -0,0 +1,172 @@
+"""
+Cluster-wide rate limit for outbound calls to a third-party upstream.
+
+Nominatim's usage policy allows one request per second from the whole
+application, not per worker, so the budget lives in the shared cache. Time
+is cut into slots of 1/rate seconds and every call reserves one with
+cache.add (atomic on every cache backend): the first free slot within the
+caller's `max_wait`. The caller then sleeps until its slot starts, so
+concurrent callers queue in slot order instead of being turned away. In
+token-bucket terms this is a bucket holding one token, refilled at `rate`.
+
+A reservation stores the time its call may start, and a call in the next
+slot starts at least one interval after it, so consecutive calls stay an
+interval apart even when the first one took the end of its slot (up to
+clock skew between workers).
+
+Per bucket name, trips.utils.metrics records "ratelimit.<name>.granted" and
+".rejected" counters and ".wait" / ".queue_depth" histograms.
+"""
+import asyncio
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from ..utils import metrics
+
+DEFAULT_RATE_LIMIT_SETTINGS = {
+    "alias": "shared",
+    "rate": 1.0,
+    "max_wait": 5.0,
+}
+QUEUE_DEPTH_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+
+class RateLimited(requests.RequestException):
+    """Raised when no call slot is free within the caller's wait."""
+
+    def __init__(self, *args, retry_after=1.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+
+    def __init__(self, name, **options):
+        config = {**DEFAULT_RATE_LIMIT_SETTINGS, **options}
+        self.name = name
+        self.alias = config["alias"]
+        self.rate = config["rate"]
+        self.max_wait = config["max_wait"]
+        self._waiting = 0
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.alias] if self.alias else None
+
+    @property
+    def interval(self) -> float:
+        return 1.0 / self.rate
+
+    def _key(self, slot: int) -> str:
+        return f"ratelimit:{self.name}:{slot}"
+
+    def reserve(self, max_wait=None) -> float:
+        """
+        Reserve the first free call slot starting within max_wait seconds
+        (default: the bucket's max_wait) and return the delay until it
+        starts. Raises RateLimited if there is none. A rate of 0 disables
+        the limit.
+        """
+        shared = self.shared
+        if not self.rate or shared is None:
+            return 0.0
+        max_wait = self.max_wait if max_wait is None else max_wait
+        interval = self.interval
+        now = time.time()
+        first = math.floor(now / interval)
+        last = math.floor((now + max_wait) / interval)
+        # A reservation is read by whoever reserves the slot after it
+        timeout = math.ceil(max(max_wait, self.max_wait) + 2 * interval) + 1
+
+        taken = shared.get_many([self._key(slot) for slot in range(first - 1, last + 1)])
+        previous = taken.get(self._key(first - 1))
+        for slot in range(first, last + 1):
+            start = max(now, slot * interval)
+            if previous is not None:
+                start = max(start, previous + interval)
+            if start - now > max_wait:
+                break
+            key = self._key(slot)
+            if key not in taken and shared.add(key, start, timeout=timeout):
+                return start - now
+            # Lost the race for this slot: the next one starts after the winner
+            previous = taken.get(key) or shared.get(key) or (slot + 1) * interval
+
+        metrics.incr(f"ratelimit.{self.name}.rejected")
+        raise RateLimited(
+            f"{self.name}: no call slot free within {max_wait:g}s",
+            retry_after=max(max_wait, interval),
+        )
+
+    def acquire(self, max_wait=None) -> float:
+        """Wait for a reserved call slot; returns the seconds waited. Raises RateLimited like reserve()."""
+        delay = self.reserve(max_wait)
+        with self._queued(delay):
+            if delay > 0:
+                time.sleep(delay)
+        return delay
+
+    async def aacquire(self, max_wait=None, reserved=None) -> float:
+        """
+        acquire() for async callers: the wait holds no thread. `reserved`,
+        an asyncio.Event, is set once the slot is taken, before the wait.
+        """
+        delay = await sync_to_async(self.reserve, thread_sensitive=False)(max_wait)
+        if reserved is not None:
+            reserved.set()
+        with self._queued(delay):
+            if delay > 0:
+                await asyncio.sleep(delay)
+        return delay
+
+    @contextmanager
+    def _queued(self, delay):
+        with self._lock:
+            self._waiting += 1
+            depth = self._waiting
+        metrics.observe(f"ratelimit.{self.name}.queue_depth", depth, buckets=QUEUE_DEPTH_BUCKETS)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        metrics.observe(f"ratelimit.{self.name}.wait", delay)
+        metrics.incr(f"ratelimit.{self.name}.granted")
+
+    def stats(self) -> dict:
+        """Callers waiting in this process, and slots reserved ahead by every worker."""
+        reserved = 0
+        shared = self.shared
+        if self.rate and shared is not None:
+            now_slot = math.floor(time.time() / self.interval)
+            ahead = range(now_slot + 1, now_slot + 1 + math.ceil(self.max_wait * self.rate))
+            reserved = len(shared.get_many([self._key(slot) for slot in ahead]))
+        return {
+            "rate": self.rate,
+            "waiting": self._waiting,
+            "reserved_ahead": reserved,
+            "granted": metrics.get_counter(f"ratelimit.{self.name}.granted"),
+            "rejected": metrics.get_counter(f"ratelimit.{self.name}.rejected"),
+        }
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(name: str) -> TokenBucket:
+    """Return the process-wide rate limit for an upstream, creating it on first use."""
+    with _buckets_lock:
+        bucket = _buckets.get(name)
+        if bucket is None:
+            options = getattr(settings, "UPSTREAM_RATE_LIMITS", {}).get(name, {})
+            bucket = _buckets[name] = TokenBucket(name, **options)
+        return bucket
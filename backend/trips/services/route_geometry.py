@@ -0,0 +1,128 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+def _as_float_array(values) -> array:
+    """Copy values into a flat array('d'), taking the buffer fast path for NumPy."""
+    if isinstance(values, array) and values.typecode == "d":
+        return values
+    if hasattr(values, "astype") and hasattr(values, "tobytes"):
+        flat = array("d")
+        flat.frombytes(values.astype("float64", copy=False).tobytes())
+        return flat
+    return array("d", values)
+
+
+class RouteGeometry:
+    """
+    Flat, indexed view of a route polyline.
+
+    Holds cumulative miles, lon and lat in three parallel arrays so that
+    position and slice queries are answered by bisection instead of a
+    linear scan over every vertex.
+    """
+
+    __slots__ = ("miles", "lons", "lats")
+
+    def __init__(self, miles, lons, lats):
+        if not (len(miles) == len(lons) == len(lats)):
+            raise ValueError("miles, lons and lats must have the same length.")
+        self.miles = _as_float_array(miles)
+        self.lons = _as_float_array(lons)
+        self.lats = _as_float_array(lats)
+
+    @classmethod
+    def from_cumulative(cls, cum_coords):
+        """
+        Build from the legacy list of (cum_miles, lon, lat) tuples.
+        """
+        if not cum_coords:
+            return cls([], [], [])
+        miles, lons, lats = zip(*cum_coords)
+        return cls(miles, lons, lats)
+
+    def __len__(self):
+        return len(self.miles)
+
+    @property
+    def total_miles(self) -> float:
+        return self.miles[-1] if self.miles else 0.0
+
+    def _interpolate(self, i, target_miles):
+        """Interpolate between vertex i and i+1 (miles[i] <= target < miles[i+1])."""
+        dist_a = self.miles[i]
+        dist_b = self.miles[i + 1]
+        ratio = (target_miles - dist_a) / (dist_b - dist_a)
+        lon = self.lons[i] + ratio * (self.lons[i + 1] - self.lons[i])
+        lat = self.lats[i] + ratio * (self.lats[i + 1] - self.lats[i])
+        return (lon, lat)
+
+    def position_at(self, target_miles, lo=0):
+        """
+        Return an interpolated (lon, lat) for target_miles.
+        Values before the start or beyond the end clamp to the first/last vertex.
+        `lo` is an optional lower bound on the vertex index to search from.
+        """
+        if target_miles <= 0:
+            return (self.lons[0], self.lats[0])
+        if target_miles >= self.miles[-1]:
+            return (self.lons[-1], self.lats[-1])
+
+        i = bisect_right(self.miles, target_miles, lo) - 1
+        return self._interpolate(i, target_miles)
+
+    def slice(self, start_miles, end_miles, lo=0):
+        """
+        Return the vertices between start_miles and end_miles (inclusive)
+        as (lat, lon) tuples for Leaflet.
+        """
+        first = bisect_left(self.miles, start_miles, lo)
+        last = bisect_right(self.miles, end_miles, first)
+        return list(zip(self.lats[first:last], self.lons[first:last]))
+
+    def cursor(self):
+        return RouteCursor(self)
+
+
+class RouteCursor:
+    """
+    Forward-only cursor over a RouteGeometry.
+
+    The HOS chunker only ever moves forward along the route, so the cursor
+    remembers the last vertex it passed and uses it as the lower bound for
+    every following query.
+    """
+
+    __slots__ = ("geometry", "index")
+
+    def __init__(self, geometry: RouteGeometry):
+        self.geometry = geometry
+        self.index = 0
+
+    def advance_to(self, target_miles):
+        """Move the cursor to the last vertex at or before target_miles."""
+        miles = self.geometry.miles
+        if not miles:
+            return
+        # Gallop forward from the current index, then bisect inside the window
+        step = 1
+        hi = self.index + 1
+        while hi < len(miles) and miles[hi] <= target_miles:
+            self.index = hi
+            hi += step
+            step *= 2
+        hi = min(hi, len(miles))
+        self.index = max(self.index, bisect_right(miles, target_miles, self.index, hi) - 1)
+
+    def position_at(self, target_miles):
+        self.advance_to(target_miles)
+        return self.geometry.position_at(target_miles, self.index)
+
+    def slice(self, start_miles, end_miles):
+        self.advance_to(start_miles)
+        # Step back over duplicate vertices sitting exactly on start_miles
+        lo = self.index
+        miles = self.geometry.miles
+        while lo > 0 and miles[lo - 1] >= start_miles:
+            lo -= 1
+        return self.geometry.slice(start_miles, end_miles, lo)
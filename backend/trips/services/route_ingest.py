@@ -0,0 +1,143 @@
+"""
+Route ingestion: ORS encoded polyline -> RouteGeometry in one batched pass.
+
+The polyline is decoded straight into contiguous float64 lon/lat arrays and
+segment lengths plus their cumulative sum are computed with NumPy. When NumPy
+is not installed the same results are produced by a pure-Python fallback.
+"""
+from array import array
+from math import radians, sin, cos, sqrt, atan2
+
+from .route_geometry import RouteGeometry
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only without numpy
+    np = None
+
+EARTH_RADIUS_MILES = 3958.8
+
+
+def haversine_distance_miles(lon1, lat1, lon2, lat2):
+    """
+    Compute the great-circle distance between two geographic points (in miles)
+    using the Haversine formula.
+    """
+    dlon = radians(lon2 - lon1)
+    dlat = radians(lat2 - lat1)
+    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
+    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+    return EARTH_RADIUS_MILES * c
+
+
+##############################################################################
+# Polyline decoding
+##############################################################################
+
+def _decode_polyline_numpy(encoded: str, precision: int):
+    data = np.frombuffer(encoded.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    if data.size == 0:
+        empty = np.empty(0, dtype=np.float64)
+        return empty, empty
+
+    # Each value is a run of 5-bit chunks; a chunk without the 0x20
+    # continuation bit closes the run.
+    ends = (data & 0x20) == 0
+    starts = np.flatnonzero(np.concatenate(([True], ends[:-1])))
+    run_id = np.cumsum(np.concatenate(([0], ends[:-1].astype(np.int64))))
+    shift = 5 * (np.arange(data.size) - starts[run_id])
+    values = np.add.reduceat((data & 0x1F) << shift, starts)
+
+    # Zig-zag decode, then undo the delta encoding
+    deltas = np.where(values & 1, ~(values >> 1), values >> 1)
+    factor = float(10 ** precision)
+    lats = np.cumsum(deltas[0::2]) / factor
+    lons = np.cumsum(deltas[1::2]) / factor
+    return np.ascontiguousarray(lons), np.ascontiguousarray(lats)
+
+
+def _decode_polyline_python(encoded: str, precision: int):
+    lons = array("d")
+    lats = array("d")
+    factor = float(10 ** precision)
+    index = lat = lon = 0
+    length = len(encoded)
+
+    while index < length:
+        for coord in (0, 1):
+            result = shift = 0
+            while True:
+                b = ord(encoded[index]) - 63
+                index += 1
+                result |= (b & 0x1F) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            delta = ~(result >> 1) if result & 1 else result >> 1
+            if coord == 0:
+                lat += delta
+            else:
+                lon += delta
+        lats.append(lat / factor)
+        lons.append(lon / factor)
+
+    return lons, lats
+
+
+def decode_polyline(encoded: str, precision: int = 5):
+    """
+    Decode an encoded polyline into two float64 arrays (lons, lats).
+    NumPy arrays when NumPy is available, array('d') otherwise.
+    """
+    if np is not None:
+        return _decode_polyline_numpy(encoded, precision)
+    return _decode_polyline_python(encoded, precision)
+
+
+##############################################################################
+# Cumulative distance
+##############################################################################
+
+def _cumulative_miles_numpy(lons, lats):
+    lon_r = np.radians(np.asarray(lons, dtype=np.float64))
+    lat_r = np.radians(np.asarray(lats, dtype=np.float64))
+    dlon = np.diff(lon_r)
+    dlat = np.diff(lat_r)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat_r[:-1]) * np.cos(lat_r[1:]) * np.sin(dlon / 2) ** 2
+    seg = 2 * EARTH_RADIUS_MILES * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    cum = np.empty(lon_r.size, dtype=np.float64)
+    if cum.size:
+        cum[0] = 0.0
+        np.cumsum(seg, out=cum[1:])
+    return cum
+
+
+def _cumulative_miles_python(lons, lats):
+    cum = array("d")
+    if not len(lons):
+        return cum
+    total = 0.0
+    prev_lon, prev_lat = lons[0], lats[0]
+    cum.append(0.0)
+    for lon, lat in zip(lons[1:], lats[1:]):
+        total += haversine_distance_miles(prev_lon, prev_lat, lon, lat)
+        cum.append(total)
+        prev_lon, prev_lat = lon, lat
+    return cum
+
+
+def cumulative_miles(lons, lats):
+    """Cumulative great-circle miles at every vertex (first entry is 0.0)."""
+    if np is not None:
+        return _cumulative_miles_numpy(lons, lats)
+    return _cumulative_miles_python(lons, lats)
+
+
+def build_route_geometry(lons, lats) -> RouteGeometry:
+    return RouteGeometry(cumulative_miles(lons, lats), lons, lats)
+
+
+def ingest_polyline(encoded: str, precision: int = 5) -> RouteGeometry:
+    """Decode an ORS encoded polyline straight into a RouteGeometry."""
+    lons, lats = decode_polyline(encoded, precision)
+    return build_route_geometry(lons, lats)
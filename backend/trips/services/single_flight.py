@@ -0,0 +1,235 @@
+"""
+Single-flight coalescing of identical concurrent upstream calls.
+
+`get_flight(name).do(key, compute, lookup)` runs compute() once for any
+number of concurrent callers with the same key:
+
+  - within a process, the first caller leads and the rest wait on it;
+  - across workers, the leader also takes a short-lived lock in the shared
+    cache (cache.add), and a leader in another process that finds the lock
+    taken polls lookup() until the holder's result shows up in the cache.
+
+compute() is expected to store its result where lookup() reads it (the ORS
+route cache, the geocode cache), which is how waiters in other processes
+receive it. Waiters in the same process read it through lookup() as well,
+so each gets its own copy, as from any other cache hit.
+
+Waiting is bounded: a caller that has waited `wait` seconds, or finds the
+lock released with nothing in the cache (the holder failed), calls
+compute() itself. `ado()` does the same for coroutines (the async views),
+coalescing callers on one event loop. Counters per flight name in
+trips.utils.metrics: "singleflight.<name>.leaders", ".collapsed",
+".collapsed_remote" and ".wait_timeouts", plus a ".wait" histogram.
+"""
+import asyncio
+import threading
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from ..utils import metrics
+
+DEFAULT_FLIGHT_SETTINGS = {
+    "alias": "shared",
+    "lock_ttl": 30.0,
+    "wait": 15.0,
+    "poll_interval": 0.1,
+}
+
+
+class _Call:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+
+    def __init__(self, name, **options):
+        config = {**DEFAULT_FLIGHT_SETTINGS, **options}
+        self.name = name
+        self.alias = config["alias"]
+        self.lock_ttl = config["lock_ttl"]
+        self.wait = config["wait"]
+        self.poll_interval = config["poll_interval"]
+        self._calls = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.alias] if self.alias else None
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls) + len(self._futures)
+
+    def do(self, key: str, compute, lookup=None):
+        """Return compute() for this key, sharing one call among concurrent callers."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            return self._follow(call, compute, lookup)
+
+        try:
+            call.value = self._lead(key, compute, lookup)
+            return call.value
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def _follow(self, call, compute, lookup):
+        start = time.perf_counter()
+        finished = call.done.wait(self.wait)
+        metrics.observe(f"singleflight.{self.name}.wait", time.perf_counter() - start)
+        if not finished:
+            metrics.incr(f"singleflight.{self.name}.wait_timeouts")
+            return compute()
+        if call.error is not None:
+            raise call.error
+        metrics.incr(f"singleflight.{self.name}.collapsed")
+        value = lookup() if lookup is not None else None
+        return value if value is not None else call.value
+
+    def _lead(self, key, compute, lookup):
+        shared = self.shared
+        if shared is None or lookup is None:
+            metrics.incr(f"singleflight.{self.name}.leaders")
+            return compute()
+
+        lock_key = f"singleflight:{key}"
+        token = uuid.uuid4().hex
+        start = time.perf_counter()
+        deadline = time.monotonic() + self.wait
+        while not shared.add(lock_key, token, timeout=self.lock_ttl):
+            # Another worker holds the lock: its result lands in the cache
+            if time.monotonic() >= deadline:
+                metrics.incr(f"singleflight.{self.name}.wait_timeouts")
+                return compute()
+            time.sleep(self.poll_interval)
+            value = lookup()
+            if value is not None:
+                metrics.observe(f"singleflight.{self.name}.wait", time.perf_counter() - start)
+                metrics.incr(f"singleflight.{self.name}.collapsed_remote")
+                return value
+
+        try:
+            # The previous holder may have finished between our lookup and add()
+            value = lookup()
+            if value is not None:
+                return value
+            metrics.incr(f"singleflight.{self.name}.leaders")
+            return compute()
+        finally:
+            if shared.get(lock_key) == token:
+                shared.delete(lock_key)
+
+    async def ado(self, key: str, compute, lookup=None):
+        """do() for async callables: waiting callers hold no thread."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            future = self._futures.get((loop, key))
+            leader = future is None
+            if leader:
+                future = self._futures[loop, key] = loop.create_future()
+
+        if not leader:
+            return await self._afollow(future, compute, lookup)
+
+        try:
+            value = await self._alead(key, compute, lookup)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # waiters re-raise it; nobody else needs to retrieve it
+            raise
+        finally:
+            with self._lock:
+                self._futures.pop((loop, key), None)
+
+    async def _afollow(self, future, compute, lookup):
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.wait)
+        except asyncio.CancelledError:
+            if not future.cancelled() or asyncio.current_task().cancelling():
+                raise
+            # The leader's request was cancelled, not ours
+            return await compute()
+        except asyncio.TimeoutError:
+            metrics.observe(f"singleflight.{self.name}.wait", time.perf_counter() - start)
+            metrics.incr(f"singleflight.{self.name}.wait_timeouts")
+            return await compute()
+        metrics.observe(f"singleflight.{self.name}.wait", time.perf_counter() - start)
+        metrics.incr(f"singleflight.{self.name}.collapsed")
+        value = await lookup() if lookup is not None else None
+        return value if value is not None else future.result()
+
+    async def _alead(self, key, compute, lookup):
+        shared = self.shared
+        if shared is None or lookup is None:
+            metrics.incr(f"singleflight.{self.name}.leaders")
+            return await compute()
+
+        # The cache's own a*() methods hop to the thread-sensitive executor,
+        # one thread shared by every request; these calls need no particular thread
+        add = sync_to_async(shared.add, thread_sensitive=False)
+        get = sync_to_async(shared.get, thread_sensitive=False)
+        delete = sync_to_async(shared.delete, thread_sensitive=False)
+
+        lock_key = f"singleflight:{key}"
+        token = uuid.uuid4().hex
+        start = time.perf_counter()
+        deadline = time.monotonic() + self.wait
+        while not await add(lock_key, token, timeout=self.lock_ttl):
+            if time.monotonic() >= deadline:
+                metrics.incr(f"singleflight.{self.name}.wait_timeouts")
+                return await compute()
+            await asyncio.sleep(self.poll_interval)
+            value = await lookup()
+            if value is not None:
+                metrics.observe(f"singleflight.{self.name}.wait", time.perf_counter() - start)
+                metrics.incr(f"singleflight.{self.name}.collapsed_remote")
+                return value
+
+        try:
+            value = await lookup()
+            if value is not None:
+                return value
+            metrics.incr(f"singleflight.{self.name}.leaders")
+            return await compute()
+        finally:
+            if await get(lock_key) == token:
+                await delete(lock_key)
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def get_flight(name: str) -> SingleFlight:
+    """Return the process-wide single-flight group for an upstream, creating it on first use."""
+    with _flights_lock:
+        flight = _flights.get(name)
+        if flight is None:
+            options = getattr(settings, "SINGLE_FLIGHT", {}).get(name, {})
+            flight = _flights[name] = SingleFlight(name, **options)
+        return flight
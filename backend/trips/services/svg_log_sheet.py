@@ -1,10 +1,45 @@
+"""
+Daily log sheet SVGs.
+
+The blank log-book template is compiled once per process: its bytes are
+split around the closing </svg> tag, and the grid's minute -> x table and
+status -> y map are read from it a single time. Each day is then rendered by
+splicing its <text> and <line> fragments between those byte segments, with
+no XML parsing or re-serialization per day.
+
+Days are independent, so with settings.SVG_RENDER_WORKERS > 1 they are
+fanned out to a shared process pool (threads where fork is unavailable).
+
+For the browser, render_log_document() combines several days into one SVG
+that defines the (optimized) template once as a <symbol> and draws each day
+as a <use> of it plus the day's own fragments.
+"""
+import hashlib
+import multiprocessing
+import re
+import threading
 import xml.etree.ElementTree as ET
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
 from pathlib import Path
+from xml.sax.saxutils import escape
 from django.conf import settings
 
 SVG_PATH = Path(__file__).resolve().parent.parent / "assets" / "driver-log-book-hostp.svg"
+# optimize_template(SVG_PATH), for display only; regenerate with `manage.py optimize_log_template`
+OPTIMIZED_SVG_PATH = SVG_PATH.with_suffix(".min.svg")
 OUTPUT_DIR = Path(__file__).resolve().parent.parent / "assets"
 
+SVG_NS = {"svg": "http://www.w3.org/2000/svg"}
+XML_DECLARATION = b"<?xml version='1.0' encoding='utf-8'?>\n"
+MINUTES_PER_DAY = 24 * 60
+STATUSES = ["off_duty", "sleeper_berth", "driving", "on_duty"]
+# Bump when the same log and template would render differently
+RENDERER_VERSION = 1
+
+
 def midpoint_between(status, y_map):
     order = ["off_duty", "sleeper_berth", "driving", "on_duty"]
     idx = order.index(status)
@@ -52,315 +87,525 @@ def compute_totals_from_periods(duty_periods):
     return totals
 
 
-def inject_duty_periods_into_svg(logs, trip_id, svg_input=SVG_PATH, output_dir=Path(settings.MEDIA_ROOT)):
-    ns = {'svg': 'http://www.w3.org/2000/svg'}
-    ET.register_namespace('', ns['svg'])
+##############################################################################
+# Duty period clean-up applied to each log before it is drawn
+##############################################################################
 
-    ##########################################################################
-    # 1. HELPER FUNCTIONS for rounding times to nearest 15 min and adding off-duty
-    ##########################################################################
+def hhmm_to_minutes(hhmm: str) -> int:
+    """Convert 'HH:MM' to integer minutes from midnight."""
+    h, m = map(int, hhmm.split(":"))
+    return h * 60 + m
 
-    def hhmm_to_minutes(hhmm: str) -> int:
-        """Convert 'HH:MM' to integer minutes from midnight."""
-        h, m = map(int, hhmm.split(":"))
-        return h * 60 + m
 
-    def minutes_to_hhmm(m: int) -> str:
-        """Convert integer minutes from midnight back to 'HH:MM' (24h format)."""
-        hh = m // 60
-        mm = m % 60
-        # If you prefer '24:00' for midnight's end, handle that case if hh == 24.
-        return f"{hh:02d}:{mm:02d}"
+def minutes_to_hhmm(m: int) -> str:
+    """Convert integer minutes from midnight back to 'HH:MM' (24h format)."""
+    hh = m // 60
+    mm = m % 60
+    return f"{hh:02d}:{mm:02d}"
 
-    def round_to_quarter_hour(m: int) -> int:
-        """
-        Round integer minutes from midnight to nearest 15-min increment.
-        This example: <8 min => round down, ≥8 => round up.
-        """
-        quarter = 15
-        remainder = m % quarter
-        if remainder < 8:
-            return m - remainder
-        else:
-            return m + (quarter - remainder)
 
-    def add_pre_post_off_duty_periods(duty_periods):
-        """
-        Ensure each day is fully covered from 00:00 to 24:00 by adding off_duty
-        if needed before the first duty period and after the last duty period.
-        """
-        # Sort by start time
-        duty_periods.sort(key=lambda d: hhmm_to_minutes(d["start"]))
-        if not duty_periods:
-            # If no periods, define the entire day as off-duty
-            return [{"start": "00:00", "end": "24:00", "status": "off_duty"}]
-
-        # 1) Add off-duty before the first period, if needed
-        first_start = hhmm_to_minutes(duty_periods[0]["start"])
-        if first_start > 0:
-            duty_periods.insert(0, {
-                "start": "00:00",
-                "end": minutes_to_hhmm(first_start),
-                "status": "off_duty",
-            })
-
-        # 2) Add off-duty after the last period, if needed
-        last_end = hhmm_to_minutes(duty_periods[-1]["end"])
-        if last_end < 24 * 60:  # 24:00 = 1440 minutes
-            duty_periods.append({
-                "start": minutes_to_hhmm(last_end),
-                "end": "24:00",
-                "status": "off_duty",
-            })
-
-        # Optional: merge adjacent off_duty if you prefer a cleaner final list
-        # e.g., if the first period was off_duty and the second period is also off_duty
-        merged = []
-        for period in duty_periods:
-            if not merged:
-                merged.append(period)
+def round_to_quarter_hour(m: int) -> int:
+    """
+    Round integer minutes from midnight to nearest 15-min increment.
+    This example: <8 min => round down, ≥8 => round up.
+    """
+    quarter = 15
+    remainder = m % quarter
+    if remainder < 8:
+        return m - remainder
+    else:
+        return m + (quarter - remainder)
+
+
+def add_pre_post_off_duty_periods(duty_periods):
+    """
+    Ensure each day is fully covered from 00:00 to 24:00 by adding off_duty
+    if needed before the first duty period and after the last duty period.
+    """
+    # Sort by start time
+    duty_periods.sort(key=lambda d: hhmm_to_minutes(d["start"]))
+    if not duty_periods:
+        # If no periods, define the entire day as off-duty
+        return [{"start": "00:00", "end": "24:00", "status": "off_duty"}]
+
+    # 1) Add off-duty before the first period, if needed
+    first_start = hhmm_to_minutes(duty_periods[0]["start"])
+    if first_start > 0:
+        duty_periods.insert(0, {
+            "start": "00:00",
+            "end": minutes_to_hhmm(first_start),
+            "status": "off_duty",
+        })
+
+    # 2) Add off-duty after the last period, if needed
+    last_end = hhmm_to_minutes(duty_periods[-1]["end"])
+    if last_end < MINUTES_PER_DAY:
+        duty_periods.append({
+            "start": minutes_to_hhmm(last_end),
+            "end": "24:00",
+            "status": "off_duty",
+        })
+
+    # Merge adjacent off_duty periods for a cleaner final list
+    merged = []
+    for period in duty_periods:
+        if not merged:
+            merged.append(period)
+        else:
+            prev = merged[-1]
+            if prev["status"] == period["status"] == "off_duty":
+                # Extend the previous period's end
+                prev["end"] = period["end"]
             else:
-                prev = merged[-1]
-                if prev["status"] == period["status"] == "off_duty":
-                    # Extend the previous period's end
-                    prev["end"] = period["end"]
-                else:
-                    merged.append(period)
-        return merged
-
-    def round_duty_periods_to_quarter_hours(duty_periods):
-        """
-        For each period, round start/end to the nearest 15-min block
-        before injecting them into the SVG.
-        """
-        for d in duty_periods:
-            start_m = hhmm_to_minutes(d["start"])
-            end_m = hhmm_to_minutes(d["end"])
-            d["start"] = minutes_to_hhmm(round_to_quarter_hour(start_m))
-            d["end"]   = minutes_to_hhmm(round_to_quarter_hour(end_m))
-        return duty_periods
-
-    def round_hours_to_quarter(decimal_value):
-        """Round a float hour total to nearest 0.25 increment."""
-        try:
-            val = float(decimal_value)
-        except:
-            val = 0.0
-        return round(val * 4) / 4.0
+                merged.append(period)
+    return merged
 
-    ##########################################################################
-    # 2. EXISTING HELPER FUNCTIONS (unchanged)
-    ##########################################################################
 
-    def get_x_position_for_time(root):
-        """
-        Returns a function that maps any HH:MM time string to an interpolated x-position.
-        """
-        raw_map = {}
-        time_points = []
-
-        for hour in range(24):
-            hour_12 = hour % 12 or 12
-            suffix = "am" if hour < 12 else "pm"
-            for minute in [0, 15, 30, 45]:
-                label = f"_{hour_12}{minute:02d}{suffix}_line"
-                t_str = f"{hour:02d}:{minute:02d}"
-                el = root.find(f".//svg:line[@id='{label}']", ns)
-                if el is not None:
-                    x = float(el.attrib.get("x1", "0"))
-                    raw_map[t_str] = x
-                    time_points.append((t_str, x))
-
-        # Add 00:00 and 24:00 if present
-        midnight_start = root.find(".//svg:line[@id='_1200am_line_start']", ns)
-        if midnight_start is not None:
-            raw_map["00:00"] = float(midnight_start.attrib.get("x1", "0"))
-            time_points.append(("00:00", raw_map["00:00"]))
-
-        midnight_end = root.find(".//svg:line[@id='_1200am_line_end']", ns)
-        if midnight_end is not None:
-            raw_map["24:00"] = float(midnight_end.attrib.get("x1", "0"))
-            time_points.append(("24:00", raw_map["24:00"]))
-
-        # Convert keys to minutes since midnight for easier math
-        time_points.sort(key=lambda x: int(x[0][:2]) * 60 + int(x[0][3:]))
-
-        def get_x(hhmm):
-            h, m = map(int, hhmm.split(":"))
-            target = h * 60 + m
-
-            # Exact match
-            if hhmm in raw_map:
-                return raw_map[hhmm]
-
-            # Find two closest time points
-            for i in range(len(time_points) - 1):
-                t1_str, x1 = time_points[i]
-                t2_str, x2 = time_points[i + 1]
-                t1_min = int(t1_str[:2]) * 60 + int(t1_str[3:])
-                t2_min = int(t2_str[:2]) * 60 + int(t2_str[3:])
-
-                if t1_min <= target <= t2_min:
-                    ratio = (target - t1_min) / (t2_min - t1_min)
-                    return x1 + (x2 - x1) * ratio
-
-            return None  # fallback if totally outside range
-
-        return get_x
-
-    def get_y_positions(root):
-        y_map = {}
-        for status in ["off_duty", "sleeper_berth", "driving", "on_duty"]:
-            el = root.find(f".//svg:line[@id='{status}_topline']", ns)
+def round_duty_periods_to_quarter_hours(duty_periods):
+    """
+    For each period, round start/end to the nearest 15-min block
+    before injecting them into the SVG.
+    """
+    for d in duty_periods:
+        start_m = hhmm_to_minutes(d["start"])
+        end_m = hhmm_to_minutes(d["end"])
+        d["start"] = minutes_to_hhmm(round_to_quarter_hour(start_m))
+        d["end"]   = minutes_to_hhmm(round_to_quarter_hour(end_m))
+    return duty_periods
+
+
+def round_hours_to_quarter(decimal_value):
+    """Round a float hour total to nearest 0.25 increment."""
+    try:
+        val = float(decimal_value)
+    except (TypeError, ValueError):
+        val = 0.0
+    return round(val * 4) / 4.0
+
+
+def prepare_log(log):
+    """
+    Snap a log's duty periods to the quarter-hour grid, pad the day with
+    off-duty time and recompute its totals. Updates `log` in place.
+    """
+    duty_periods = log.get("duty_periods", [])
+    duty_periods = round_duty_periods_to_quarter_hours(duty_periods)
+    duty_periods = add_pre_post_off_duty_periods(duty_periods)
+    # Round again so the inserted off-duty padding is snapped as well
+    duty_periods = round_duty_periods_to_quarter_hours(duty_periods)
+    log["duty_periods"] = duty_periods
+
+    new_totals = compute_totals_from_periods(duty_periods)
+    log["off_duty_total"]      = round_hours_to_quarter(new_totals["off_duty"])
+    log["sleeper_berth_total"] = round_hours_to_quarter(new_totals["sleeper_berth"])
+    log["driving_total"]       = round_hours_to_quarter(new_totals["driving"])
+    log["on_duty_total"]       = round_hours_to_quarter(new_totals["on_duty"])
+    log["total_hours"] = round_hours_to_quarter(
+        new_totals["off_duty"]
+        + new_totals["sleeper_berth"]
+        + new_totals["driving"]
+        + new_totals["on_duty"]
+    )
+    return log
+
+
+##############################################################################
+# Compiled template
+##############################################################################
+
+def _read_time_points(root):
+    """(minutes, x) for every labelled grid line, sorted by time, plus exact x by minute."""
+    exact = {}
+    time_points = []
+    for hour in range(24):
+        hour_12 = hour % 12 or 12
+        suffix = "am" if hour < 12 else "pm"
+        for minute in [0, 15, 30, 45]:
+            el = root.find(f".//svg:line[@id='_{hour_12}{minute:02d}{suffix}_line']", SVG_NS)
+            if el is not None:
+                x = float(el.attrib.get("x1", "0"))
+                exact[hour * 60 + minute] = x
+                time_points.append((hour * 60 + minute, x))
+
+    for line_id, minutes in (("_1200am_line_start", 0), ("_1200am_line_end", MINUTES_PER_DAY)):
+        el = root.find(f".//svg:line[@id='{line_id}']", SVG_NS)
+        if el is not None:
+            exact[minutes] = float(el.attrib.get("x1", "0"))
+            time_points.append((minutes, exact[minutes]))
+
+    time_points.sort(key=lambda point: point[0])
+    return time_points, exact
+
+
+def _build_x_table(time_points, exact):
+    """
+    x position for every minute 00:00..24:00 (1441 entries): the grid line's
+    own x on a labelled minute, linear interpolation between the two
+    surrounding lines otherwise, None outside the grid.
+    """
+    minutes = [point[0] for point in time_points]
+    table = []
+    for target in range(MINUTES_PER_DAY + 1):
+        if target in exact:
+            table.append(exact[target])
+            continue
+        i = bisect_right(minutes, target) - 1
+        if i < 0 or i + 1 >= len(time_points):
+            table.append(None)
+            continue
+        t1, x1 = time_points[i]
+        t2, x2 = time_points[i + 1]
+        table.append(x1 + (x2 - x1) * (target - t1) / (t2 - t1))
+    return table
+
+
+def _canvas_size(root):
+    """(width, height) of the template's user space, from viewBox or width/height."""
+    view_box = root.attrib.get("viewBox", "").replace(",", " ").split()
+    if len(view_box) == 4:
+        return float(view_box[2]), float(view_box[3])
+    return float(root.attrib.get("width", "0")), float(root.attrib.get("height", "0"))
+
+
+class CompiledLogTemplate:
+    """
+    A log-book template ready for splicing: `head` is everything up to the
+    closing </svg> tag, `tail` the rest, `x_table[minute]` the grid x of each
+    minute and `y_map` the top line of each duty status row. `version` changes
+    whenever the template or RENDERER_VERSION does.
+    """
+
+    __slots__ = ("version", "head", "tail", "overlay_head", "width", "height", "x_table", "y_map")
+
+    def __init__(self, svg_bytes: bytes):
+        # Identifies what this template renders; part of every artifact key
+        self.version = hashlib.sha256(svg_bytes + f"renderer-{RENDERER_VERSION}".encode()).hexdigest()
+        close = svg_bytes.rindex(b"</svg>")
+        self.head = svg_bytes[:close]
+        self.tail = svg_bytes[close:]
+
+        root = ET.fromstring(svg_bytes)
+        # Same canvas as the template with nothing drawn on it (see overlay())
+        canvas = "".join(
+            f' {name}="{escape(root.attrib[name])}"'
+            for name in ("width", "height", "viewBox") if name in root.attrib
+        )
+        self.overlay_head = f'<svg xmlns="{SVG_NS["svg"]}"{canvas}>'.encode("utf-8")
+        self.width, self.height = _canvas_size(root)
+        self.x_table = _build_x_table(*_read_time_points(root))
+        self.y_map = {}
+        for status in STATUSES:
+            el = root.find(f".//svg:line[@id='{status}_topline']", SVG_NS)
             if el is not None:
-                y_map[status] = float(el.attrib.get("y1", "0"))
-        return y_map
-
-    def inject_text(root, x, y, text):
-        if text != "":
-            ET.SubElement(root, "{http://www.w3.org/2000/svg}text", {
-                "x": str(x),
-                "y": str(y),
-                "font-size": "10",
-                "fill": "black"
-            }).text = str(text)
-
-    ##########################################################################
-    # 3. MAIN LOOP (modified only to add rounding steps)
-    ##########################################################################
-
-    for log in logs:
-        date = log["date"]
-
-        tree = ET.parse(svg_input)
-        root = tree.getroot()
-        get_x_for_time = get_x_position_for_time(root)
-        y_map = get_y_positions(root)
-
-        ######################################################################
-        # (a) Round each duty period and insert pre/post off-duty
-        ######################################################################
-        duty_periods = log.get("duty_periods", [])
-
-        # 1) Round the user-provided periods
-        duty_periods = round_duty_periods_to_quarter_hours(duty_periods)
-
-        # 2) Insert pre/post off-duty
-        duty_periods = add_pre_post_off_duty_periods(duty_periods)
-
-        # 3) (Optional) Round again in case you want the newly inserted segments also snapped
-        duty_periods = round_duty_periods_to_quarter_hours(duty_periods)
-
-        # now final
-        log["duty_periods"] = duty_periods
-
-        # Now compute new totals from the final, updated periods
-        new_totals = compute_totals_from_periods(duty_periods)
-
-        # Round each total to .25 increments if you like:
-        log["off_duty_total"]      = round_hours_to_quarter(new_totals["off_duty"])
-        log["sleeper_berth_total"] = round_hours_to_quarter(new_totals["sleeper_berth"])
-        log["driving_total"]       = round_hours_to_quarter(new_totals["driving"])
-        log["on_duty_total"]       = round_hours_to_quarter(new_totals["on_duty"])
-
-        # Then, if you want a 'total_hours' as the sum, do:
-        sum_all = (new_totals["off_duty"]
-                   + new_totals["sleeper_berth"]
-                   + new_totals["driving"]
-                   + new_totals["on_duty"])
-        log["total_hours"] = round_hours_to_quarter(sum_all)
-        log["duty_periods"] = duty_periods
-
-        ######################################################################
-        # (b) Round the daily hour totals to the nearest 0.25 increment
-        ######################################################################
-        # If your code sets these as numbers, they might be floats or strings:
-        log["off_duty_total"]       = round_hours_to_quarter(log.get("off_duty_total", 0))
-        log["sleeper_berth_total"]  = round_hours_to_quarter(log.get("sleeper_berth_total", 0))
-        log["driving_total"]        = round_hours_to_quarter(log.get("driving_total", 0))
-        log["on_duty_total"]        = round_hours_to_quarter(log.get("on_duty_total", 0))
-        log["total_hours"]          = round_hours_to_quarter(log.get("total_hours", 0))
-
-        ######################################################################
-        # (c) Inject fixed-position text (unchanged)
-        ######################################################################
-        inject_text(root, 205.04, 73, log.get("month", ""))
-        inject_text(root, 256, 73, log.get("day", ""))
-        inject_text(root, 301.04, 73, log.get("year", ""))
-
-        inject_text(root, 95, 137,  f"{log.get('total_miles', 0)}")
-        inject_text(root, 188, 137, f"{log.get('total_miles', 0)}")
-
-        inject_text(root, 524, 270, log.get("off_duty_total", 0))
-        inject_text(root, 524, 289, log.get("sleeper_berth_total", 0))
-        inject_text(root, 524, 307, log.get("driving_total", 0))
-        inject_text(root, 524, 325, log.get("on_duty_total", 0))
-        inject_text(root, 524, 381, log.get("total_hours", 0))
-
-        ######################################################################
-        # (d) Draw connected duty lines (unchanged except for referencing
-        #     the updated log["duty_periods"])
-        ######################################################################
+                self.y_map[status] = float(el.attrib.get("y1", "0"))
+
+    def x_for(self, hhmm: str):
+        minutes = hhmm_to_minutes(hhmm)
+        if 0 <= minutes <= MINUTES_PER_DAY:
+            return self.x_table[minutes]
+        return None
+
+    def render(self, log) -> bytes:
+        """SVG bytes for one prepared log (see prepare_log)."""
+        fragments = []
+
+        def text(x, y, value):
+            if value != "":
+                fragments.append(
+                    f'<text x="{x}" y="{y}" font-size="10" fill="black">{escape(str(value))}</text>'
+                )
+
+        def line(x1, y1, x2, y2):
+            fragments.append(
+                f'<line x1="{round(x1, 2)}" y1="{round(y1, 2)}" x2="{round(x2, 2)}" '
+                f'y2="{round(y2, 2)}" stroke="black" stroke-width="2" />'
+            )
+
+        # Fixed-position header and totals
+        text(205.04, 73, log.get("month", ""))
+        text(256, 73, log.get("day", ""))
+        text(301.04, 73, log.get("year", ""))
+
+        text(95, 137, f"{log.get('total_miles', 0)}")
+        text(188, 137, f"{log.get('total_miles', 0)}")
+
+        text(524, 270, log.get("off_duty_total", 0))
+        text(524, 289, log.get("sleeper_berth_total", 0))
+        text(524, 307, log.get("driving_total", 0))
+        text(524, 325, log.get("on_duty_total", 0))
+        text(524, 381, log.get("total_hours", 0))
+
+        # Connected duty lines: horizontal per period, vertical between statuses
+        periods = log["duty_periods"]
         previous_x = None
         previous_y = None
-
-        for i, duty in enumerate(log["duty_periods"]):
-            start_time = duty["start"]
-            end_time = duty["end"]
+        for i, duty in enumerate(periods):
             status = duty["status"]
-
-            x1 = get_x_for_time(start_time)
-            x2 = get_x_for_time(end_time)
-            current_y = midpoint_between(status, y_map)
+            x1 = self.x_for(duty["start"])
+            x2 = self.x_for(duty["end"])
+            current_y = midpoint_between(status, self.y_map)
 
             if x1 is None or x2 is None or current_y is None:
-                #  Debug for off positioning
                 if settings.DEBUG:
-                    print(f"Missing position for {start_time}–{end_time} or status '{status}'")
+                    print(f"Missing position for {duty['start']}–{duty['end']} or status '{status}'")
                 continue
 
-            # (a) Draw vertical transition from previous status (if needed)
             if previous_x is not None and previous_y is not None and previous_x != x1:
-                ET.SubElement(root, "line", {
-                    "x1": str(round(x1, 2)),
-                    "y1": str(round(previous_y, 2)),
-                    "x2": str(round(x1, 2)),
-                    "y2": str(round(current_y, 2)),
-                    "stroke": "black",
-                    "stroke-width": "2"
-                })
-
-            # (b) Draw horizontal line for current duty period
-            ET.SubElement(root, "line", {
-                "x1": str(round(x1, 2)),
-                "y1": str(round(current_y, 2)),
-                "x2": str(round(x2, 2)),
-                "y2": str(round(current_y, 2)),
-                "stroke": "black",
-                "stroke-width": "2"
-            })
-
-            # (c) Draw vertical transition to next status (if different)
-            next_duty = log["duty_periods"][i + 1] if i + 1 < len(log["duty_periods"]) else None
-            if next_duty:
-                next_status = next_duty["status"]
-                next_y = midpoint_between(next_status, y_map)
+                line(x1, previous_y, x1, current_y)
+
+            line(x1, current_y, x2, current_y)
+
+            if i + 1 < len(periods):
+                next_status = periods[i + 1]["status"]
+                next_y = midpoint_between(next_status, self.y_map)
                 if next_status != status and next_y is not None:
-                    ET.SubElement(root, "line", {
-                        "x1": str(round(x2, 2)),
-                        "y1": str(round(current_y, 2)),
-                        "x2": str(round(x2, 2)),
-                        "y2": str(round(next_y, 2)),
-                        "stroke": "black",
-                        "stroke-width": "2"
-                    })
+                    line(x2, current_y, x2, next_y)
 
             previous_x = x2
             previous_y = current_y
 
-        ######################################################################
-        # (e) Save out the SVG (unchanged)
-        ######################################################################
-        out_file = output_dir / str(trip_id) / "logs" / f"output-{date}.svg"
-        out_file.parent.mkdir(parents=True, exist_ok=True)
-        tree.write(out_file, encoding="utf-8", xml_declaration=True)
+        return b"".join((XML_DECLARATION, self.head, "".join(fragments).encode("utf-8"), self.tail))
+
+    def fragments(self, svg_bytes: bytes):
+        """
+        The <text> and <line> fragments a day rendered from this template
+        added to it, or None if svg_bytes did not come from this template.
+        """
+        prefix = XML_DECLARATION + self.head
+        if not svg_bytes.startswith(prefix) or not svg_bytes.endswith(self.tail):
+            return None
+        return svg_bytes[len(prefix):len(svg_bytes) - len(self.tail)]
+
+    def overlay(self, svg_bytes: bytes):
+        """
+        Reduce a day rendered from this template to its own fragments on an
+        empty canvas of the same size, for drawing over a pre-rendered blank
+        template. Returns None if svg_bytes did not come from this template.
+        """
+        fragments = self.fragments(svg_bytes)
+        if fragments is None:
+            return None
+        return b"".join((self.overlay_head, fragments, b"</svg>"))
+
+
+@lru_cache(maxsize=None)
+def compile_template(svg_path=SVG_PATH) -> CompiledLogTemplate:
+    """Compile a template once per process and path."""
+    return CompiledLogTemplate(Path(svg_path).read_bytes())
+
+
+##############################################################################
+# Optimized template and multi-day documents
+##############################################################################
+
+_ID_REFERENCE = re.compile(r"url\(#([^)]+)\)|href=\"#([^\"]+)\"")
+_METADATA_TAGS = {f"{{{SVG_NS['svg']}}}{name}" for name in ("title", "desc", "metadata")}
+LOG_SHEET_SYMBOL_ID = "log-sheet"
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _serialize(element) -> bytes:
+    """Markup of an element whose tags were reduced to local names (no ns0: prefixes)."""
+    return ET.tostring(element, encoding="utf-8", xml_declaration=False)
+
+
+def _prune_style(css: str, used_classes) -> str:
+    """Drop selectors of classes no element uses, and rules left with none."""
+    rules = []
+    for selectors, declarations in re.findall(r"([^{}]+)\{([^{}]*)\}", css):
+        kept = [
+            selector for selector in selectors.split(",")
+            if not selector.strip().startswith(".") or selector.strip()[1:] in used_classes
+        ]
+        if kept:
+            rules.append(f"{','.join(kept)}{{{declarations}}}")
+    return "".join(rules)
+
+
+def _is_blank(element) -> bool:
+    """Text or group that draws nothing: only whitespace text, no other children."""
+    if _local_name(element.tag) == "text":
+        return not "".join(element.itertext()).strip()
+    if _local_name(element.tag) == "g":
+        return len(element) == 0 and not (element.text or "").strip()
+    return False
+
+
+def optimize_template(svg_bytes: bytes) -> bytes:
+    """
+    The template with what only the editor needs stripped: <title>, <desc>
+    and <metadata>, comments, data-name attributes, whitespace-only text and
+    the groups it leaves empty, CSS rules and clip paths nothing uses, and ids
+    nothing refers to. It draws the same, but can no longer be compiled (the
+    grid line ids are gone), so render from the original and display this one.
+    """
+    root = ET.fromstring(svg_bytes)
+
+    def prune(parent):
+        for child in list(parent):
+            prune(child)
+            if child.tag in _METADATA_TAGS or _is_blank(child):
+                parent.remove(child)
+
+    prune(root)
+    styles = [element for element in root.iter() if _local_name(element.tag) == "style"]
+    used_classes = {
+        name for element in root.iter() for name in element.attrib.get("class", "").split()
+    }
+    for style in styles:
+        style.text = _prune_style(style.text or "", used_classes)
+
+    referenced = {
+        url or href for url, href in _ID_REFERENCE.findall(ET.tostring(root, encoding="unicode"))
+    }
+    for parent in root.iter():
+        for child in list(parent):
+            if _local_name(child.tag) == "clipPath" and child.attrib.get("id") not in referenced:
+                parent.remove(child)
+    for element in root.iter():
+        element.tag = _local_name(element.tag)
+        if element.attrib.get("id") not in referenced:
+            element.attrib.pop("id", None)
+        element.attrib.pop("data-name", None)
+    root.attrib = {"xmlns": SVG_NS["svg"], **root.attrib}
+    return _serialize(root)
+
+
+@lru_cache(maxsize=None)
+def _symbol_parts(svg_path=SVG_PATH):
+    """(defs, body) markup of the optimized template: its <defs> contents and everything else."""
+    root = ET.fromstring(optimize_template(Path(svg_path).read_bytes()))
+    defs, body = [], []
+    for element in root.iter():
+        element.tag = _local_name(element.tag)
+    for child in root:
+        (defs.extend if child.tag == "defs" else body.append)(child)
+    return b"".join(map(_serialize, defs)), b"".join(map(_serialize, body))
+
+
+def render_log_document(pages, svg_input=SVG_PATH) -> bytes:
+    """
+    One SVG for several days rendered from the template (bytes of each page,
+    in order): the grid is defined once as a <symbol> and each day, stacked
+    top to bottom, is a <use> of it followed by that day's fragments.
+    """
+    template = compile_template(svg_input)
+    defs, body = _symbol_parts(svg_input)
+    width, height = template.width, template.height
+    size = f'width="{width:g}" height="{height:g}"'
+
+    days = []
+    for i, page in enumerate(pages):
+        fragments = template.fragments(page)
+        if fragments is None:
+            raise ValueError(f"Page {i} was not rendered from {svg_input}")
+        days.append(
+            f'<g transform="translate(0 {i * height:g})"><use href="#{LOG_SHEET_SYMBOL_ID}" {size}/>'.encode("utf-8")
+            + fragments + b"</g>"
+        )
+
+    total = f'viewBox="0 0 {width:g} {height * len(days):g}"'
+    return b"".join((
+        XML_DECLARATION,
+        f'<svg xmlns="{SVG_NS["svg"]}" {total}><defs>'.encode("utf-8"),
+        defs,
+        f'<symbol id="{LOG_SHEET_SYMBOL_ID}" viewBox="0 0 {width:g} {height:g}">'.encode("utf-8"),
+        body,
+        b"</symbol></defs>",
+        *days,
+        b"</svg>",
+    ))
+
+
+##############################################################################
+# Rendering days to files
+##############################################################################
+
+def _render_day(svg_input, out_file, log):
+    """Prepare, render and write one day. Runs in pool workers; returns the prepared log."""
+    prepare_log(log)
+    out_file.write_bytes(compile_template(svg_input).render(log))
+    return log
+
+
+_process_pools = {}
+_process_pools_lock = threading.Lock()
+
+
+def _get_process_pool(workers: int):
+    """
+    Shared fork-based pool of `workers` processes, created on first use.
+    Pools are kept per worker count rather than resized, since another
+    thread may be rendering on the current one. Returns None where fork is
+    not available.
+    """
+    with _process_pools_lock:
+        pool = _process_pools.get(workers)
+        if pool is None:
+            try:
+                context = multiprocessing.get_context("fork")
+                pool = _process_pools[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            except (ValueError, OSError, NotImplementedError):
+                return None
+        return pool
+
+
+def _discard_process_pool(workers, pool):
+    """Drop a broken pool, unless another caller already replaced it."""
+    with _process_pools_lock:
+        if _process_pools.get(workers) is pool:
+            del _process_pools[workers]
+    pool.shutdown(wait=False)
+
+
+def _render_days_parallel(svg_input, out_files, logs, workers):
+    svg_inputs = [svg_input] * len(logs)
+    pool = _get_process_pool(workers)
+    if pool is not None:
+        try:
+            # One batch per worker keeps pickling/IPC to a few round trips
+            chunksize = -(-len(logs) // workers)
+            return list(pool.map(_render_day, svg_inputs, out_files, logs, chunksize=chunksize))
+        except (BrokenProcessPool, OSError):
+            _discard_process_pool(workers, pool)
+    with ThreadPoolExecutor(max_workers=min(workers, len(logs))) as threads:
+        return list(threads.map(_render_day, svg_inputs, out_files, logs))
+
+
+def render_svgs(logs, out_files, svg_input=SVG_PATH, workers=None):
+    """
+    Render logs[i] to out_files[i]. Each log is prepared in place (see
+    prepare_log) before it is drawn.
+
+    `workers` defaults to settings.SVG_RENDER_WORKERS; above 1, days render in
+    parallel. Output is the same either way.
+    """
+    if workers is None:
+        workers = getattr(settings, "SVG_RENDER_WORKERS", 1)
+
+    if workers <= 1 or len(logs) < 2:
+        for out_file, log in zip(out_files, logs):
+            _render_day(svg_input, out_file, log)
+        return
+
+    # Workers get copies, so copy the prepared logs back for callers that read them.
+    # The pool is sized by `workers` alone, so short trips share it with long ones
+    for log, prepared in zip(logs, _render_days_parallel(svg_input, out_files, logs, workers)):
+        if prepared is not log:
+            log.clear()
+            log.update(prepared)
+
+
+def inject_duty_periods_into_svg(logs, trip_id, svg_input=SVG_PATH, output_dir=Path(settings.MEDIA_ROOT),
+                                 workers=None):
+    """
+    Write one `output-<date>.svg` per log under <output_dir>/<trip_id>/logs.
+    File names depend only on the log date.
+    """
+    out_dir = Path(output_dir) / str(trip_id) / "logs"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_files = [out_dir / f"output-{log['date']}.svg" for log in logs]
+    render_svgs(logs, out_files, svg_input, workers)
@@ -0,0 +1,150 @@
+"""
+Shared fixtures for trips tests: fake ORS responses, a cairosvg stand-in
+and trip factories.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+from math import cos, radians
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import polyline
+from PyPDF2 import PdfWriter
+
+from django.utils import timezone
+
+from trips.models import DailyLog, Trip, TripLeg, TripSegmentStep
+from trips.services.route_ingest import ingest_polyline
+
+
+def ors_directions_payload(miles=(120.0, 480.0), mph=55.0, points_per_segment=50):
+    """
+    Build an ORS directions JSON body for a straight eastbound route with one
+    segment per entry in `miles` and two steps per segment.
+    """
+    coords = [(41.88, -87.63)]
+    segments = []
+    for seg_miles in miles:
+        start_idx = len(coords) - 1
+        lat, lon = coords[-1]
+        # Degrees of longitude per vertex so the polyline length matches seg_miles
+        step = seg_miles / (69.09 * cos(radians(lat))) / points_per_segment
+        for _ in range(points_per_segment):
+            lon += step
+            coords.append((lat, round(lon, 5)))
+        end_idx = len(coords) - 1
+        mid_idx = (start_idx + end_idx) // 2
+        duration = seg_miles / mph * 3600
+        segments.append({
+            "distance": seg_miles,
+            "duration": duration,
+            "steps": [
+                {"distance": seg_miles / 2, "duration": duration / 2, "instruction": "Head east",
+                 "way_points": [start_idx, mid_idx]},
+                {"distance": seg_miles / 2, "duration": duration / 2, "instruction": "Continue",
+                 "way_points": [mid_idx, end_idx]},
+            ],
+        })
+    return {
+        "routes": [{
+            "summary": {"distance": sum(miles), "duration": sum(miles) / mph * 3600},
+            "segments": segments,
+            "geometry": polyline.encode(coords, precision=5),
+        }]
+    }
+
+
+def parsed_route(miles=(120.0, 480.0), mph=55.0, points_per_segment=50):
+    """The dict get_route() returns, built from ors_directions_payload()."""
+    route = ors_directions_payload(miles, mph, points_per_segment)["routes"][0]
+    geometry = ingest_polyline(route["geometry"])
+    for segment in route["segments"]:
+        for step in segment["steps"]:
+            start_idx, end_idx = step["way_points"]
+            step["start_lon"], step["start_lat"] = geometry.lons[start_idx], geometry.lats[start_idx]
+            step["end_lon"], step["end_lat"] = geometry.lons[end_idx], geometry.lats[end_idx]
+    return {
+        "distance_miles": Decimal(route["summary"]["distance"]),
+        "duration_hours": Decimal(route["summary"]["duration"]) / 3600,
+        "segments": route["segments"],
+        "geometry": geometry,
+    }
+
+
+def mock_response(json_body, status_code=200):
+    response = MagicMock()
+    response.status_code = status_code
+    response.json.return_value = json_body
+    response.text = ""
+    return response
+
+
+TRIP_PAYLOAD = {
+    "name": "Test trip",
+    "current_location_label": "Chicago, IL",
+    "current_location_lat": 41.88,
+    "current_location_lon": -87.63,
+    "pickup_location_label": "Indianapolis, IN",
+    "pickup_location_lat": 39.77,
+    "pickup_location_lon": -86.16,
+    "dropoff_location_label": "Dallas, TX",
+    "dropoff_location_lat": 32.78,
+    "dropoff_location_lon": -96.80,
+    "current_cycle_hours": 10,
+}
+
+
+def fake_svg2pdf(url=None, bytestring=None, write_to=None):
+    """Stand-in for cairosvg: a one-page PDF whose page width encodes the SVG size."""
+    svg_bytes = bytestring if bytestring is not None else Path(url).read_bytes()
+    writer = PdfWriter()
+    writer.add_blank_page(width=100 + len(svg_bytes) % 1000, height=100)
+    if isinstance(write_to, str):
+        with open(write_to, "wb") as out:
+            writer.write(out)
+    else:
+        writer.write(write_to)
+
+
+def create_trip(user=None, **overrides):
+    fields = {"user": user, **TRIP_PAYLOAD, **overrides}
+    return Trip.objects.create(**fields)
+
+
+def add_legs(trip, count, steps_per_leg=2):
+    """Attach `count` plain drive legs, each with `steps_per_leg` steps, to a trip."""
+    now = timezone.now()
+    legs = TripLeg.objects.bulk_create([
+        TripLeg(
+            trip=trip, leg_order=i, start_label=f"Leg {i}", end_label=f"Leg {i}",
+            distance_miles=Decimal("10.00"), duration_hours=Decimal("0.20"),
+            departure_time=now + timedelta(hours=i), arrival_time=now + timedelta(hours=i + 1),
+            polyline_geometry=[[41.0, -87.0], [41.1, -87.1]],
+        )
+        for i in range(count)
+    ])
+    TripSegmentStep.objects.bulk_create([
+        TripSegmentStep(
+            leg=leg, step_order=j, instruction="Continue",
+            distance_meters=Decimal("100.00"), duration_seconds=Decimal("10.00"),
+            start_lat=41.0, start_lon=-87.0, end_lat=41.1, end_lon=-87.1, waypoints=[0, 1],
+        )
+        for leg in legs for j in range(steps_per_leg)
+    ])
+
+
+def add_daily_logs(trip, days, miles=100.0, start=date(2026, 3, 1)):
+    """Store `days` DailyLog rows for a trip; day i drives i hours from 06:00."""
+    return DailyLog.objects.bulk_create([
+        DailyLog(
+            trip=trip, date=start + timedelta(days=i), from_location="Chicago, IL",
+            to_location="Denver, CO", total_miles=miles + i, total_hours=24.0,
+            off_duty_total=23.0 - i, sleeper_berth_total=0.0, driving_total=i + 1.0, on_duty_total=0.0,
+            duty_periods=[
+                {"status": "off_duty", "start": "00:00", "end": "06:00"},
+                {"status": "driving", "start": "06:00", "end": f"{7 + i:02d}:00"},
+                {"status": "off_duty", "start": f"{7 + i:02d}:00", "end": "24:00"},
+            ],
+        )
+        for i in range(days)
+    ])
@@ -0,0 +1,265 @@
+"""
+Tests for the content-addressed artifact store, the stored log SVGs, the
+multi-day logs.svg document and the gc_artifacts command.
+"""
+import gzip
+import os
+import tempfile
+import time
+from io import StringIO
+from pathlib import Path
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from trips.models import DailyLog
+from trips.services import log_artifacts
+from trips.services.artifacts import ArtifactStore, get_store
+from trips.services.log_artifacts import ensure_trip_svgs, rendered_trip_svgs
+from trips.services.log_pdf import build_logs_pdf
+from trips.tests.helpers import add_daily_logs, create_trip, fake_svg2pdf
+from trips.utils import metrics
+
+
+class MediaRootMixin:
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=tmp.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.media = Path(tmp.name)
+        metrics.reset()
+
+
+class ArtifactStoreTests(MediaRootMixin, TestCase):
+
+    def put(self, store, key, size, age=0):
+        tmp = store.temp_path("svg", key, "svg")
+        tmp.write_bytes(b"x" * size)
+        path = store.put("svg", key, "svg", tmp)
+        if age:
+            stamp = time.time() - age
+            os.utime(path, (stamp, stamp))
+        return path
+
+    def test_get_is_a_miss_until_put(self):
+        store = ArtifactStore(self.media / "artifacts")
+
+        self.assertIsNone(store.get("svg", "ab12", "svg"))
+        path = self.put(store, "ab12", 10)
+
+        self.assertEqual(store.get("svg", "ab12", "svg"), path)
+        self.assertEqual(path, self.media / "artifacts" / "svg" / "ab" / "ab12.svg")
+        self.assertEqual(metrics.get_counter("artifacts.svg.misses"), 1)
+        self.assertEqual(metrics.get_counter("artifacts.svg.hits"), 1)
+        self.assertEqual(list(path.parent.glob(".*.tmp")), [])
+
+    def test_over_limit_evicts_least_recently_used(self):
+        store = ArtifactStore(self.media / "artifacts", max_bytes=300, low_water=0.75)
+        old = self.put(store, "aa01", 100, age=300)
+        used = self.put(store, "bb02", 100, age=200)
+        newer = self.put(store, "cc03", 100, age=100)
+        store.get("svg", "bb02", "svg")  # reading refreshes it
+
+        latest = self.put(store, "dd04", 100)
+
+        self.assertFalse(old.exists())
+        self.assertFalse(newer.exists())
+        self.assertTrue(used.exists())
+        self.assertTrue(latest.exists())
+        self.assertEqual(metrics.get_counter("artifacts.svg.evictions"), 2)
+
+    def test_usage_by_kind(self):
+        store = get_store()
+        self.put(store, "aa01", 10)
+        self.put(store, "bb02", 20)
+
+        self.assertEqual(store.usage(), {"svg": {"count": 2, "bytes": 30}})
+
+
+class LogSvgArtifactTests(MediaRootMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.trip = create_trip()
+        add_daily_logs(self.trip, 3)
+
+    def test_generation_records_keys_and_skips_stored_pages(self):
+        with patch.object(log_artifacts, "render_svgs", wraps=log_artifacts.render_svgs) as render:
+            pages = ensure_trip_svgs(self.trip)
+            again = ensure_trip_svgs(self.trip)
+
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(pages, again)
+        keys = list(self.trip.daily_logs.values_list("svg_key", flat=True))
+        self.assertEqual(keys, [path.stem for _, path in pages])
+        self.assertEqual(len(set(keys)), 3)
+        self.assertTrue(all(path.read_bytes().startswith(b"<?xml") for _, path in pages))
+
+    def test_identical_days_share_one_file_across_trips(self):
+        other = create_trip()
+        add_daily_logs(other, 2)
+
+        mine = ensure_trip_svgs(self.trip)
+        with patch.object(log_artifacts, "render_svgs") as render:
+            theirs = ensure_trip_svgs(other)
+
+        render.assert_not_called()
+        self.assertEqual([path for _, path in theirs], [path for _, path in mine[:2]])
+
+    def test_evicted_page_is_rendered_again(self):
+        pages = ensure_trip_svgs(self.trip)
+        pages[1][1].unlink()
+
+        restored = rendered_trip_svgs(self.trip)
+
+        self.assertEqual([path for _, path in restored], [path for _, path in pages])
+        self.assertTrue(pages[1][1].exists())
+
+    def test_svg_logs_lists_store_urls(self):
+        url = reverse("trip-svg-logs", args=[self.trip.id])
+        self.assertEqual(self.client.get(url).json(), {"count": 0, "svg_urls": []})
+
+        self.client.post(reverse("trip-generate-svgs", args=[self.trip.id]))
+        body = self.client.get(url).json()
+
+        self.assertEqual(body["count"], 3)
+        keys = self.trip.daily_logs.values_list("svg_key", flat=True)
+        self.assertEqual(
+            body["svg_urls"],
+            [f"http://testserver/media/artifacts/svg/{key[:2]}/{key}.svg" for key in keys],
+        )
+
+
+class LogDocumentEndpointTests(MediaRootMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.trip = create_trip()
+        add_daily_logs(self.trip, 3)
+        self.url = f"/api/trips/trips/{self.trip.id}/logs.svg"
+
+    def get(self, **headers):
+        res = self.client.get(self.url, headers=headers)
+        if res.status_code == 200:
+            res.body = b"".join(res.streaming_content)
+        return res
+
+    def test_not_generated_is_404(self):
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_serves_one_document_for_all_days(self):
+        ensure_trip_svgs(self.trip)
+
+        res = self.get()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res["Content-Type"], "image/svg+xml")
+        self.assertEqual(res.body.count(b"<symbol "), 1)
+        self.assertEqual(res.body.count(b"<use "), 3)
+        self.assertEqual(self.url, reverse("trip-logs-document", kwargs={"pk": self.trip.id, "format": "svg"}))
+
+    def test_gzipped_when_accepted(self):
+        ensure_trip_svgs(self.trip)
+        plain = self.get().body
+
+        res = self.get(**{"Accept-Encoding": "gzip"})
+
+        self.assertEqual(res["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", res["Vary"])
+        self.assertEqual(gzip.decompress(res.body), plain)
+        self.assertLess(len(res.body), len(plain) // 4)
+
+    def test_gzipped_etag_revalidates(self):
+        ensure_trip_svgs(self.trip)
+        etag = self.get(**{"Accept-Encoding": "gzip"})["ETag"]
+        self.assertTrue(etag.startswith('W/"'))
+
+        res = self.client.get(self.url, headers={"If-None-Match": etag, "Accept-Encoding": "gzip"})
+
+        self.assertEqual(res.status_code, 304)
+
+    def test_document_is_built_once_per_set_of_pages(self):
+        ensure_trip_svgs(self.trip)
+        with patch.object(log_artifacts, "render_log_document", wraps=log_artifacts.render_log_document) as build:
+            first = self.get()
+            second = self.get()
+            DailyLog.objects.filter(trip=self.trip).first().delete()
+            third = self.get()
+
+        self.assertEqual(build.call_count, 2)
+        self.assertEqual(first.body, second.body)
+        self.assertEqual(third.body.count(b"<use "), 2)
+
+
+class GcArtifactsCommandTests(MediaRootMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.trip = create_trip()
+        add_daily_logs(self.trip, 2)
+        self.live = [path for _, path in ensure_trip_svgs(self.trip)]
+
+        store = get_store()
+        tmp = store.temp_path("svg", "ffff", "svg")
+        tmp.write_bytes(b"<svg/>")
+        self.orphan = store.put("svg", "ffff", "svg", tmp)
+        self.legacy = self.media / "999999" / "logs"
+        self.legacy.mkdir(parents=True)
+
+    def gc(self, *args):
+        out = StringIO()
+        call_command("gc_artifacts", "--min-age", "0", *args, stdout=out)
+        return out.getvalue()
+
+    def test_deletes_unreferenced_artifacts_and_legacy_dirs(self):
+        output = self.gc()
+
+        self.assertIn("svg: 3 artifacts", output)
+        self.assertIn("Deleted 1 orphaned artifacts (6 bytes)", output)
+        self.assertFalse(self.orphan.exists())
+        self.assertFalse(self.legacy.exists())
+        self.assertTrue(all(path.exists() for path in self.live))
+
+    def test_dry_run_deletes_nothing(self):
+        output = self.gc("--dry-run")
+
+        self.assertIn("Would delete 1 orphaned artifacts", output)
+        self.assertTrue(self.orphan.exists())
+        self.assertTrue(self.legacy.exists())
+
+    def test_recent_orphans_are_kept(self):
+        out = StringIO()
+        call_command("gc_artifacts", stdout=out)
+
+        self.assertIn("Deleted 0 orphaned artifacts", out.getvalue())
+        self.assertTrue(self.orphan.exists())
+
+    def test_replanned_trip_pages_become_orphans(self):
+        DailyLog.objects.filter(trip=self.trip).delete()
+
+        self.gc()
+
+        self.assertFalse(any(path.exists() for path in self.live))
+
+    @patch("trips.services.log_pdf.cairosvg.svg2pdf", side_effect=fake_svg2pdf)
+    def test_stored_pdfs_are_kept(self, svg2pdf):
+        keys = list(DailyLog.objects.filter(trip=self.trip).order_by("date").values_list("svg_key", flat=True))
+        for overlay in (False, True):
+            with override_settings(LOG_PDF_OVERLAY=overlay), patch.dict("trips.services.log_pdf._backgrounds"):
+                merged, _ = build_logs_pdf(self.live, keys)
+        stored = {kind: kind_usage["count"] for kind, kind_usage in get_store().usage().items()}
+        self.assertEqual((stored["pdf-page"], stored["pdf"]), (4, 2))
+
+        self.gc()
+
+        self.assertTrue(merged.exists())
+        # The current (overlay) mode's pages and merged PDF survive; the whole-page ones are orphans
+        stored = {kind: kind_usage["count"] for kind, kind_usage in get_store().usage().items()}
+        self.assertEqual((stored["pdf-page"], stored["pdf"], stored["pdf-background"]), (2, 1, 1))
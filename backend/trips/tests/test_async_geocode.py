@@ -0,0 +1,339 @@
+"""
+Tests for the async upstream client, the async geocode and ORS functions and
+the async geocode views.
+"""
+import asyncio
+import time
+from unittest.mock import AsyncMock, Mock, patch
+
+import httpx
+import requests
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APIRequestFactory
+
+from trips.benchmarks import geocode_load
+from trips.services import geocode, ors
+from trips.services.async_http import AsyncUpstreamClient
+from trips.services.http_client import CircuitBreaker, UpstreamClient, UpstreamUnavailable
+from trips.services.rate_limit import RateLimited
+from trips.tests.helpers import ors_directions_payload, parsed_route
+from trips.utils import metrics
+from trips.views import AsyncGeocodeReverseView, AsyncGeocodeSearchView
+
+COORDS = [[-87.63, 41.88], [-86.16, 39.77]]
+CHICAGO = [{"place_id": 1, "display_name": "Chicago, Illinois", "lat": "41.88", "lon": "-87.63"}]
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "default"},
+    "shared": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "async-geocode-tests"},
+}
+
+
+class StubUpstream:
+    """httpx transport answering every call with `answer(request)` after `delay` seconds."""
+
+    def __init__(self, answer, delay=0.0):
+        self.answer = answer
+        self.delay = delay
+        self.requests = []
+        self.transport = httpx.MockTransport(self.handle)
+
+    async def handle(self, request):
+        self.requests.append(request)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        answer = self.answer(request)
+        if isinstance(answer, Exception):
+            raise answer
+        if isinstance(answer, httpx.Response):
+            return answer
+        return httpx.Response(200, json=answer)
+
+    @property
+    def queries(self):
+        return [request.url.params.get("q") for request in self.requests]
+
+
+def run(client, coroutine):
+    """Run a coroutine on a fresh event loop, closing `client`'s pool for it afterwards."""
+
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            await client.aclose()
+
+    return asyncio.run(main())
+
+
+@patch("trips.services.async_http.asyncio.sleep")
+class AsyncUpstreamClientTests(SimpleTestCase):
+
+    def setUp(self):
+        metrics.reset()
+        self.sync_client = UpstreamClient(
+            "test", connect_timeout=1, read_timeout=2, max_retries=2,
+            failure_threshold=3, reset_timeout=60,
+        )
+
+    def client_for(self, answer, pool_size=20):
+        upstream = StubUpstream(answer)
+        return AsyncUpstreamClient(self.sync_client, pool_size=pool_size, transport=upstream.transport), upstream
+
+    def test_retries_connection_errors_then_succeeds(self, patched_sleep):
+        answers = iter([httpx.ConnectError("refused"), {"ok": True}])
+        client, upstream = self.client_for(lambda request: next(answers))
+
+        response = run(client, client.get("https://upstream.test/ping"))
+
+        self.assertEqual(response.json(), {"ok": True})
+        self.assertEqual(len(upstream.requests), 2)
+        self.assertEqual(metrics.get_counter("http.test.retries"), 1)
+
+    def test_transport_errors_are_raised_as_requests_exceptions(self, patched_sleep):
+        client, upstream = self.client_for(lambda request: httpx.ReadTimeout("slow"))
+
+        with self.assertRaises(requests.Timeout):
+            run(client, client.get("https://upstream.test/ping"))
+        self.assertEqual(len(upstream.requests), 3)
+
+    def test_gateway_status_retried_and_returned(self, patched_sleep):
+        client, upstream = self.client_for(lambda request: httpx.Response(503))
+
+        response = run(client, client.get("https://upstream.test/ping"))
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(upstream.requests), 3)
+
+    def test_breaker_is_shared_with_the_sync_client(self, patched_sleep):
+        client, upstream = self.client_for(lambda request: httpx.ConnectError("refused"))
+
+        with self.assertRaises(requests.ConnectionError):
+            run(client, client.get("https://upstream.test/ping"))
+
+        self.assertEqual(self.sync_client.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(UpstreamUnavailable):
+            run(client, client.get("https://upstream.test/ping"))
+        self.assertEqual(len(upstream.requests), 3)
+
+    def test_other_request_errors_end_a_half_open_trial(self, patched_sleep):
+        self.sync_client.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        self.sync_client.breaker.record_failure()
+        client, upstream = self.client_for(lambda request: httpx.DecodingError("bad gzip"))
+
+        with self.assertRaises(requests.exceptions.ContentDecodingError):
+            run(client, client.get("https://upstream.test/ping"))
+
+        self.assertEqual(len(upstream.requests), 1)
+        self.assertTrue(self.sync_client.breaker.allow())
+
+    def test_cancelled_trial_lets_the_next_call_try(self, patched_sleep):
+        self.sync_client.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        self.sync_client.breaker.record_failure()
+
+        def cancelled(request):
+            raise asyncio.CancelledError
+
+        client, _ = self.client_for(cancelled)
+
+        with self.assertRaises(asyncio.CancelledError):
+            run(client, client.get("https://upstream.test/ping"))
+
+        self.assertTrue(self.sync_client.breaker.allow())
+
+    def test_retries_wait_for_a_rate_limit_slot(self, patched_sleep):
+        self.sync_client.rate_limit = Mock(aacquire=AsyncMock())
+        client, upstream = self.client_for(lambda request: httpx.Response(429))
+
+        run(client, client.get("https://upstream.test/ping"))
+
+        self.assertEqual(len(upstream.requests), 3)
+        self.assertEqual(self.sync_client.rate_limit.aacquire.await_count, 2)
+
+    def test_pool_is_split_into_small_clients(self, patched_sleep):
+        client, _ = self.client_for({}, pool_size=45)
+
+        async def clients():
+            return {id(client._client()) for _ in range(10)}
+
+        self.assertEqual(len(run(client, clients())), 4)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, GEOCODER_MODE="nominatim")
+class AsyncGeocodeTests(SimpleTestCase):
+
+    def setUp(self):
+        geocode.geocode_cache.clear_local()
+        caches["shared"].clear()
+        metrics.reset()
+        geocode.nominatim_client.breaker.record_success()
+        rate = patch.object(geocode.nominatim_bucket, "rate", 1000.0)
+        rate.start()
+        self.addCleanup(rate.stop)
+
+    def stub(self, answer, delay=0.0):
+        upstream = StubUpstream(answer, delay)
+        patcher = patch.object(geocode.nominatim_async_client, "transport", upstream.transport)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return upstream
+
+    def resolve(self, coroutine):
+        return run(geocode.nominatim_async_client, coroutine)
+
+    def test_search_results_are_cached(self):
+        upstream = self.stub(lambda request: CHICAGO)
+
+        first = self.resolve(geocode.asearch_places("Chicago"))
+        repeat = self.resolve(geocode.asearch_places("chicago"))
+
+        self.assertEqual(first[0]["display_name"], "Chicago, Illinois")
+        self.assertEqual(repeat, first)
+        self.assertEqual(len(upstream.requests), 1)
+
+    def test_concurrent_searches_are_coalesced(self):
+        upstream = self.stub(lambda request: CHICAGO, delay=0.1)
+
+        async def searches():
+            return await asyncio.gather(*(geocode.asearch_places("chicago") for _ in range(5)))
+
+        results = self.resolve(searches())
+
+        self.assertEqual(len(upstream.requests), 1)
+        self.assertTrue(all(result == results[0] for result in results))
+
+    def test_fallback_is_sent_alongside_the_full_query(self):
+        upstream = self.stub(lambda request: [] if request.url.params["q"] == "chicago zzz" else CHICAGO, delay=0.2)
+
+        start = time.perf_counter()
+        results = self.resolve(geocode.asearch_places("chicago zzz"))
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(results[0]["display_name"], "Chicago, Illinois")
+        self.assertEqual(sorted(upstream.queries), ["chicago", "chicago zzz"])
+        self.assertLess(elapsed, 0.35)
+
+    def test_fallback_answer_is_unused_when_the_full_query_finds_places(self):
+        self.stub(lambda request: [{**CHICAGO[0], "display_name": request.url.params["q"]}])
+
+        results = self.resolve(geocode.asearch_places("chicago il"))
+
+        self.assertEqual([result["display_name"] for result in results], ["chicago il"])
+
+    def test_fallback_waits_for_a_slot_when_none_is_free(self):
+        upstream = self.stub(lambda request: [] if request.url.params["q"] == "chicago zzz" else CHICAGO)
+
+        # Slots wide enough that the speculative call always finds the next one taken
+        with patch.object(geocode.nominatim_bucket, "rate", 4.0):
+            results = self.resolve(geocode.asearch_places("chicago zzz"))
+
+        self.assertEqual(results[0]["display_name"], "Chicago, Illinois")
+        self.assertEqual(upstream.queries, ["chicago zzz", "chicago"])
+        self.assertEqual(metrics.get_counter("ratelimit.nominatim.rejected"), 1)
+
+    @patch("trips.services.async_http.asyncio.sleep")
+    def test_error_answers_are_not_cached_as_empty(self, patched_sleep):
+        upstream = self.stub(lambda request: httpx.Response(503, json=[]))
+        with self.assertRaises(requests.HTTPError):
+            self.resolve(geocode.asearch_places("chicago"))
+        failed_calls = len(upstream.requests)
+
+        upstream.answer = lambda request: CHICAGO
+        results = self.resolve(geocode.asearch_places("chicago"))
+
+        self.assertEqual(results[0]["display_name"], "Chicago, Illinois")
+        self.assertEqual(len(upstream.requests), failed_calls + 1)
+
+    def test_reverse_is_cached_per_rounded_point(self):
+        upstream = self.stub(lambda request: {"display_name": "Chicago, Illinois", "lat": "41.88", "lon": "-87.63"})
+
+        first = self.resolve(geocode.areverse_geocode(41.88, -87.63))
+        nearby = self.resolve(geocode.areverse_geocode(41.880004, -87.63))
+
+        self.assertEqual(nearby, first)
+        self.assertEqual(len(upstream.requests), 1)
+
+    def test_reverse_error_status_is_raised(self):
+        self.stub(lambda request: httpx.Response(400, json={}))
+
+        with self.assertRaises(requests.HTTPError):
+            self.resolve(geocode.areverse_geocode(41.88, -87.63))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AsyncRouteTests(SimpleTestCase):
+
+    def setUp(self):
+        ors.route_cache.clear_local()
+        caches["shared"].clear()
+        ors.ors_client.breaker.record_success()
+        self.upstream = StubUpstream(lambda request: ors_directions_payload())
+        patcher = patch.object(ors.ors_async_client, "transport", self.upstream.transport)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_route_matches_the_sync_parse_and_is_cached(self):
+        route = run(ors.ors_async_client, ors.aget_route(COORDS))
+        repeat = run(ors.ors_async_client, ors.aget_route(COORDS))
+
+        expected = parsed_route()
+        self.assertEqual(list(route.pop("geometry").miles), list(expected.pop("geometry").miles))
+        self.assertEqual(route, expected)
+        self.assertEqual(repeat["segments"], route["segments"])
+        self.assertEqual(len(self.upstream.requests), 1)
+
+    def test_error_status_raises(self):
+        self.upstream.answer = lambda request: httpx.Response(400, text="bad request")
+
+        with self.assertRaisesMessage(Exception, "ORS Error: 400"):
+            run(ors.ors_async_client, ors.aget_route(COORDS))
+
+
+@override_settings(CACHES=LOCMEM_CACHES, GEOCODER_MODE="nominatim")
+class AsyncGeocodeViewTests(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+
+    def get(self, view, params):
+        response = asyncio.run(view.as_view()(self.factory.get("/", params)))
+        return response.render()
+
+    def test_search_returns_results(self):
+        with patch("trips.views.asearch_places", return_value=CHICAGO) as search:
+            res = self.get(AsyncGeocodeSearchView, {"q": " chicago "})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data[0]["display_name"], "Chicago, Illinois")
+        search.assert_awaited_once_with("chicago")
+
+    def test_search_is_503_with_retry_after_when_rate_limited(self):
+        with patch("trips.views.asearch_places", side_effect=RateLimited(retry_after=1.0)):
+            res = self.get(AsyncGeocodeSearchView, {"q": "chicago"})
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res["Retry-After"], "1")
+
+    def test_reverse_requires_coordinates(self):
+        res = self.get(AsyncGeocodeReverseView, {"lat": "41.88"})
+        self.assertEqual(res.status_code, 400)
+
+    def test_reverse_upstream_error_status_is_passed_on(self):
+        upstream_response = requests.Response()
+        upstream_response.status_code = 404
+        error = requests.HTTPError(response=upstream_response)
+        with patch("trips.views.areverse_geocode", side_effect=error):
+            res = self.get(AsyncGeocodeReverseView, {"lat": "41.88", "lon": "-87.63"})
+
+        self.assertEqual(res.status_code, 404)
+
+
+class GeocodeLoadTestTests(SimpleTestCase):
+
+    def test_async_view_keeps_calls_in_flight_together(self):
+        row, = geocode_load.run(requests=40, concurrency=40, latency=0.3)
+
+        self.assertEqual(row["errors"], 0)
+        self.assertEqual(row["upstream_calls"], 40)
+        self.assertGreater(row["upstream_max_in_flight"], 20)
+        self.assertLess(row["elapsed_s"], 40 * 0.3 / 4)
@@ -0,0 +1,82 @@
+"""
+Tests for the planning benchmark suite and its baseline comparison.
+"""
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase
+
+from trips.benchmarks import planning
+
+STAGES = ("ingest", "hos", "daily_logs", "svg")
+
+
+def results(seconds=0.1, peak_bytes=10 * 2 ** 20, case="1000mi-10000v-0h", stage="hos"):
+    return {"cases": [{"case": case, "stages": {stage: {"seconds": seconds, "peak_bytes": peak_bytes}}}]}
+
+
+class PlanningBenchmarkTests(SimpleTestCase):
+
+    def test_every_stage_is_measured_per_case(self):
+        run = planning.run(routes=((300, 3_000),), cycle_hours=(0, 69), stages=STAGES, repeat=1)
+
+        self.assertEqual([case["case"] for case in run["cases"]], ["300mi-3000v-0h", "300mi-3000v-69h"])
+        for case in run["cases"]:
+            self.assertEqual(tuple(case["stages"]), STAGES)
+            self.assertAlmostEqual(case["route_miles"], 300, delta=3)
+            self.assertTrue(all(measured["seconds"] > 0 and measured["peak_bytes"] > 0
+                                for measured in case["stages"].values()))
+        # Starting near the end of the cycle forces a 34-hour restart
+        short, long = run["cases"]
+        self.assertGreater(long["days"], short["days"])
+        json.dumps(run)
+
+    def test_regressions_beyond_the_threshold(self):
+        baseline = results(seconds=0.1)
+
+        self.assertEqual(planning.compare(results(seconds=0.12), baseline), [])
+        regression, = planning.compare(results(seconds=0.2), baseline)
+        self.assertEqual((regression["stage"], regression["metric"]), ("hos", "seconds"))
+        self.assertAlmostEqual(regression["change"], 1.0)
+
+    def test_memory_regressions_are_reported(self):
+        regression, = planning.compare(results(peak_bytes=20 * 2 ** 20), results())
+        self.assertEqual(regression["metric"], "peak_bytes")
+
+    def test_differences_below_the_noise_floor_are_ignored(self):
+        self.assertEqual(planning.compare(results(seconds=0.003), results(seconds=0.001)), [])
+
+    def test_cases_missing_from_the_baseline_are_skipped(self):
+        self.assertEqual(planning.compare(results(seconds=1.0), results(case="other")), [])
+
+
+class BenchmarkPlanningCommandTests(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.output = Path(self.tmp.name) / "results.json"
+
+    def benchmark(self, *args):
+        out = StringIO()
+        call_command("benchmark_planning", "--routes", "200:2000", "--cycle-hours", "10", "--repeat", "1",
+                     "--stages", *STAGES, *args, stdout=out)
+        return out.getvalue()
+
+    def test_writes_results_and_passes_against_itself(self):
+        self.benchmark("--output", str(self.output))
+        self.assertEqual(json.loads(self.output.read_text())["cases"][0]["case"], "200mi-2000v-10h")
+
+        output = self.benchmark("--baseline", str(self.output), "--threshold", "100")
+        self.assertIn("No regressions", output)
+
+    def test_fails_on_a_regression(self):
+        baseline = Path(self.tmp.name) / "baseline.json"
+        stages = {stage: {"seconds": 1e-9, "peak_bytes": 1} for stage in STAGES}
+        baseline.write_text(json.dumps({"cases": [{"case": "200mi-2000v-10h", "stages": stages}]}))
+
+        with self.assertRaisesMessage(CommandError, "regressions beyond 25%"):
+            self.benchmark("--baseline", str(baseline))
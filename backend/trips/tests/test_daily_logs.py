@@ -0,0 +1,227 @@
+"""
+Tests for the interval-sweep daily log builder, checked against the old
+15-minute slot builder on a corpus of planned and synthetic trips, and for
+the DailyLog rows plan_trip materializes.
+"""
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest.mock import patch
+from importlib import import_module
+from zoneinfo import ZoneInfo
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from trips.models import DailyLog, TripLeg
+from trips.serializers import DailyLogSheetSerializer
+from trips.services.generate_daily_logs import (
+    daily_log_as_dict, daily_log_rows, generate_daily_logs, merge_slot_runs, store_daily_log_rows,
+)
+from trips.services.plan import plan_trip
+from trips.tests.helpers import create_trip, parsed_route
+from trips.tests.reference_daily_logs import slot_generate_daily_logs
+
+# (is_rest_stop, is_fuel_stop, notes, miles) for each kind of leg the planner emits
+LEG_KINDS = [
+    (False, False, "", "42.50"),
+    (True, False, "Required 10-hour rest break", "0"),
+    (True, False, "34-hour off-duty reset to restart 70-hour cycle", "0"),
+    (False, True, "Fuel stop required every 1000 miles", "0"),
+    (False, False, "30-minute required HOS break", "0"),
+    (False, False, "1-hour stop for pickup", "0"),
+    (False, False, "1-hour stop for dropoff", "0"),
+]
+
+# Odd lengths on purpose: sub-minute, just over a slot, and multi-day
+DURATIONS = [
+    timedelta(seconds=20), timedelta(seconds=59), timedelta(seconds=61),
+    timedelta(minutes=7), timedelta(minutes=15), timedelta(minutes=15, seconds=30),
+    timedelta(minutes=30), timedelta(minutes=44, seconds=59), timedelta(hours=1),
+    timedelta(hours=3, minutes=7, seconds=13), timedelta(hours=10), timedelta(hours=34),
+]
+
+
+def add_synthetic_legs(trip, rng, count, start, overlap=False):
+    legs = []
+    departure = start
+    for order in range(count):
+        is_rest, is_fuel, notes, miles = rng.choice(LEG_KINDS)
+        duration = rng.choice(DURATIONS)
+        if rng.random() < 0.3:
+            duration += timedelta(seconds=rng.randint(1, 899), microseconds=rng.randint(0, 999_999))
+        legs.append(TripLeg(
+            trip=trip, leg_order=order,
+            start_label="From Chicago, IL to Dallas, TX" if order == 0 else "",
+            end_label="Dropoff: Dallas, TX",
+            distance_miles=Decimal(miles), duration_hours=Decimal(duration.total_seconds() / 3600).quantize(Decimal("0.01")),
+            departure_time=departure, arrival_time=departure + duration,
+            is_rest_stop=is_rest, is_fuel_stop=is_fuel, notes=notes,
+        ))
+        departure += duration
+        if overlap:
+            departure -= timedelta(minutes=rng.randint(0, 40))
+    TripLeg.objects.bulk_create(legs)
+
+
+class DailyLogEquivalenceTests(TestCase):
+
+    def assertSameLogs(self, trip):
+        self.assertEqual(generate_daily_logs(trip), slot_generate_daily_logs(trip))
+
+    @patch("trips.services.plan.get_route")
+    def test_planned_trips_match_slot_builder(self, patched_route):
+        cases = [
+            ((120.0, 480.0), 0, datetime(2026, 3, 2, 6, 0)),
+            ((300.0, 1700.0), 10, datetime(2026, 3, 2, 21, 17, 43)),
+            ((900.0, 2600.0), 65, datetime(2026, 3, 2, 23, 59, 31)),
+        ]
+        for miles, cycle, departure in cases:
+            with self.subTest(miles=miles, cycle=cycle):
+                patched_route.return_value = parsed_route(miles)
+                trip = create_trip(current_cycle_hours=cycle, departure_time=departure.replace(tzinfo=ZoneInfo("UTC")))
+                plan_trip(trip)
+                self.assertSameLogs(trip)
+
+    def test_synthetic_trips_match_slot_builder(self):
+        rng = random.Random(20260302)
+        for seed in range(40):
+            with self.subTest(seed=seed):
+                trip = create_trip()
+                start = datetime(2026, 3, 2, rng.randint(0, 23), rng.randint(0, 59), rng.randint(0, 59), tzinfo=ZoneInfo("UTC"))
+                add_synthetic_legs(trip, rng, rng.randint(1, 40), start)
+                self.assertSameLogs(trip)
+
+    def test_overlapping_legs_match_slot_builder(self):
+        rng = random.Random(7)
+        for seed in range(15):
+            with self.subTest(seed=seed):
+                trip = create_trip()
+                add_synthetic_legs(trip, rng, 20, datetime(2026, 3, 2, 8, 3, 9, tzinfo=ZoneInfo("UTC")), overlap=True)
+                self.assertSameLogs(trip)
+
+    @override_settings(TIME_ZONE="America/Chicago")
+    def test_dst_transitions_match_slot_builder(self):
+        rng = random.Random(11)
+        for start in (datetime(2026, 3, 7, 18, 0), datetime(2026, 10, 31, 19, 11, 5)):
+            with self.subTest(start=start):
+                trip = create_trip()
+                add_synthetic_legs(trip, rng, 25, start.replace(tzinfo=ZoneInfo("America/Chicago")))
+                self.assertSameLogs(trip)
+
+    def test_trip_without_legs(self):
+        self.assertEqual(generate_daily_logs(create_trip()), [])
+
+
+class MergeSlotRunsTests(SimpleTestCase):
+
+    def test_boundary_key_goes_to_higher_priority_status(self):
+        # Sleeper berth keeps the shared 07:45 key; driving starts at 08:00
+        runs = merge_slot_runs([(450, 2, "sleeper_berth"), (465, 4, "driving")])
+        self.assertEqual(runs, [(450, "sleeper_berth"), (480, "driving")])
+
+    def test_boundary_key_taken_by_later_piece(self):
+        runs = merge_slot_runs([(450, 2, "on_duty"), (465, 4, "driving")])
+        self.assertEqual(runs, [(450, "on_duty"), (465, "driving")])
+
+    def test_single_slot_piece_that_loses_its_key_vanishes(self):
+        runs = merge_slot_runs([(0, 3, "off_duty"), (30, 1, "on_duty"), (31, 2, "off_duty")])
+        self.assertEqual(runs, [(0, "off_duty")])
+
+    def test_same_status_pieces_merge(self):
+        runs = merge_slot_runs([(0, 4, "driving"), (60, 4, "driving"), (120, 1, "on_duty")])
+        self.assertEqual(runs, [(0, "driving"), (120, "on_duty")])
+
+
+@patch("trips.services.plan.get_route")
+class DailyLogStoreTests(TestCase):
+
+    def plan(self, patched_route, miles=(300.0, 1700.0), **overrides):
+        patched_route.return_value = parsed_route(miles)
+        trip = create_trip(**overrides)
+        plan_trip(trip)
+        return trip
+
+    def test_plan_trip_stores_daily_logs(self, patched_route):
+        trip = self.plan(patched_route)
+
+        stored = [daily_log_as_dict(row) for row in trip.daily_logs.all()]
+        self.assertGreater(len(stored), 1)
+        self.assertEqual(stored, generate_daily_logs(trip))
+
+    def test_replanning_replaces_daily_logs(self, patched_route):
+        trip = self.plan(patched_route)
+        patched_route.return_value = parsed_route((120.0, 480.0))
+        plan_trip(trip)
+
+        self.assertEqual(
+            [daily_log_as_dict(row) for row in trip.daily_logs.all()],
+            generate_daily_logs(trip),
+        )
+
+    def test_endpoint_serves_stored_logs_in_one_query(self, patched_route):
+        trip = self.plan(patched_route)
+        url = reverse("trip-daily-logs", args=[trip.id])
+
+        with self.assertNumQueries(1):
+            res = self.client.get(url)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.data), trip.daily_logs.count())
+        self.assertEqual(set(res.data[0]), set(DailyLogSheetSerializer().fields))
+        self.assertEqual(res.data[0]["date"], trip.daily_logs.first().date.isoformat())
+
+    def test_endpoint_builds_logs_of_trips_planned_before_materialization_without_storing(self, patched_route):
+        trip = self.plan(patched_route)
+        trip.daily_logs.all().delete()
+
+        res = self.client.get(reverse("trip-daily-logs", args=[trip.id]))
+
+        self.assertEqual(len(res.data), len(generate_daily_logs(trip)))
+        self.assertEqual(trip.daily_logs.count(), 0)
+
+    def test_migration_backfills_trips_planned_before_materialization(self, patched_route):
+        trip = self.plan(patched_route)
+        expected = [daily_log_as_dict(row) for row in trip.daily_logs.all()]
+        trip.daily_logs.all().delete()
+        unplanned = create_trip()
+
+        # The models as of the migration, as migrate would pass them
+        historical = MigrationLoader(connection).project_state(("trips", "0013_backfill_daily_logs")).apps
+        backfill = import_module("trips.migrations.0013_backfill_daily_logs").backfill_daily_logs
+        backfill(historical, None)
+        backfill(historical, None)
+
+        self.assertEqual([daily_log_as_dict(row) for row in trip.daily_logs.all()], expected)
+        self.assertFalse(unplanned.daily_logs.exists())
+
+    def test_concurrent_first_requests_store_the_rows_once(self, patched_route):
+        trip = self.plan(patched_route)
+        count = trip.daily_logs.count()
+        trip.daily_logs.all().delete()
+        logs = generate_daily_logs(trip)
+
+        def racing_request(trip):
+            # Another request stores the rows between this one's check and its insert
+            DailyLog.objects.bulk_create(daily_log_rows(trip, logs))
+            return logs
+
+        with patch("trips.services.generate_daily_logs.generate_daily_logs", side_effect=racing_request):
+            rows = store_daily_log_rows(trip)
+
+        self.assertEqual(len(rows), count)
+        self.assertTrue(all(row.pk for row in rows))
+        self.assertEqual(trip.daily_logs.count(), count)
+
+    def test_endpoint_hides_other_users_trips(self, patched_route):
+        owner = get_user_model().objects.create_user(
+            email="owner@example.com", first_name="O", last_name="W", password="pass12345"
+        )
+        trip = self.plan(patched_route, user=owner)
+
+        res = self.client.get(reverse("trip-daily-logs", args=[trip.id]))
+
+        self.assertEqual(res.status_code, 404)
@@ -0,0 +1,204 @@
+"""
+Tests for the offline gazetteer geocoder and GEOCODER_MODE.
+"""
+import random
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from trips.services import geocode
+from trips.services.gazetteer import (
+    MemoryGazetteer, SqliteGazetteer, build_sqlite_gazetteer, haversine_km, load_gazetteer, read_places,
+)
+from trips.services.geocode import search_places
+from trips.tests.helpers import mock_response
+
+# Census national places layout: tab-separated, padded last header
+CENSUS_PLACES = (
+    "USPS\tGEOID\tANSICODE\tNAME\tLSAD\tFUNCSTAT\tALAND\tAWATER\tALAND_SQMI\tAWATER_SQMI\tINTPTLAT\tINTPTLONG    \n"
+    "IL\t1714000\t00428803\tChicago city\t25\tA\t0\t0\t0\t0\t41.837551\t-87.681844\n"
+    "IL\t1714351\t02393560\tChicago Heights city\t25\tA\t0\t0\t0\t0\t41.510263\t-87.638264\n"
+    "IL\t1780060\t02397305\tWest Chicago city\t25\tA\t0\t0\t0\t0\t41.896991\t-88.208153\n"
+    "IL\t1710487\t02393468\tCicero town\t43\tA\t0\t0\t0\t0\t41.845365\t-87.759412\n"
+    "CA\t0667000\t02411786\tSan Francisco city\t25\tA\t0\t0\t0\t0\t37.727239\t-123.032229\n"
+    "TX\t4865000\t02411774\tSan Antonio city\t25\tA\t0\t0\t0\t0\t29.472403\t-98.525142\n"
+    "KS\t2036000\t00485602\tKansas City city\t25\tA\t0\t0\t0\t0\t39.123922\t-94.741906\n"
+)
+POPULATION = {"1714000": 2746388, "1714351": 27480, "1780060": 25614, "1710487": 85268,
+              "0667000": 873965, "4865000": 1434625, "2036000": 156607}
+
+
+def write_gazetteers(directory: Path):
+    tsv = directory / "places.txt"
+    tsv.write_text(CENSUS_PLACES)
+    csv_path = directory / "places.csv"
+    lines = ["place_id,name,state,lat,lon,population"]
+    for place in read_places(tsv):
+        lines.append(
+            f"{place['place_id']},{place['name']},{place['state']},{place['lat']},{place['lon']},"
+            f"{POPULATION[place['place_id']]}"
+        )
+    csv_path.write_text("\n".join(lines) + "\n")
+    sqlite_path = directory / "places.sqlite"
+    build_sqlite_gazetteer(read_places(csv_path), sqlite_path)
+    return csv_path, sqlite_path
+
+
+class GazetteerDirMixin:
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.csv_path, self.sqlite_path = write_gazetteers(Path(tmp.name))
+
+
+class GazetteerTests(GazetteerDirMixin, SimpleTestCase):
+
+    def gazetteers(self):
+        return {"memory": load_gazetteer(self.csv_path), "sqlite": load_gazetteer(self.sqlite_path)}
+
+    def names(self, results):
+        return [result["display_name"] for result in results]
+
+    def test_loads_by_file_type(self):
+        gazetteers = self.gazetteers()
+        self.assertIsInstance(gazetteers["memory"], MemoryGazetteer)
+        self.assertIsInstance(gazetteers["sqlite"], SqliteGazetteer)
+        self.assertEqual({len(gazetteer) for gazetteer in gazetteers.values()}, {7})
+
+    def test_census_names_lose_their_description(self):
+        names = [place["name"] for place in read_places(self.csv_path.with_name("places.txt"))]
+        self.assertIn("Chicago", names)
+        self.assertIn("Kansas City", names)
+
+    def test_search_ranks_by_population(self):
+        for kind, gazetteer in self.gazetteers().items():
+            with self.subTest(kind):
+                self.assertEqual(
+                    self.names(gazetteer.search("chica")),
+                    ["Chicago, IL", "Chicago Heights, IL", "West Chicago, IL"],
+                )
+                self.assertEqual(self.names(gazetteer.search("San")), ["San Antonio, TX", "San Francisco, CA"])
+                self.assertEqual(self.names(gazetteer.search("san fran")), ["San Francisco, CA"])
+                self.assertEqual(self.names(gazetteer.search("chicago, il", limit=1)), ["Chicago, IL"])
+                self.assertEqual(gazetteer.search("zzz"), [])
+
+    def test_search_matches_later_words(self):
+        for kind, gazetteer in self.gazetteers().items():
+            with self.subTest(kind):
+                self.assertEqual(self.names(gazetteer.search("heights")), ["Chicago Heights, IL"])
+                self.assertEqual(self.names(gazetteer.search("francisco")), ["San Francisco, CA"])
+
+    def test_results_have_nominatim_shape(self):
+        result = load_gazetteer(self.csv_path).search("cicero")[0]
+        self.assertEqual(result, {
+            "place_id": "gazetteer:1710487", "display_name": "Cicero, IL", "lat": "41.845365", "lon": "-87.759412",
+        })
+
+    def test_reverse_finds_nearest_place(self):
+        for kind, gazetteer in self.gazetteers().items():
+            with self.subTest(kind):
+                self.assertEqual(gazetteer.reverse(41.88, -87.63)["display_name"], "Chicago, IL")
+                self.assertEqual(gazetteer.reverse(41.85, -87.75)["display_name"], "Cicero, IL")
+                self.assertIsNone(gazetteer.reverse(45.0, -100.0))
+
+    def test_reverse_matches_brute_force(self):
+        rng = random.Random(20)
+        places = [
+            {"place_id": str(i), "name": f"Place {i}", "state": "IL", "population": 0,
+             "lat": rng.uniform(40, 43), "lon": rng.uniform(-90, -86)}
+            for i in range(400)
+        ]
+        for place in places:
+            place["display_name"] = place["name"]
+        memory = MemoryGazetteer(places)
+        build_sqlite_gazetteer(places, self.sqlite_path)
+        sqlite = SqliteGazetteer(self.sqlite_path)
+
+        for _ in range(200):
+            lat, lon = rng.uniform(39.8, 43.2), rng.uniform(-90.2, -85.8)
+            nearest = min(places, key=lambda p: haversine_km(lat, lon, p["lat"], p["lon"]))
+            expected = nearest["name"] if haversine_km(lat, lon, nearest["lat"], nearest["lon"]) <= 25 else None
+            for gazetteer in (memory, sqlite):
+                found = gazetteer.reverse(lat, lon)
+                self.assertEqual(found and found["display_name"], expected)
+
+    def test_reverse_looks_past_narrower_cells_toward_the_pole(self):
+        # A, in the point's own cell, is a hair further than one cell width at the
+        # point's latitude; B, two cells east and one row north, is a hair closer
+        places = [
+            {"place_id": "a", "name": "A", "state": "AK", "population": 0, "lat": 70.065825, "lon": -150.0001},
+            {"place_id": "b", "name": "B", "state": "AK", "population": 0, "lat": 70.1001, "lon": -149.9},
+        ]
+        for place in places:
+            place["display_name"] = place["name"]
+        build_sqlite_gazetteer(places, self.sqlite_path)
+
+        for gazetteer in (MemoryGazetteer(places), SqliteGazetteer(self.sqlite_path)):
+            self.assertEqual(gazetteer.reverse(70.0999, -150.0001)["display_name"], "B")
+
+    def test_needs_name_and_coordinates(self):
+        bad = self.csv_path.with_name("bad.csv")
+        bad.write_text("city,latitude\nChicago,41.8\n")
+        with self.assertRaises(ValueError):
+            list(read_places(bad))
+
+
+@patch.object(geocode.nominatim_client.session, "request")
+class GeocoderModeTests(GazetteerDirMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        geocode.geocode_cache.clear_local()
+
+    def test_local_mode_never_calls_nominatim(self, upstream):
+        with override_settings(GEOCODER_MODE="local", GAZETTEER_PATH=str(self.csv_path)):
+            self.assertEqual(search_places("Chica")[0]["display_name"], "Chicago, IL")
+            self.assertEqual(search_places("nowhere"), [])
+        upstream.assert_not_called()
+
+    def test_local_then_nominatim_falls_back_on_no_match(self, upstream):
+        upstream.return_value = mock_response([
+            {"place_id": 9, "display_name": "Nowhere, Oklahoma", "lat": "35.0", "lon": "-98.0"},
+        ])
+        with override_settings(GEOCODER_MODE="local_then_nominatim", GAZETTEER_PATH=str(self.sqlite_path)):
+            self.assertEqual(search_places("chicago")[0]["place_id"], "gazetteer:1714000")
+            upstream.assert_not_called()
+            self.assertEqual(search_places("nowhere")[0]["place_id"], "9")
+        upstream.assert_called_once()
+
+    def test_local_modes_need_a_gazetteer(self, upstream):
+        with override_settings(GEOCODER_MODE="local", GAZETTEER_PATH=""), self.assertRaises(ImproperlyConfigured):
+            search_places("chicago")
+        with override_settings(GEOCODER_MODE="offline"), self.assertRaises(ImproperlyConfigured):
+            search_places("chicago")
+
+
+@patch.object(geocode.nominatim_client.session, "request")
+class GeocodeReverseViewTests(GazetteerDirMixin, APITestCase):
+
+    def test_local_reverse(self, upstream):
+        url = reverse("geocode-reverse")
+        with override_settings(GEOCODER_MODE="local", GAZETTEER_PATH=str(self.csv_path)):
+            found = self.client.get(url, {"lat": "41.88", "lon": "-87.63"})
+            missing = self.client.get(url, {"lat": "45.0", "lon": "-100.0"})
+            invalid = self.client.get(url, {"lat": "north", "lon": "-100.0"})
+
+        self.assertEqual(found.json(), {"display_name": "Chicago, IL", "lat": "41.837551", "lon": "-87.681844"})
+        self.assertEqual(missing.status_code, 404)
+        self.assertEqual(invalid.status_code, 400)
+        upstream.assert_not_called()
+
+    def test_local_then_nominatim_reverse_falls_back(self, upstream):
+        upstream.return_value = mock_response({"display_name": "Somewhere, SD", "lat": "45.0", "lon": "-100.0"})
+        with override_settings(GEOCODER_MODE="local_then_nominatim", GAZETTEER_PATH=str(self.csv_path)):
+            res = self.client.get(reverse("geocode-reverse"), {"lat": "45.0", "lon": "-100.0"})
+
+        self.assertEqual(res.json()["display_name"], "Somewhere, SD")
+        upstream.assert_called_once()
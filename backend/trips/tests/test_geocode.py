@@ -0,0 +1,162 @@
+"""
+Tests for the shared geocode result cache and its prefix index.
+"""
+from unittest.mock import patch
+
+import requests
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from trips.services import geocode
+from trips.services.geocode import matches_prefix, normalize_query, search_places
+from trips.tests.helpers import mock_response
+from trips.utils import metrics
+
+CHICAGO = [
+    {"place_id": 1, "display_name": "Chicago, Cook County, Illinois, United States",
+     "lat": "41.88", "lon": "-87.63", "osm_type": "relation"},
+    {"place_id": 2, "display_name": "Chicago Heights, Cook County, Illinois, United States",
+     "lat": "41.51", "lon": "-87.64"},
+    {"place_id": 3, "display_name": "West Chicago, DuPage County, Illinois, United States",
+     "lat": "41.88", "lon": "-88.20"},
+]
+
+
+def nominatim_places(places):
+    return [{key: str(value) for key, value in place.items() if key in geocode.RESULT_FIELDS} for place in places]
+
+
+class GeocodeCacheMixin:
+
+    def setUp(self):
+        super().setUp()
+        geocode.geocode_cache.clear_local()
+        caches["shared"].clear()
+        metrics.reset()
+        geocode.nominatim_client.breaker.record_success()
+        # Keep Nominatim's 1 request/s limit from slowing the suite down
+        rate = patch.object(geocode.nominatim_bucket, "rate", 1000.0)
+        rate.start()
+        self.addCleanup(rate.stop)
+        patcher = patch.object(geocode.nominatim_client.session, "request")
+        self.upstream = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.upstream.return_value = mock_response(CHICAGO)
+
+
+class QueryMatchingTests(SimpleTestCase):
+
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query("  Chicago ,IL  "), "chicago, il")
+        self.assertEqual(normalize_query("CHICAGO   il"), "chicago il")
+
+    def test_matches_prefix(self):
+        name = "Chicago Heights, Cook County, Illinois, United States"
+        self.assertTrue(matches_prefix("chica", name))
+        self.assertTrue(matches_prefix("chicago hei", name))
+        self.assertTrue(matches_prefix("cook cou", name))
+        self.assertFalse(matches_prefix("chicag denv", name))
+        self.assertFalse(matches_prefix("chic heights", name))
+
+
+class SearchPlacesTests(GeocodeCacheMixin, TestCase):
+
+    def test_repeat_query_is_served_from_cache(self):
+        first = search_places("Chicago")
+        second = search_places("  chicago ")
+
+        self.upstream.assert_called_once()
+        self.assertEqual(first, nominatim_places(CHICAGO))
+        self.assertEqual(second, first)
+        self.assertEqual(geocode.geocode_cache.stats()["local_hits"], 1)
+
+    def test_shared_tier_serves_other_workers(self):
+        search_places("chicago")
+        geocode.geocode_cache.clear_local()
+
+        search_places("chicago")
+
+        self.upstream.assert_called_once()
+        self.assertEqual(geocode.geocode_cache.stats()["shared_hits"], 1)
+
+    def test_prefix_is_answered_from_longer_cached_query(self):
+        search_places("chicago heights")
+
+        results = search_places("chicago hei")
+
+        self.upstream.assert_called_once()
+        self.assertEqual([result["place_id"] for result in results], ["2"])
+        self.assertEqual(len(search_places("chica")), 3)
+        stats = geocode.geocode_cache.stats()
+        self.assertEqual(stats["prefix_hits"], 2)
+        self.assertEqual(stats["misses"], 1)
+        self.assertAlmostEqual(stats["hit_ratio"], 2 / 3)
+
+    def test_prefix_without_matching_results_goes_upstream(self):
+        search_places("chicago")
+        self.upstream.return_value = mock_response([])
+
+        self.assertEqual(search_places("chicago zzz"), [])
+        self.assertEqual(self.upstream.call_count, 3)  # the query, then its first-word fallback
+
+    def test_empty_results_are_cached(self):
+        self.upstream.return_value = mock_response([])
+
+        search_places("nowhereville")
+        search_places("nowhereville")
+
+        self.upstream.assert_called_once()
+
+    def test_upstream_errors_are_not_cached(self):
+        self.upstream.side_effect = requests.ConnectionError()
+        with patch("trips.services.http_client.time.sleep"), self.assertRaises(requests.ConnectionError):
+            search_places("chicago")
+
+        self.upstream.side_effect = None
+        self.assertEqual(len(search_places("chicago")), 3)
+        self.assertEqual(metrics.snapshot()["histograms"]["geocode.upstream.latency"]["count"], 2)
+
+    def test_error_answers_are_not_cached_as_empty(self):
+        self.upstream.return_value = mock_response([], status_code=429)
+        with patch("trips.services.http_client.time.sleep"), self.assertRaises(requests.HTTPError):
+            search_places("chicago")
+        failed_calls = self.upstream.call_count
+
+        self.upstream.return_value = mock_response(CHICAGO)
+        self.assertEqual(len(search_places("chicago")), 3)
+        self.assertEqual(self.upstream.call_count, failed_calls + 1)
+
+    def test_short_queries_skip_lookup(self):
+        self.assertEqual(search_places("ch"), [])
+        self.upstream.assert_not_called()
+
+
+class GeocodeSearchViewTests(GeocodeCacheMixin, APITestCase):
+
+    def test_results_are_shared_across_clients(self):
+        url = reverse("geocode-search")
+
+        first = self.client.get(url, {"q": "Chicago"}, REMOTE_ADDR="10.0.0.1")
+        second = self.client.get(url, {"q": "chicago"}, REMOTE_ADDR="10.0.0.2")
+        repeat = self.client.get(url, {"q": "chicago"}, REMOTE_ADDR="10.0.0.2")
+
+        self.upstream.assert_called_once()
+        self.assertEqual(len(first.json()), 3)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(repeat.json(), first.json())
+
+    def test_upstream_unavailable_is_503(self):
+        self.upstream.side_effect = requests.ConnectionError()
+        with patch("trips.services.http_client.time.sleep"):
+            res = self.client.get(reverse("geocode-search"), {"q": "chicago"})
+
+        self.assertEqual(res.status_code, 503)
+
+    def test_upstream_error_status_is_503(self):
+        self.upstream.return_value = mock_response([], status_code=502)
+        with patch("trips.services.http_client.time.sleep"):
+            res = self.client.get(reverse("geocode-search"), {"q": "chicago"})
+
+        self.assertEqual(res.status_code, 503)
@@ -0,0 +1,165 @@
+"""
+Tests for the integer (seconds / meters) HOS chunker.
+"""
+import random
+from decimal import Decimal
+
+from django.test import SimpleTestCase
+
+from trips.services.hos import (
+    chunk_legs_by_hos,
+    FUEL_STOP_INTERVAL_METERS,
+    HOS_BREAK_REQUIRED_AFTER_SECONDS,
+    HOS_MAX_DRIVE_SECONDS,
+    meters_to_miles,
+    miles_to_meters,
+)
+from trips.services.route_geometry import RouteGeometry
+from trips.tests.reference_hos import decimal_chunk_legs_by_hos
+
+
+def make_route(segment_miles, mph=55.0):
+    """Straight synthetic route with one vertex per mile."""
+    total = sum(segment_miles)
+    points = int(total) + 1
+    miles = [total * i / (points - 1) for i in range(points)]
+    geometry = RouteGeometry(miles, [-90 + m / 100 for m in miles], [40.0] * points)
+    segments = [
+        {"distance": d, "duration": d / mph * 3600, "steps": []}
+        for d in segment_miles
+    ]
+    return segments, geometry
+
+
+def plan(segment_miles, cycle_hours=0, mph=55.0, chunker=chunk_legs_by_hos):
+    segments, geometry = make_route(segment_miles, mph)
+    return chunker(
+        segments=segments,
+        coordinates=[[0, 0], [0, 0], [0, 0]],
+        start_cycle_hours=cycle_hours,
+        route_geometry=geometry,
+        total_route_distance=sum(segment_miles),
+    )
+
+
+class ChunkLegsByHosTests(SimpleTestCase):
+
+    def test_short_trip_has_pickup_and_dropoff(self):
+        legs = plan([20.0, 100.0])
+        notes = [leg["notes"] for leg in legs]
+        self.assertEqual(notes, ["", "1-hour stop for pickup", "", "1-hour stop for dropoff"])
+
+    def test_counters_are_integers(self):
+        for leg in plan([300.0, 1500.0], cycle_hours="12.50"):
+            self.assertIsInstance(leg["distance_meters"], int)
+            self.assertIsInstance(leg["duration_seconds"], int)
+
+    def test_drive_chunks_sum_to_segments(self):
+        segment_miles = [412.3, 2087.9]
+        legs = plan(segment_miles)
+        for i, miles in enumerate(segment_miles):
+            drive = [leg for leg in legs if leg.get("segment_index") == i]
+            self.assertEqual(sum(leg["distance_meters"] for leg in drive), miles_to_meters(miles))
+            self.assertEqual(
+                sum(leg["duration_seconds"] for leg in drive),
+                round(miles / 55.0 * 3600),
+            )
+
+    def test_limits_respected(self):
+        drive_since_break = 0
+        drive_since_rest = 0
+        meters_since_fuel = 0
+        for leg in plan([250.0, 2600.0], cycle_hours=40):
+            if leg["is_rest_stop"]:
+                drive_since_break = drive_since_rest = 0
+                if "34-hour" in leg["notes"]:
+                    meters_since_fuel = 0
+            elif leg["is_fuel_stop"]:
+                meters_since_fuel = 0
+            elif "30-minute" in leg["notes"]:
+                drive_since_break = 0
+            elif leg["distance_meters"]:
+                drive_since_break += leg["duration_seconds"]
+                drive_since_rest += leg["duration_seconds"]
+                meters_since_fuel += leg["distance_meters"]
+            self.assertLessEqual(drive_since_break, HOS_BREAK_REQUIRED_AFTER_SECONDS)
+            self.assertLessEqual(drive_since_rest, HOS_MAX_DRIVE_SECONDS)
+            self.assertLessEqual(meters_since_fuel, FUEL_STOP_INTERVAL_METERS)
+
+    def test_cycle_reset_inserted_when_cycle_exhausted(self):
+        legs = plan([50.0, 500.0], cycle_hours=69)
+        self.assertTrue(any("34-hour" in leg["notes"] for leg in legs))
+
+    def test_reset_replaces_a_break_due_at_the_same_time(self):
+        # 8 hours of driving end the cycle exactly where the break falls due
+        legs = plan([800.0], cycle_hours=62)
+        self.assertEqual([leg["start_label"] for leg in legs[:3]], [None, "Cycle Reset", None])
+        self.assertEqual(legs[0]["duration_seconds"], HOS_BREAK_REQUIRED_AFTER_SECONDS)
+
+    def test_steps_assigned_to_containing_chunk_only(self):
+        segments, geometry = make_route([700.0])
+        last = len(geometry) - 1
+        quarters = [0, last // 4, last // 2, 3 * last // 4, last]
+        segments[0]["steps"] = [
+            {"distance": 175.0, "duration": 1, "way_points": [a, b]}
+            for a, b in zip(quarters, quarters[1:])
+        ]
+        legs = chunk_legs_by_hos(
+            segments=segments,
+            coordinates=[[0, 0], [0, 0]],
+            start_cycle_hours=0,
+            route_geometry=geometry,
+            total_route_distance=700.0,
+        )
+        drive = [leg for leg in legs if leg.get("segment_index") == 0]
+        self.assertGreater(len(drive), 1)
+        assigned = [step["way_points"] for leg in drive for step in leg["steps"]]
+        self.assertEqual(assigned, [step["way_points"] for step in segments[0]["steps"]])
+
+        progress = 0
+        for leg in drive:
+            end = progress + leg["distance_meters"]
+            for step in leg["steps"]:
+                start_miles = geometry.miles[step["way_points"][0]]
+                self.assertGreaterEqual(miles_to_meters(start_miles), progress - 1)
+                self.assertLess(miles_to_meters(start_miles), end + 1)
+            progress = end
+
+
+def comparable_decimal_legs(legs):
+    """
+    The Decimal chunker's legs, minus what the integer one deliberately drops:
+    the near-zero drive legs its rounding drift left before a limit, and a
+    30-minute break immediately followed by a 34-hour reset (whether the break
+    came out at all depended on that drift).
+    """
+    legs = [leg for leg in legs if leg["start_label"] or leg["distance_miles"] > Decimal("1e-6")]
+    return [
+        leg for leg, following in zip(legs, legs[1:] + [{}])
+        if not (leg["start_label"] == "30-min Break" and following.get("start_label") == "Cycle Reset")
+    ]
+
+
+class DecimalChunkerParityTests(SimpleTestCase):
+
+    def test_legs_match_the_decimal_chunker(self):
+        rng = random.Random(2)
+        for _ in range(300):
+            segment_miles = [round(rng.uniform(5, 3000), 3) for _ in range(rng.choice((1, 2)))]
+            mph = rng.uniform(30, 70)
+            cycle_hours = round(rng.uniform(0, 69.9), 1)
+            with self.subTest(segment_miles=segment_miles, mph=mph, cycle_hours=cycle_hours):
+                legs = plan(segment_miles, cycle_hours, mph)
+                expected = comparable_decimal_legs(
+                    plan(segment_miles, cycle_hours, mph, chunker=decimal_chunk_legs_by_hos)
+                )
+
+                self.assertEqual([leg["start_label"] for leg in legs], [leg["start_label"] for leg in expected])
+                for leg, old in zip(legs, expected):
+                    self.assertEqual(leg.get("segment_index"), old.get("segment_index"))
+                    # Chunk ends are rounded to whole seconds, so a chunk may start or end
+                    # up to a second off: 1.5 s of time, and the distance driven in it
+                    self.assertAlmostEqual(leg["duration_seconds"], float(old["duration_hours"]) * 3600, delta=1.5)
+                    self.assertAlmostEqual(
+                        meters_to_miles(leg["distance_meters"]), float(old["distance_miles"]), delta=mph * 1.5 / 3600,
+                    )
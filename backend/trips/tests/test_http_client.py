@@ -0,0 +1,105 @@
+"""
+Tests for the shared upstream HTTP client (retries, timeouts, breaker).
+"""
+from unittest.mock import Mock, patch
+
+import requests
+from django.test import SimpleTestCase
+
+from trips.services.http_client import UpstreamClient, UpstreamUnavailable, CircuitBreaker
+from trips.utils import metrics
+from trips.tests.helpers import mock_response
+
+
+@patch("trips.services.http_client.time.sleep")
+class UpstreamClientTests(SimpleTestCase):
+
+    def setUp(self):
+        metrics.reset()
+        self.client = UpstreamClient(
+            "test", connect_timeout=1, read_timeout=2, max_retries=2,
+            failure_threshold=3, reset_timeout=60,
+        )
+
+    def test_timeouts_applied(self, patched_sleep):
+        with patch.object(self.client.session, "request", return_value=mock_response({})) as req:
+            self.client.get("https://upstream.test/ping")
+        self.assertEqual(req.call_args.kwargs["timeout"], (1, 2))
+
+    def test_retries_connection_errors_then_succeeds(self, patched_sleep):
+        side_effect = [requests.ConnectionError(), mock_response({"ok": True})]
+        with patch.object(self.client.session, "request", side_effect=side_effect) as req:
+            response = self.client.get("https://upstream.test/ping")
+        self.assertEqual(response.json(), {"ok": True})
+        self.assertEqual(req.call_count, 2)
+        self.assertEqual(patched_sleep.call_count, 1)
+        self.assertEqual(metrics.get_counter("http.test.retries"), 1)
+
+    def test_retries_are_bounded(self, patched_sleep):
+        with patch.object(self.client.session, "request", side_effect=requests.Timeout()) as req:
+            with self.assertRaises(requests.Timeout):
+                self.client.get("https://upstream.test/ping")
+        self.assertEqual(req.call_count, 3)
+
+    def test_gateway_status_retried_and_returned(self, patched_sleep):
+        with patch.object(self.client.session, "request", return_value=mock_response({}, 503)) as req:
+            response = self.client.get("https://upstream.test/ping")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(req.call_count, 3)
+
+    def test_client_errors_not_retried(self, patched_sleep):
+        with patch.object(self.client.session, "request", return_value=mock_response({}, 400)) as req:
+            self.client.get("https://upstream.test/ping")
+        req.assert_called_once()
+
+    def test_breaker_opens_and_short_circuits(self, patched_sleep):
+        with patch.object(self.client.session, "request", side_effect=requests.ConnectionError()) as req:
+            with self.assertRaises(requests.ConnectionError):
+                self.client.get("https://upstream.test/ping")
+            self.assertEqual(self.client.breaker.state, CircuitBreaker.OPEN)
+            with self.assertRaises(UpstreamUnavailable):
+                self.client.get("https://upstream.test/ping")
+        self.assertEqual(req.call_count, 3)
+        self.assertEqual(metrics.get_counter("http.test.short_circuited"), 1)
+
+    def test_retries_wait_for_a_rate_limit_slot(self, patched_sleep):
+        self.client.rate_limit = Mock()
+        with patch.object(self.client.session, "request", return_value=mock_response({}, 429)) as req:
+            self.client.get("https://upstream.test/ping")
+        self.assertEqual(req.call_count, 3)
+        self.assertEqual(self.client.rate_limit.acquire.call_count, 2)
+
+    def test_other_request_errors_end_a_half_open_trial(self, patched_sleep):
+        client = UpstreamClient("test", max_retries=2, failure_threshold=1, reset_timeout=0)
+        client.breaker.record_failure()
+        with patch.object(client.session, "request", side_effect=requests.exceptions.ChunkedEncodingError()) as req:
+            with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+                client.get("https://upstream.test/ping")
+        req.assert_called_once()
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+        self.assertTrue(client.breaker.allow())
+
+    def test_interrupted_trial_lets_the_next_call_try(self, patched_sleep):
+        client = UpstreamClient("test", failure_threshold=1, reset_timeout=0)
+        client.breaker.record_failure()
+        with patch.object(client.session, "request", side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                client.get("https://upstream.test/ping")
+        self.assertTrue(client.breaker.allow())
+
+    def test_latency_histogram_recorded(self, patched_sleep):
+        with patch.object(self.client.session, "request", return_value=mock_response({})):
+            self.client.get("https://upstream.test/ping")
+        hist = metrics.snapshot()["histograms"]["http.test.latency"]
+        self.assertEqual(hist["count"], 1)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def test_half_open_allows_single_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
@@ -0,0 +1,153 @@
+"""
+Tests for the cached daily log PDF export and the download_logs endpoint.
+"""
+import tempfile
+from io import BytesIO
+from pathlib import Path
+from unittest.mock import patch
+
+from django.test import override_settings
+from django.urls import reverse
+from PyPDF2 import PdfReader
+from rest_framework.test import APITestCase
+
+from trips.models import DailyLog
+from trips.services import log_pdf
+from trips.services.log_artifacts import ensure_trip_svgs
+from trips.services.log_pdf import build_logs_pdf
+from trips.services.svg_log_sheet import inject_duty_periods_into_svg
+from trips.tests.helpers import add_daily_logs, create_trip, fake_svg2pdf
+
+
+@patch.dict(log_pdf._backgrounds, clear=True)
+@patch("trips.services.log_pdf.cairosvg.svg2pdf", side_effect=fake_svg2pdf)
+class DownloadLogsTests(APITestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=tmp.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.trip = create_trip()
+        self.rows = add_daily_logs(self.trip, 3)
+        ensure_trip_svgs(self.trip)
+        self.url = reverse("trip-download-logs", args=[self.trip.id])
+
+    def download(self, **headers):
+        res = self.client.get(self.url, headers=headers)
+        if res.status_code == 200:
+            res.pdf = b"".join(res.streaming_content)
+        return res
+
+    def test_streams_merged_pdf_with_etag(self, svg2pdf):
+        res = self.download()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res["Content-Type"], "application/pdf")
+        self.assertIn(f'DailyLogs-{self.trip.id}.pdf', res["Content-Disposition"])
+        self.assertTrue(res["ETag"].startswith('"'))
+        self.assertEqual(len(PdfReader(BytesIO(res.pdf)).pages), 3)
+        # The template background once, then one overlay per day
+        self.assertEqual(svg2pdf.call_count, 4)
+
+    def test_second_download_reuses_cached_pdf(self, svg2pdf):
+        first = self.download()
+        second = self.download()
+
+        self.assertEqual(svg2pdf.call_count, 4)
+        self.assertEqual(first["ETag"], second["ETag"])
+        self.assertEqual(first.pdf, second.pdf)
+
+    def test_if_none_match_returns_304(self, svg2pdf):
+        etag = self.download()["ETag"]
+
+        res = self.client.get(self.url, headers={"If-None-Match": etag})
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res["ETag"], etag)
+
+    def test_changed_day_reconverts_only_that_page(self, svg2pdf):
+        first = self.download()
+        DailyLog.objects.filter(pk=self.rows[1].pk).update(total_miles=999.0)
+        ensure_trip_svgs(self.trip)
+
+        second = self.download(**{"If-None-Match": first["ETag"]})
+
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second["ETag"], first["ETag"])
+        self.assertEqual(svg2pdf.call_count, 5)
+
+    def test_switching_the_conversion_mode_reconverts_every_page(self, svg2pdf):
+        first = self.download()
+        with override_settings(LOG_PDF_OVERLAY=False):
+            second = self.download(**{"If-None-Match": first["ETag"]})
+        third = self.download(**{"If-None-Match": first["ETag"]})
+
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second["ETag"], first["ETag"])
+        # Three whole pages; the overlay pages are still stored for the switch back
+        self.assertEqual([call.kwargs.get("url") is not None for call in svg2pdf.call_args_list[4:]], [True] * 3)
+        self.assertEqual(third.status_code, 304)
+
+    def test_not_generated_is_404(self, svg2pdf):
+        DailyLog.objects.filter(trip=self.trip).update(svg_key="")
+
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+@patch.dict(log_pdf._backgrounds, clear=True)
+@patch("trips.services.log_pdf.cairosvg.svg2pdf", side_effect=fake_svg2pdf)
+class OverlayPdfTests(APITestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=tmp.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.media = Path(tmp.name)
+
+    def render_trip(self, trip_id, days):
+        logs = [
+            {
+                "date": f"2026-03-{day:02d}", "day": day, "month": "March", "year": 2026,
+                "total_miles": 100 + day,
+                "duty_periods": [{"status": "driving", "start": "06:00", "end": f"{6 + day:02d}:00"}],
+            }
+            for day in range(1, days + 1)
+        ]
+        inject_duty_periods_into_svg(logs, trip_id, output_dir=self.media, workers=1)
+        return sorted((self.media / str(trip_id) / "logs").glob("output-*.svg"))
+
+    def test_template_pages_convert_only_their_overlay(self, svg2pdf):
+        svg_files = self.render_trip(1, 4)
+
+        pdf_path, _ = build_logs_pdf(svg_files)
+
+        self.assertEqual(len(PdfReader(pdf_path).pages), 4)
+        sources = [call.kwargs.get("bytestring") for call in svg2pdf.call_args_list]
+        self.assertTrue(all(source is not None for source in sources))
+        # One full-size background plus one small overlay per day
+        sources.sort(key=len, reverse=True)
+        self.assertGreater(len(sources[0]), 100_000)
+        self.assertEqual(len(sources), 5)
+        for overlay in sources[1:]:
+            self.assertLess(len(overlay), 2_000)
+            self.assertTrue(overlay.startswith(b'<svg xmlns="http://www.w3.org/2000/svg" viewBox='))
+
+    def test_background_is_converted_once_across_trips(self, svg2pdf):
+        build_logs_pdf(self.render_trip(1, 2))
+        log_pdf._backgrounds.clear()  # a fresh process still finds it on disk
+        build_logs_pdf(self.render_trip(2, 3))
+
+        full_size = [call for call in svg2pdf.call_args_list if len(call.kwargs["bytestring"]) > 100_000]
+        self.assertEqual(len(full_size), 1)
+
+    @override_settings(LOG_PDF_OVERLAY=False)
+    def test_overlay_can_be_disabled(self, svg2pdf):
+        build_logs_pdf(self.render_trip(1, 2))
+
+        self.assertEqual([call.kwargs.get("url") is not None for call in svg2pdf.call_args_list], [True, True])
@@ -0,0 +1,74 @@
+"""
+Tests for the two-tier ORS route cache.
+"""
+from unittest.mock import patch
+
+from django.core.cache import caches
+from django.test import TestCase
+
+from trips.services import ors
+from trips.utils import metrics
+from trips.tests.helpers import ors_directions_payload, mock_response
+
+COORDS = [[-87.63, 41.88], [-86.16, 39.77], [-96.80, 32.78]]
+
+
+@patch.object(ors.ors_client.session, "request")
+class RouteCacheTests(TestCase):
+
+    def setUp(self):
+        ors.route_cache.clear_local()
+        caches["shared"].clear()
+        metrics.reset()
+        ors.ors_client.breaker.record_success()
+
+    def test_second_call_is_a_local_hit(self, patched_post):
+        patched_post.return_value = mock_response(ors_directions_payload())
+
+        first = ors.get_route(COORDS)
+        second = ors.get_route(COORDS)
+
+        patched_post.assert_called_once()
+        self.assertEqual(first["distance_miles"], second["distance_miles"])
+        self.assertEqual(list(first["geometry"].miles), list(second["geometry"].miles))
+        stats = ors.route_cache.stats()
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["local_hits"], 1)
+
+    def test_shared_tier_serves_other_workers(self, patched_post):
+        patched_post.return_value = mock_response(ors_directions_payload())
+        ors.get_route(COORDS)
+
+        # Simulate another worker with an empty in-process tier
+        ors.route_cache.clear_local()
+        ors.get_route(COORDS)
+
+        patched_post.assert_called_once()
+        self.assertEqual(ors.route_cache.stats()["shared_hits"], 1)
+
+    def test_key_quantizes_waypoints(self, patched_post):
+        patched_post.return_value = mock_response(ors_directions_payload())
+        ors.get_route(COORDS)
+        jittered = [[lon + 0.00001, lat - 0.00001] for lon, lat in COORDS]
+        ors.get_route(jittered)
+        patched_post.assert_called_once()
+
+    def test_invalidate_forces_refetch(self, patched_post):
+        patched_post.return_value = mock_response(ors_directions_payload())
+        ors.get_route(COORDS)
+        ors.invalidate_route(COORDS)
+        ors.get_route(COORDS)
+        self.assertEqual(patched_post.call_count, 2)
+
+    def test_hits_cannot_mutate_cached_route(self, patched_post):
+        patched_post.return_value = mock_response(ors_directions_payload())
+        ors.get_route(COORDS)["segments"].clear()
+        self.assertTrue(ors.get_route(COORDS)["segments"])
+
+    def test_errors_are_not_cached(self, patched_post):
+        patched_post.return_value = mock_response({}, status_code=500)
+        with self.assertRaises(Exception):
+            ors.get_route(COORDS)
+        patched_post.return_value = mock_response(ors_directions_payload())
+        ors.get_route(COORDS)
+        self.assertEqual(patched_post.call_count, 2)
@@ -0,0 +1,90 @@
+"""
+Tests for plan_trip persistence.
+"""
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from trips.models import TripLeg, TripSegmentStep
+from trips.services.plan import plan_trip
+from trips.tests.helpers import create_trip, parsed_route
+
+SHORT_TRIP = (120.0, 480.0)
+LONG_TRIP = (300.0, 1700.0)
+
+# UPDATE trip, SELECT old legs, INSERT legs, INSERT steps, DELETE daily
+# logs, INSERT daily logs, plus the SAVEPOINT / RELEASE pair the atomic
+# block issues inside a test transaction.
+PLAN_QUERIES = 8
+# Replanning also deletes the old legs' steps and the legs themselves (in
+# batches of 100 legs; these trips have fewer)
+REPLAN_QUERIES = PLAN_QUERIES + 2
+
+
+@patch("trips.services.plan.get_route")
+class PlanTripPersistenceTests(TestCase):
+
+    def test_query_count_independent_of_trip_length(self, patched_route):
+        for miles in (SHORT_TRIP, LONG_TRIP):
+            patched_route.return_value = parsed_route(miles)
+            trip = create_trip()
+            with self.assertNumQueries(PLAN_QUERIES):
+                plan_trip(trip)
+
+        # Sanity check that the long trip really produced many more legs
+        self.assertGreater(trip.legs.count(), 15)
+
+    def test_replanning_replaces_previous_legs(self, patched_route):
+        patched_route.return_value = parsed_route(LONG_TRIP)
+        trip = create_trip()
+        plan_trip(trip)
+        first_count = trip.legs.count()
+
+        patched_route.return_value = parsed_route(SHORT_TRIP)
+        with self.assertNumQueries(REPLAN_QUERIES):
+            plan_trip(trip)
+
+        self.assertLess(trip.legs.count(), first_count)
+        orders = list(trip.legs.values_list("leg_order", flat=True))
+        self.assertEqual(orders, list(range(len(orders))))
+
+    def test_failure_leaves_previous_plan_intact(self, patched_route):
+        patched_route.return_value = parsed_route(SHORT_TRIP)
+        trip = create_trip()
+        plan_trip(trip)
+        before = list(trip.legs.values_list("id", flat=True))
+
+        patched_route.return_value = parsed_route(LONG_TRIP)
+        with patch.object(TripLeg.objects, "bulk_create", side_effect=RuntimeError("db down")):
+            with self.assertRaises(RuntimeError):
+                plan_trip(trip)
+
+        self.assertEqual(list(trip.legs.values_list("id", flat=True)), before)
+
+    def test_leg_times_are_contiguous(self, patched_route):
+        patched_route.return_value = parsed_route(LONG_TRIP)
+        trip = create_trip()
+        plan_trip(trip)
+        legs = list(trip.legs.all())
+        self.assertEqual(legs[0].departure_time, trip.departure_time)
+        for prev, leg in zip(legs, legs[1:]):
+            self.assertEqual(prev.arrival_time, leg.departure_time)
+
+    def test_each_step_is_stored_once_on_its_own_chunk(self, patched_route):
+        route = parsed_route(LONG_TRIP)
+        patched_route.return_value = route
+        trip = create_trip()
+        plan_trip(trip)
+
+        steps = TripSegmentStep.objects.filter(leg__trip=trip).select_related("leg")
+        ors_steps = [step for segment in route["segments"] for step in segment["steps"]]
+        self.assertEqual(steps.count(), len(ors_steps))
+        self.assertEqual(
+            sorted(step.waypoints for step in steps),
+            sorted(step["way_points"] for step in ors_steps),
+        )
+        for step in steps:
+            self.assertGreater(step.leg.distance_miles, 0)
+            # The step's first vertex is part of the leg it was assigned to
+            start = [step.start_lat, step.start_lon]
+            self.assertIn(start, step.leg.polyline_geometry)
@@ -0,0 +1,119 @@
+"""
+Tests for async trip planning (PlanJob queue + plan-status endpoint).
+"""
+import threading
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from trips.models import PlanJob, Trip
+from trips.services.plan_jobs import claim_next_job, run_job, worker_loop
+from trips.tests.helpers import TRIP_PAYLOAD, parsed_route
+
+
+@patch("trips.services.plan.get_route")
+class AsyncPlanningTests(APITestCase):
+
+    def setUp(self):
+        self.list_url = reverse("trip-list")
+
+    def status_url(self, trip_id):
+        return reverse("trip-plan-status", args=[trip_id])
+
+    def test_sync_mode_is_default(self, patched_route):
+        patched_route.return_value = parsed_route()
+        res = self.client.post(self.list_url, TRIP_PAYLOAD, format="json")
+        self.assertEqual(res.status_code, 201)
+        self.assertTrue(res.data["legs"])
+        self.assertFalse(PlanJob.objects.exists())
+
+    def test_async_post_queues_job(self, patched_route):
+        res = self.client.post(f"{self.list_url}?async=true", TRIP_PAYLOAD, format="json")
+
+        self.assertEqual(res.status_code, 202)
+        patched_route.assert_not_called()
+        job = PlanJob.objects.get(id=res.data["job_id"])
+        self.assertEqual(job.status, PlanJob.QUEUED)
+        self.assertTrue(res.data["status_url"].endswith(self.status_url(job.trip_id)))
+
+        status_res = self.client.get(self.status_url(job.trip_id))
+        self.assertEqual(status_res.data["status"], "queued")
+        self.assertIsNone(status_res.data["run_seconds"])
+
+    @override_settings(TRIP_PLAN_ASYNC=True)
+    def test_setting_enables_async_mode(self, patched_route):
+        res = self.client.post(self.list_url, TRIP_PAYLOAD, format="json")
+        self.assertEqual(res.status_code, 202)
+
+    def test_worker_runs_job_to_done(self, patched_route):
+        patched_route.return_value = parsed_route()
+        res = self.client.post(f"{self.list_url}?async=true", TRIP_PAYLOAD, format="json")
+
+        job = claim_next_job("test-worker")
+        self.assertEqual(job.id, res.data["job_id"])
+        self.assertEqual(job.status, PlanJob.RUNNING)
+        self.assertIsNone(claim_next_job("other-worker"))
+        run_job(job)
+
+        status_res = self.client.get(self.status_url(job.trip_id))
+        self.assertEqual(status_res.data["status"], "done")
+        self.assertIsNotNone(status_res.data["queue_seconds"])
+        self.assertIsNotNone(status_res.data["run_seconds"])
+        self.assertTrue(Trip.objects.get(id=job.trip_id).legs.exists())
+
+    def test_failed_job_reports_error(self, patched_route):
+        patched_route.side_effect = Exception("ORS Error: 500")
+        self.client.post(f"{self.list_url}?async=true", TRIP_PAYLOAD, format="json")
+
+        with self.assertLogs("trips.services.plan_jobs", level="ERROR"):
+            job = run_job(claim_next_job("test-worker"))
+
+        self.assertEqual(job.status, PlanJob.FAILED)
+        status_res = self.client.get(self.status_url(job.trip_id))
+        self.assertEqual(status_res.data["status"], "failed")
+        self.assertIn("ORS Error", status_res.data["error"])
+
+    def test_status_404_without_job(self, patched_route):
+        patched_route.return_value = parsed_route()
+        res = self.client.post(self.list_url, TRIP_PAYLOAD, format="json")
+        self.assertEqual(self.client.get(self.status_url(res.data["id"])).status_code, 404)
+
+    def test_reclaimed_job_discards_the_stale_run(self, patched_route):
+        patched_route.return_value = parsed_route()
+        self.client.post(f"{self.list_url}?async=true", TRIP_PAYLOAD, format="json")
+        stale = claim_next_job("slow-worker")
+        PlanJob.objects.filter(pk=stale.pk).update(started_at=timezone.now() - timedelta(hours=1))
+        current = claim_next_job("other-worker")
+        self.assertEqual(current.pk, stale.pk)
+
+        with self.assertLogs("trips.services.plan_jobs", level="WARNING"):
+            job = run_job(stale)
+
+        self.assertEqual((job.status, job.worker, job.attempts), (PlanJob.RUNNING, "other-worker", 2))
+        self.assertFalse(Trip.objects.get(id=job.trip_id).legs.exists())
+        self.assertEqual(run_job(current).status, PlanJob.DONE)
+        self.assertTrue(Trip.objects.get(id=job.trip_id).legs.exists())
+
+    def test_worker_survives_a_failed_claim(self, patched_route):
+        stop = threading.Event()
+        calls = []
+
+        def claim(worker_name):
+            calls.append(worker_name)
+            if len(calls) == 1:
+                raise RuntimeError("database is restarting")
+            stop.set()
+
+        with patch("trips.services.plan_jobs.claim_next_job", side_effect=claim), \
+                self.assertLogs("trips.services.plan_jobs", level="ERROR"):
+            # Its own thread, so closing the connection leaves the test transaction alone
+            worker = threading.Thread(target=worker_loop, args=("test-worker", stop, 0.01))
+            worker.start()
+            worker.join(timeout=5)
+
+        self.assertFalse(worker.is_alive())
+        self.assertEqual(calls, ["test-worker", "test-worker"])
@@ -0,0 +1,182 @@
+"""
+Tests for the cluster-wide Nominatim rate limit and the stale results served while it is saturated.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from trips.services import geocode
+from trips.services.rate_limit import RateLimited, TokenBucket
+from trips.tests.helpers import mock_response
+from trips.utils import metrics
+
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "default"},
+    "shared": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "rate-limit-tests"},
+}
+CHICAGO = [{"place_id": 1, "display_name": "Chicago, Illinois", "lat": "41.88", "lon": "-87.63"}]
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TokenBucketTests(SimpleTestCase):
+
+    def setUp(self):
+        metrics.reset()
+        caches["shared"].clear()
+
+    def test_calls_queue_one_interval_apart(self):
+        bucket = TokenBucket("test", rate=20.0, max_wait=2.0)
+        starts = []
+        lock = threading.Lock()
+
+        def call(_):
+            bucket.acquire()
+            with lock:
+                starts.append(time.time())
+
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            list(pool.map(call, range(6)))
+
+        starts.sort()
+        gaps = [later - earlier for earlier, later in zip(starts, starts[1:])]
+        self.assertGreaterEqual(min(gaps), 0.05 - 0.01)
+        self.assertEqual(metrics.get_counter("ratelimit.test.granted"), 6)
+        self.assertEqual(metrics.snapshot()["histograms"]["ratelimit.test.queue_depth"]["count"], 6)
+
+    def test_budget_is_shared_between_workers(self):
+        # Two buckets with one name stand in for two worker processes
+        first, second = TokenBucket("test", rate=1.0), TokenBucket("test", rate=1.0)
+
+        self.assertEqual(first.reserve(), 0.0)
+        delay = second.reserve()
+
+        self.assertGreater(delay, 0.0)
+        self.assertLessEqual(delay, 1.0)
+        self.assertEqual(first.stats()["reserved_ahead"], 1)
+
+    def test_no_slot_within_max_wait(self):
+        bucket = TokenBucket("test", rate=1.0, max_wait=5.0)
+        bucket.reserve()
+
+        with self.assertRaises(RateLimited) as raised:
+            bucket.reserve(max_wait=0)
+
+        self.assertEqual(raised.exception.retry_after, 1.0)
+        self.assertEqual(bucket.stats()["rejected"], 1)
+
+    def test_zero_rate_disables_the_limit(self):
+        bucket = TokenBucket("test", rate=0)
+        self.assertEqual([bucket.reserve(max_wait=0) for _ in range(3)], [0.0, 0.0, 0.0])
+
+
+class SaturatedBucketMixin:
+
+    def setUp(self):
+        super().setUp()
+        geocode.geocode_cache.clear_local()
+        caches["shared"].clear()
+        metrics.reset()
+        geocode.nominatim_client.breaker.record_success()
+        patcher = patch.object(geocode.nominatim_client.session, "request")
+        self.upstream = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.upstream.return_value = mock_response(CHICAGO)
+
+    def saturate(self):
+        """Leave no call slot free for the next second, as if other workers had taken them."""
+        patcher = patch.object(geocode.nominatim_bucket, "max_wait", 0.5)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        while True:
+            try:
+                geocode.nominatim_bucket.reserve(max_wait=1.0)
+            except RateLimited:
+                return
+
+    def expire(self, normalized, kind="results"):
+        """Drop the fresh entry, keeping the stale copy."""
+        geocode.geocode_cache.clear_local()
+        caches["shared"].delete(geocode.geocode_cache.make_key(kind, normalized))
+
+
+class StaleResultTests(SaturatedBucketMixin, TestCase):
+
+    def test_stale_results_are_served_while_saturated(self):
+        fresh = geocode.search_places("chicago")
+        self.expire("chicago")
+        self.saturate()
+
+        self.assertEqual(geocode.search_places("chicago"), fresh)
+        self.upstream.assert_called_once()
+        self.assertEqual(geocode.geocode_cache.stats()["stale_hits"], 1)
+
+    def test_stale_results_are_refreshed_when_a_slot_is_free(self):
+        geocode.search_places("chicago")
+        self.expire("chicago")
+        self.upstream.return_value = mock_response([{**CHICAGO[0], "display_name": "Chicago, IL"}])
+
+        with patch.object(geocode.nominatim_bucket, "rate", 1000.0):
+            results = geocode.search_places("chicago")
+
+        self.assertEqual(results[0]["display_name"], "Chicago, IL")
+        self.assertEqual(self.upstream.call_count, 2)
+
+
+    def test_stale_results_are_served_when_nominatim_fails(self):
+        fresh = geocode.search_places("chicago")
+        self.expire("chicago")
+        self.upstream.return_value = mock_response([], status_code=503)
+
+        with patch.object(geocode.nominatim_bucket, "rate", 1000.0), patch("trips.services.http_client.time.sleep"):
+            self.assertEqual(geocode.search_places("chicago"), fresh)
+        self.assertEqual(geocode.geocode_cache.stats()["stale_hits"], 1)
+
+
+class GeocodeRateLimitViewTests(SaturatedBucketMixin, APITestCase):
+
+    def test_search_is_503_with_retry_after_when_saturated(self):
+        self.saturate()
+
+        res = self.client.get(reverse("geocode-search"), {"q": "chicago"})
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res["Retry-After"], "1")
+        self.upstream.assert_not_called()
+
+    def test_repeated_reverse_is_served_from_cache(self):
+        self.upstream.return_value = mock_response({"display_name": "Chicago, Illinois", "lat": "41.88", "lon": "-87.63"})
+        url = reverse("geocode-reverse")
+
+        first = self.client.get(url, {"lat": "41.88", "lon": "-87.63"}, REMOTE_ADDR="10.0.0.1")
+        repeat = self.client.get(url, {"lat": "41.88", "lon": "-87.63"}, REMOTE_ADDR="10.0.0.1")
+        nearby = self.client.get(url, {"lat": "41.880004", "lon": "-87.63"}, REMOTE_ADDR="10.0.0.2")
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(repeat.json(), first.json())
+        self.assertEqual(nearby.json(), first.json())
+        self.upstream.assert_called_once()
+
+    def test_reverse_serves_stale_while_saturated(self):
+        self.upstream.return_value = mock_response({"display_name": "Chicago, Illinois", "lat": "41.88", "lon": "-87.63"})
+        url = reverse("geocode-reverse")
+        self.client.get(url, {"lat": "41.88", "lon": "-87.63"})
+        self.expire("41.8800,-87.6300", kind="reverse")
+        self.saturate()
+
+        res = self.client.get(url, {"lat": "41.88", "lon": "-87.63"})
+
+        self.assertEqual(res.json()["display_name"], "Chicago, Illinois")
+        self.upstream.assert_called_once()
+
+    def test_reverse_upstream_error_status_is_passed_on(self):
+        self.upstream.return_value = mock_response({}, status_code=400)
+
+        res = self.client.get(reverse("geocode-reverse"), {"lat": "41.88", "lon": "-87.63"})
+
+        self.assertEqual(res.status_code, 400)
@@ -0,0 +1,66 @@
+"""
+Tests for the indexed RouteGeometry used by the HOS chunker.
+"""
+from django.test import SimpleTestCase
+
+from trips.services.route_geometry import RouteGeometry
+
+
+def linear_position(cum_coords, target_miles):
+    """Reference linear-scan lookup (the pre-index behaviour)."""
+    if target_miles <= 0:
+        return (cum_coords[0][1], cum_coords[0][2])
+    if target_miles >= cum_coords[-1][0]:
+        return (cum_coords[-1][1], cum_coords[-1][2])
+    for (dist_a, lon_a, lat_a), (dist_b, lon_b, lat_b) in zip(cum_coords, cum_coords[1:]):
+        if dist_a <= target_miles <= dist_b:
+            ratio = (target_miles - dist_a) / (dist_b - dist_a)
+            return (lon_a + ratio * (lon_b - lon_a), lat_a + ratio * (lat_b - lat_a))
+
+
+def linear_slice(cum_coords, start_miles, end_miles):
+    return [(lat, lon) for cum_mi, lon, lat in cum_coords if start_miles <= cum_mi <= end_miles]
+
+
+class RouteGeometryTests(SimpleTestCase):
+
+    def setUp(self):
+        self.cum_coords = [
+            (i * 0.5, -90.0 + i * 0.01, 40.0 + i * 0.005) for i in range(200)
+        ]
+        self.geometry = RouteGeometry.from_cumulative(self.cum_coords)
+
+    def test_position_matches_linear_scan(self):
+        for target in [-1.0, 0.0, 0.25, 10.0, 10.3, 57.77, 99.5, 150.0]:
+            expected = linear_position(self.cum_coords, target)
+            actual = self.geometry.position_at(target)
+            self.assertAlmostEqual(actual[0], expected[0])
+            self.assertAlmostEqual(actual[1], expected[1])
+
+    def test_slice_matches_linear_scan(self):
+        for start, end in [(0.0, 5.0), (3.2, 7.9), (10.0, 10.0), (90.0, 500.0)]:
+            self.assertEqual(
+                self.geometry.slice(start, end),
+                linear_slice(self.cum_coords, start, end),
+            )
+
+    def test_cursor_moves_forward_only(self):
+        cursor = self.geometry.cursor()
+        progress = 0.0
+        while progress < 99.5:
+            chunk = 3.7
+            self.assertEqual(
+                cursor.slice(progress, progress + chunk),
+                linear_slice(self.cum_coords, progress, progress + chunk),
+            )
+            expected = linear_position(self.cum_coords, progress)
+            actual = cursor.position_at(progress)
+            self.assertAlmostEqual(actual[0], expected[0])
+            self.assertAlmostEqual(actual[1], expected[1])
+            progress += chunk
+        self.assertGreater(cursor.index, 0)
+
+    def test_cursor_slice_includes_duplicate_start_vertices(self):
+        geometry = RouteGeometry([0.0, 1.0, 1.0, 2.0], [0, 1, 2, 3], [0, 1, 2, 3])
+        cursor = geometry.cursor()
+        self.assertEqual(cursor.slice(1.0, 2.0), [(1, 1), (2, 2), (3, 3)])
@@ -0,0 +1,69 @@
+"""
+Tests for batched route ingestion (polyline decode + cumulative miles).
+"""
+import random
+
+import polyline
+from django.test import SimpleTestCase
+
+from trips.services import route_ingest
+
+
+def sample_points(n=500, seed=7):
+    rnd = random.Random(seed)
+    lat, lon = 41.88, -87.63
+    points = []
+    for _ in range(n):
+        lat += rnd.uniform(-0.02, 0.02)
+        lon += rnd.uniform(-0.02, 0.03)
+        points.append((round(lat, 5), round(lon, 5)))
+    return points
+
+
+class RouteIngestTests(SimpleTestCase):
+
+    def setUp(self):
+        self.points = sample_points()
+        self.encoded = polyline.encode(self.points, precision=5)
+
+    def assert_decoded(self, lons, lats):
+        self.assertEqual(len(lons), len(self.points))
+        for (lat, lon), got_lon, got_lat in zip(self.points, lons, lats):
+            self.assertAlmostEqual(got_lat, lat, places=6)
+            self.assertAlmostEqual(got_lon, lon, places=6)
+
+    def test_python_decoder_matches_polyline_library(self):
+        self.assert_decoded(*route_ingest._decode_polyline_python(self.encoded, 5))
+
+    def test_numpy_decoder_matches_polyline_library(self):
+        if route_ingest.np is None:
+            self.skipTest("numpy not installed")
+        self.assert_decoded(*route_ingest._decode_polyline_numpy(self.encoded, 5))
+
+    def test_cumulative_miles_matches_pairwise_haversine(self):
+        lons = [lon for _, lon in self.points]
+        lats = [lat for lat, _ in self.points]
+        expected = [0.0]
+        for i in range(1, len(lons)):
+            expected.append(expected[-1] + route_ingest.haversine_distance_miles(
+                lons[i - 1], lats[i - 1], lons[i], lats[i]))
+
+        python_cum = route_ingest._cumulative_miles_python(lons, lats)
+        for got, want in zip(python_cum, expected):
+            self.assertAlmostEqual(got, want, places=9)
+
+        if route_ingest.np is not None:
+            numpy_cum = route_ingest._cumulative_miles_numpy(lons, lats)
+            for got, want in zip(numpy_cum, expected):
+                self.assertAlmostEqual(got, want, places=9)
+
+    def test_ingest_polyline_builds_route_geometry(self):
+        geometry = route_ingest.ingest_polyline(self.encoded)
+        self.assertEqual(len(geometry), len(self.points))
+        self.assertEqual(geometry.miles[0], 0.0)
+        self.assertGreater(geometry.total_miles, 0)
+        self.assertEqual(geometry.slice(0, 0), [self.points[0]])
+
+    def test_empty_polyline(self):
+        geometry = route_ingest.ingest_polyline("")
+        self.assertEqual(len(geometry), 0)
@@ -0,0 +1,160 @@
+"""
+Tests for single-flight coalescing of concurrent upstream calls.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from trips.services import geocode, ors
+from trips.services.single_flight import SingleFlight
+from trips.tests.helpers import mock_response, ors_directions_payload
+from trips.utils import metrics
+
+COORDS = [[-87.63, 41.88], [-86.16, 39.77], [-96.80, 32.78]]
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "default"},
+    "shared": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "single-flight-tests"},
+}
+
+
+def run_concurrently(count, fn):
+    """Call fn() from `count` threads released together; returns their results."""
+    barrier = threading.Barrier(count)
+
+    def call():
+        barrier.wait()
+        return fn()
+
+    with ThreadPoolExecutor(max_workers=count) as pool:
+        return list(pool.map(lambda _: call(), range(count)))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SingleFlightTests(SimpleTestCase):
+
+    def setUp(self):
+        metrics.reset()
+        caches["shared"].clear()
+        self.flight = SingleFlight("test", wait=5.0, poll_interval=0.01)
+        self.store = {}
+        self.calls = 0
+
+    def slow_compute(self, value="result", delay=0.1):
+        def compute():
+            self.calls += 1
+            time.sleep(delay)
+            self.store["key"] = value
+            return value
+        return compute
+
+    def lookup(self):
+        return self.store.get("key")
+
+    def test_concurrent_callers_share_one_call(self):
+        results = run_concurrently(8, lambda: self.flight.do("key", self.slow_compute(), self.lookup))
+
+        self.assertEqual(results, ["result"] * 8)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(metrics.get_counter("singleflight.test.leaders"), 1)
+        self.assertEqual(metrics.get_counter("singleflight.test.collapsed"), 7)
+        self.assertEqual(self.flight.in_flight(), 0)
+        self.assertIsNone(caches["shared"].get("singleflight:key"))
+
+    def test_different_keys_are_not_coalesced(self):
+        keys = iter(["a", "b", "c"])
+        lock = threading.Lock()
+
+        def call():
+            with lock:
+                key = next(keys)
+            return self.flight.do(key, self.slow_compute(key), lambda: None)
+
+        self.assertEqual(sorted(run_concurrently(3, call)), ["a", "b", "c"])
+        self.assertEqual(self.calls, 3)
+
+    def test_leader_error_reaches_waiters_and_is_not_kept(self):
+        def failing():
+            time.sleep(0.1)
+            raise ConnectionError("upstream down")
+
+        def call():
+            try:
+                return self.flight.do("key", failing, self.lookup)
+            except ConnectionError as exc:
+                return str(exc)
+
+        self.assertEqual(run_concurrently(4, call), ["upstream down"] * 4)
+        self.assertEqual(self.flight.do("key", self.slow_compute(delay=0), self.lookup), "result")
+
+    def test_waits_for_a_lock_held_by_another_worker(self):
+        caches["shared"].add("singleflight:key", "other-worker", timeout=30)
+        threading.Timer(0.1, lambda: self.store.update(key="theirs")).start()
+
+        result = self.flight.do("key", self.slow_compute(), self.lookup)
+
+        self.assertEqual(result, "theirs")
+        self.assertEqual(self.calls, 0)
+        self.assertEqual(metrics.get_counter("singleflight.test.collapsed_remote"), 1)
+
+    def test_takes_over_when_the_holder_gives_up(self):
+        caches["shared"].add("singleflight:key", "other-worker", timeout=30)
+        threading.Timer(0.1, lambda: caches["shared"].delete("singleflight:key")).start()
+
+        result = self.flight.do("key", self.slow_compute(delay=0), self.lookup)
+
+        self.assertEqual(result, "result")
+        self.assertEqual(self.calls, 1)
+
+    def test_wait_is_bounded(self):
+        flight = SingleFlight("test", wait=0.1, poll_interval=0.01)
+        caches["shared"].add("singleflight:key", "stuck-worker", timeout=30)
+
+        result = flight.do("key", self.slow_compute(delay=0), self.lookup)
+
+        self.assertEqual(result, "result")
+        self.assertEqual(metrics.get_counter("singleflight.test.wait_timeouts"), 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class UpstreamCoalescingTests(SimpleTestCase):
+
+    def setUp(self):
+        metrics.reset()
+        caches["shared"].clear()
+        ors.route_cache.clear_local()
+        geocode.geocode_cache.clear_local()
+        ors.ors_client.breaker.record_success()
+        geocode.nominatim_client.breaker.record_success()
+        rate = patch.object(geocode.nominatim_bucket, "rate", 1000.0)
+        rate.start()
+        self.addCleanup(rate.stop)
+
+    def slow(self, payload):
+        def respond(*args, **kwargs):
+            time.sleep(0.1)
+            return mock_response(payload)
+        return respond
+
+    def test_concurrent_identical_routes_make_one_ors_call(self):
+        with patch.object(ors.ors_client.session, "request", side_effect=self.slow(ors_directions_payload())) as upstream:
+            routes = run_concurrently(5, lambda: ors.get_route(COORDS))
+
+        upstream.assert_called_once()
+        self.assertEqual({route["distance_miles"] for route in routes}, {routes[0]["distance_miles"]})
+        # Every caller gets its own copy, as from any cache hit
+        self.assertEqual(len({id(route) for route in routes}), 5)
+        self.assertEqual(metrics.get_counter("singleflight.ors.collapsed"), 4)
+
+    def test_concurrent_identical_searches_make_one_nominatim_call(self):
+        places = [{"place_id": 1, "display_name": "Chicago, Illinois", "lat": "41.88", "lon": "-87.63"}]
+        with patch.object(geocode.nominatim_client.session, "request", side_effect=self.slow(places)) as upstream:
+            results = run_concurrently(6, lambda: geocode.search_places("Chicago"))
+
+        upstream.assert_called_once()
+        self.assertEqual({result[0]["display_name"] for result in results}, {"Chicago, Illinois"})
+        self.assertEqual(metrics.get_counter("singleflight.nominatim.collapsed"), 5)
+        self.assertEqual(geocode.geocode_cache.stats()["misses"], 1)
@@ -0,0 +1,179 @@
+"""
+Tests for the compiled SVG log-sheet template, checked against the old
+ElementTree renderer.
+"""
+import copy
+import random
+import tempfile
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from trips.services import svg_log_sheet
+from trips.services.svg_log_sheet import (
+    LOG_SHEET_SYMBOL_ID, MINUTES_PER_DAY, OPTIMIZED_SVG_PATH, SVG_NS, SVG_PATH, compile_template,
+    inject_duty_periods_into_svg, optimize_template, render_log_document, render_svgs,
+)
+from trips.tests.reference_svg_log_sheet import tree_inject_duty_periods_into_svg
+
+STATUSES = ["off_duty", "sleeper_berth", "driving", "on_duty"]
+
+
+def random_log(rng, day):
+    minute = rng.randint(0, 300)
+    periods = []
+    while minute < MINUTES_PER_DAY - 1:
+        end = min(minute + rng.randint(1, 600), MINUTES_PER_DAY - 1)
+        periods.append({
+            "status": rng.choice(STATUSES),
+            "start": f"{minute // 60:02d}:{minute % 60:02d}",
+            "end": f"{end // 60:02d}:{end % 60:02d}",
+        })
+        minute = end
+        if rng.random() < 0.2:
+            break
+    return {
+        "date": f"2026-03-{day:02d}", "day": day, "month": "March", "year": 2026,
+        "from_location": "Chicago, IL", "to_location": "Dallas & Fort Worth, TX",
+        "duty_periods": periods,
+        "total_miles": round(rng.uniform(0, 700), 2),
+        "total_hours": 0, "off_duty_total": 0, "sleeper_berth_total": 0,
+        "driving_total": 0, "on_duty_total": 0,
+    }
+
+
+def canonical(path: Path) -> str:
+    return ET.canonicalize(from_file=str(path), strip_text=True)
+
+
+class CompiledTemplateTests(SimpleTestCase):
+
+    def test_output_matches_element_tree_renderer(self):
+        rng = random.Random(13)
+        logs = [random_log(rng, day) for day in range(1, 29)]
+        logs.append({**random_log(rng, 29), "duty_periods": []})
+
+        with tempfile.TemporaryDirectory() as tmp:
+            new_dir, old_dir = Path(tmp) / "new", Path(tmp) / "old"
+            new_logs, old_logs = copy.deepcopy(logs), copy.deepcopy(logs)
+            inject_duty_periods_into_svg(new_logs, 1, output_dir=new_dir)
+            tree_inject_duty_periods_into_svg(old_logs, 1, output_dir=old_dir)
+
+            self.assertEqual(new_logs, old_logs)
+            for log in logs:
+                name = f"1/logs/output-{log['date']}.svg"
+                with self.subTest(date=log["date"]):
+                    self.assertEqual(canonical(new_dir / name), canonical(old_dir / name))
+
+    def test_template_is_compiled_once(self):
+        self.assertIs(compile_template(SVG_PATH), compile_template(SVG_PATH))
+
+    def test_x_table_covers_the_whole_day(self):
+        template = compile_template(SVG_PATH)
+        self.assertEqual(len(template.x_table), MINUTES_PER_DAY + 1)
+        self.assertLess(template.x_for("00:00"), template.x_for("12:00"))
+        self.assertLess(template.x_for("12:00"), template.x_for("24:00"))
+        self.assertEqual(set(template.y_map), set(STATUSES))
+
+
+class ParallelRenderTests(SimpleTestCase):
+
+    def render(self, logs, workers):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        inject_duty_periods_into_svg(logs, 7, output_dir=Path(tmp.name), workers=workers)
+        log_dir = Path(tmp.name) / "7" / "logs"
+        return {path.name: path.read_bytes() for path in log_dir.iterdir()}
+
+    def test_parallel_output_matches_serial(self):
+        rng = random.Random(14)
+        logs = [random_log(rng, day) for day in range(1, 11)]
+        serial_logs, parallel_logs = copy.deepcopy(logs), copy.deepcopy(logs)
+
+        serial = self.render(serial_logs, workers=1)
+        parallel = self.render(parallel_logs, workers=3)
+
+        self.assertEqual(sorted(parallel), [f"output-2026-03-{day:02d}.svg" for day in range(1, 11)])
+        self.assertEqual(parallel, serial)
+        # Prepared logs are copied back from the workers
+        self.assertEqual(parallel_logs, serial_logs)
+
+    def test_pools_are_kept_per_worker_count(self):
+        rng = random.Random(16)
+        logs = [random_log(rng, day) for day in range(1, 5)]
+
+        with patch.dict(svg_log_sheet._process_pools, clear=True):
+            self.render(copy.deepcopy(logs), workers=2)
+            pool = svg_log_sheet._process_pools[2]
+            # A short trip under a larger setting neither resizes nor shuts down the pool in use
+            self.render(copy.deepcopy(logs[:2]), workers=3)
+            self.render(copy.deepcopy(logs[:3]), workers=2)
+            self.assertIs(svg_log_sheet._process_pools[2], pool)
+            self.assertEqual(sorted(svg_log_sheet._process_pools), [2, 3])
+            for created in svg_log_sheet._process_pools.values():
+                created.shutdown()
+
+    def test_falls_back_to_threads_without_fork(self):
+        rng = random.Random(15)
+        logs = [random_log(rng, day) for day in range(1, 5)]
+        expected = self.render(copy.deepcopy(logs), workers=1)
+
+        with patch.dict(svg_log_sheet._process_pools, clear=True), \
+                patch.object(svg_log_sheet.multiprocessing, "get_context", side_effect=ValueError("no fork")), \
+                patch.object(svg_log_sheet, "ThreadPoolExecutor", wraps=svg_log_sheet.ThreadPoolExecutor) as threads:
+            self.assertEqual(self.render(logs, workers=2), expected)
+        threads.assert_called_once_with(max_workers=2)
+
+
+def shape(element):
+    """Comparable (tag, attributes, text) of an element and its subtree."""
+    return [(el.tag.rsplit("}", 1)[-1], el.attrib, (el.text or "").strip()) for el in element.iter()]
+
+
+class LogDocumentTests(SimpleTestCase):
+
+    def test_optimized_asset_is_up_to_date(self):
+        self.assertEqual(OPTIMIZED_SVG_PATH.read_bytes(), optimize_template(SVG_PATH.read_bytes()))
+
+    def test_optimized_template_keeps_only_referenced_ids(self):
+        source = SVG_PATH.read_bytes()
+        optimized = optimize_template(source)
+        root = ET.fromstring(optimized)
+
+        self.assertLess(len(optimized), len(source))
+        ids = {el.attrib["id"] for el in root.iter() if "id" in el.attrib}
+        self.assertTrue(ids)
+        self.assertTrue(all(f"url(#{id_})".encode() in optimized for id_ in ids))
+        self.assertIsNone(root.find(".//svg:title", SVG_NS))
+        self.assertNotIn(b"data-name", optimized)
+        self.assertEqual(root.attrib["viewBox"], ET.fromstring(source).attrib["viewBox"])
+
+    def test_document_uses_one_symbol_and_each_days_fragments(self):
+        rng = random.Random(16)
+        logs = [random_log(rng, day) for day in range(1, 6)]
+        with tempfile.TemporaryDirectory() as tmp:
+            files = [Path(tmp) / f"{day}.svg" for day in range(5)]
+            render_svgs(logs, files, workers=1)
+            pages = [path.read_bytes() for path in files]
+
+        document = render_log_document(pages)
+        root = ET.fromstring(document)
+
+        self.assertEqual(root.attrib["viewBox"], f"0 0 598 {772 * 5}")
+        self.assertEqual(len(root.findall(".//svg:symbol", SVG_NS)), 1)
+        self.assertEqual(document.count(b'<line class="cls-3" x1="44.65" y1="48.95"'), 1)  # grid drawn once
+        days = root.findall("svg:g", SVG_NS)
+        self.assertEqual(len(days), 5)
+        blank = len(ET.fromstring(SVG_PATH.read_bytes()))
+        for i, (day, page) in enumerate(zip(days, pages)):
+            with self.subTest(day=i):
+                self.assertEqual(day.attrib["transform"], f"translate(0 {772 * i})")
+                self.assertEqual(day[0].attrib["href"], f"#{LOG_SHEET_SYMBOL_ID}")
+                drawn = list(ET.fromstring(page))[blank:]
+                self.assertEqual([shape(el) for el in day[1:]], [shape(el) for el in drawn])
+
+    def test_document_rejects_pages_from_another_template(self):
+        with self.assertRaises(ValueError):
+            render_log_document([b"<svg/>"])
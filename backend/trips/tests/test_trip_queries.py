@@ -0,0 +1,58 @@
+"""
+Query-count regression tests for the trip list and detail endpoints.
+"""
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from trips.tests.helpers import add_legs, create_trip
+
+User = get_user_model()
+
+# COUNT for pagination, trips (+ user join), legs, steps
+LIST_QUERIES = 4
+# COUNT for pagination, trips (summary columns only)
+SUMMARY_LIST_QUERIES = 2
+# trip (+ user join), legs, steps
+RETRIEVE_QUERIES = 3
+
+
+class TripQueryCountTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="dispatch@example.com", first_name="Dis", last_name="Patch", password="pass12345"
+        )
+        token = str(AccessToken.for_user(self.user))
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.list_url = reverse("trip-list")
+
+    def test_list_query_count_is_constant(self):
+        for trips, legs in [(1, 2), (5, 12)]:
+            for _ in range(trips):
+                add_legs(create_trip(user=self.user), legs)
+            # + 1 for the authenticated user lookup
+            with self.assertNumQueries(LIST_QUERIES + 1):
+                res = self.client.get(self.list_url, {"expand": "legs"})
+            self.assertEqual(res.status_code, 200)
+
+        self.assertEqual(res.data["count"], 6)
+        self.assertEqual(len(res.data["results"][0]["legs"]), 12)
+        self.assertEqual(len(res.data["results"][0]["legs"][0]["steps"]), 2)
+
+    def test_retrieve_query_count_is_constant(self):
+        for legs in (1, 25):
+            trip = create_trip(user=self.user)
+            add_legs(trip, legs, steps_per_leg=3)
+            with self.assertNumQueries(RETRIEVE_QUERIES + 1):
+                res = self.client.get(reverse("trip-detail", args=[trip.id]))
+            self.assertEqual(len(res.data["legs"]), legs)
+
+    def test_anonymous_list_query_count(self):
+        self.client.credentials()
+        for _ in range(3):
+            add_legs(create_trip(), 4)
+        with self.assertNumQueries(SUMMARY_LIST_QUERIES):
+            res = self.client.get(self.list_url)
+        self.assertEqual(res.data["count"], 3)
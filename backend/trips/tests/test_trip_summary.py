@@ -0,0 +1,65 @@
+"""
+Tests for the summary list serializer, ?expand=legs and ?fields= sparse fieldsets.
+"""
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from trips.serializers import TripSummarySerializer
+from trips.tests.helpers import add_legs, create_trip
+
+
+class TripSummaryListTests(APITestCase):
+
+    def setUp(self):
+        self.trip = create_trip(name="Chicago run")
+        add_legs(self.trip, 3)
+        self.list_url = reverse("trip-list")
+        self.detail_url = reverse("trip-detail", args=[self.trip.id])
+
+    def test_list_defaults_to_summary_rows(self):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(self.list_url)
+
+        row = res.data["results"][0]
+        self.assertEqual(set(row), set(TripSummarySerializer.Meta.fields))
+        self.assertEqual(row["name"], "Chicago run")
+        sql = " ".join(q["sql"] for q in ctx.captured_queries)
+        self.assertNotIn("polyline_geometry", sql)
+        self.assertNotIn("trips_tripleg", sql)
+        self.assertNotIn("current_location_lat", sql)
+
+    def test_list_expand_legs_nests_full_legs(self):
+        res = self.client.get(self.list_url, {"expand": "legs"})
+
+        row = res.data["results"][0]
+        self.assertEqual(len(row["legs"]), 3)
+        self.assertIn("polyline_geometry", row["legs"][0])
+        self.assertIn("current_location_lat", row)
+
+    def test_list_sparse_fields(self):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(self.list_url, {"fields": "id,name,dropoff_location_lat"})
+
+        self.assertEqual(set(res.data["results"][0]), {"id", "name", "dropoff_location_lat"})
+        trip_sql = ctx.captured_queries[-1]["sql"]
+        self.assertNotIn("pickup_location_label", trip_sql)
+
+    def test_retrieve_keeps_legs_by_default(self):
+        res = self.client.get(self.detail_url)
+
+        self.assertEqual(len(res.data["legs"]), 3)
+        self.assertIn("steps", res.data["legs"][0])
+
+    def test_retrieve_sparse_fields_skip_legs(self):
+        with self.assertNumQueries(1):
+            res = self.client.get(self.detail_url, {"fields": "id,planned_distance_miles"})
+
+        self.assertEqual(set(res.data), {"id", "planned_distance_miles"})
+
+    def test_retrieve_sparse_fields_with_legs(self):
+        res = self.client.get(self.detail_url, {"fields": "id,legs"})
+
+        self.assertEqual(set(res.data), {"id", "legs"})
+        self.assertEqual(len(res.data["legs"]), 3)
@@ -0,0 +1,167 @@
+"""
+Tests for the local ORS/Nominatim stand-in (benchmarks.upstream_stub).
+"""
+import tempfile
+import time
+from unittest.mock import patch
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from trips.benchmarks.upstream_stub import UpstreamStub, synthetic_route
+from trips.models import TripLeg
+from trips.services import geocode, ors
+from trips.services.plan import plan_trip
+from trips.services.route_ingest import build_route_geometry
+from trips.tests.helpers import create_trip
+
+COORDS = [[-87.63, 41.88], [-86.16, 39.77], [-96.80, 32.78]]
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "default"},
+    "shared": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "upstream-stub-tests"},
+}
+
+
+def reset_upstreams():
+    ors.route_cache.clear_local()
+    geocode.geocode_cache.clear_local()
+    caches["shared"].clear()
+    ors.ors_client.breaker.record_success()
+    geocode.nominatim_client.breaker.record_success()
+
+
+class SyntheticRouteTests(SimpleTestCase):
+
+    def miles(self, lons, lats):
+        return build_route_geometry(lons, lats).miles[-1]
+
+    def test_route_has_the_requested_length(self):
+        for miles in (1000.0, 1500.0, 5000.0):
+            lons, lats, _ = synthetic_route(COORDS, miles)
+            self.assertAlmostEqual(self.miles(lons, lats), miles, delta=miles * 0.01)
+
+    def test_default_length_is_the_straight_line_times_the_road_factor(self):
+        straight = self.miles(*synthetic_route(COORDS, vertices=3)[:2])
+        self.assertAlmostEqual(self.miles(*synthetic_route(COORDS)[:2]), straight * 1.2, delta=straight * 0.012)
+
+    def test_route_is_never_shorter_than_the_straight_line(self):
+        straight = self.miles(*synthetic_route(COORDS, vertices=3)[:2])
+        lons, lats, _ = synthetic_route(COORDS, 100.0)
+        self.assertAlmostEqual(self.miles(lons, lats), straight, delta=1.0)
+
+    def test_vertex_density_and_waypoints(self):
+        lons, lats, way_points = synthetic_route(COORDS, 1500.0, vertices_per_mile=2)
+        self.assertEqual(len(lons), 3001)
+
+        lons, lats, way_points = synthetic_route(COORDS, 1500.0, vertices=10_000, precision=None)
+        self.assertAlmostEqual(len(lons), 10_000, delta=2)
+        self.assertEqual(way_points[0], 0)
+        self.assertEqual(way_points[-1], len(lons) - 1)
+        self.assertEqual([[lons[i], lats[i]] for i in way_points], COORDS)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, GEOCODER_MODE="nominatim")
+class UpstreamStubTests(SimpleTestCase):
+
+    def setUp(self):
+        reset_upstreams()
+        self.addCleanup(reset_upstreams)
+        rate = patch.object(geocode.nominatim_bucket, "rate", 1000.0)
+        rate.start()
+        self.addCleanup(rate.stop)
+
+    def test_directions_are_parsed_by_get_route(self):
+        stub = UpstreamStub(route_miles=1500.0)
+        with stub.running(), override_settings(**stub.settings()):
+            route = ors.get_route(COORDS)
+            ors.get_route(COORDS)
+
+        self.assertAlmostEqual(float(route["distance_miles"]), 1500.0, delta=15.0)
+        self.assertAlmostEqual(route["geometry"].total_miles, float(route["distance_miles"]), delta=1.0)
+        self.assertEqual(len(route["segments"]), 2)
+        last_step = route["segments"][-1]["steps"][-1]
+        self.assertEqual([last_step["end_lon"], last_step["end_lat"]], COORDS[-1])
+        self.assertEqual(stub.requests["directions"], 1)
+
+    def test_optimization_is_parsed_by_get_optimized_route(self):
+        stub = UpstreamStub(route_miles=1500.0)
+        with stub.running(), override_settings(**stub.settings()):
+            route = ors.get_optimized_route(COORDS)
+
+        self.assertAlmostEqual(float(route["distance_miles"]), 1500.0, delta=15.0)
+        self.assertAlmostEqual(route["geometry"].total_miles, 1500.0, delta=15.0)
+        self.assertEqual(stub.requests["optimization"], 1)
+
+    def test_search_and_reverse(self):
+        stub = UpstreamStub()
+        with stub.running(), override_settings(**stub.settings()):
+            places = geocode.search_places("springfield")
+            again = geocode.search_places("Springfield")
+            place = geocode.reverse_geocode(41.88, -87.63)
+
+        self.assertEqual(places[0]["display_name"], "Springfield, United States")
+        self.assertEqual(again, places)
+        self.assertIn("41.880", place["display_name"])
+        self.assertEqual(stub.requests, {"search": 1, "reverse": 1})
+
+    @patch("trips.services.http_client.time.sleep")
+    def test_injected_errors_reach_the_caller(self, patched_sleep):
+        stub = UpstreamStub(error_rate=1.0, error_status=503)
+        with stub.running(), override_settings(**stub.settings()):
+            with self.assertRaisesMessage(Exception, "ORS Error: 503"):
+                ors.get_route(COORDS)
+
+        self.assertEqual(stub.errors, stub.requests["directions"])
+        self.assertGreater(stub.errors, 1)
+
+    def test_answers_wait_for_the_latency(self):
+        stub = UpstreamStub(latency=0.2)
+        with stub.running(), override_settings(**stub.settings()):
+            start = time.perf_counter()
+            geocode.search_places("latency")
+            elapsed = time.perf_counter() - start
+
+        self.assertGreaterEqual(elapsed, 0.2)
+
+    def test_recorded_answers_are_replayed(self):
+        fixtures = tempfile.TemporaryDirectory()
+        self.addCleanup(fixtures.cleanup)
+
+        # Stands in for the real API while recording
+        origin = UpstreamStub(route_miles=1200.0)
+        with origin.running():
+            recorder = UpstreamStub(fixtures=fixtures.name, record=True,
+                                    ors_upstream=origin.url, nominatim_upstream=origin.url)
+            with recorder.running(), override_settings(**recorder.settings()):
+                recorded = ors.get_route(COORDS)
+        self.assertEqual(recorder.recorded, 1)
+        self.assertEqual(origin.requests["directions"], 1)
+
+        reset_upstreams()
+        replay = UpstreamStub(fixtures=fixtures.name)
+        with replay.running(), override_settings(**replay.settings()):
+            replayed = ors.get_route(COORDS)
+
+        self.assertEqual(replay.fixture_hits, 1)
+        self.assertEqual(replayed["distance_miles"], recorded["distance_miles"])
+        self.assertEqual(list(replayed["geometry"].miles), list(recorded["geometry"].miles))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PlanTripAgainstStubTests(TestCase):
+
+    def setUp(self):
+        reset_upstreams()
+        self.addCleanup(reset_upstreams)
+
+    def test_long_route_is_planned_offline(self):
+        stub = UpstreamStub(route_miles=3000.0, vertices_per_mile=20)
+        trip = create_trip(current_cycle_hours=40)
+        with stub.running(), override_settings(**stub.settings()):
+            plan_trip(trip)
+
+        legs = TripLeg.objects.filter(trip=trip)
+        self.assertGreater(legs.count(), 20)
+        driven = sum(float(leg.distance_miles) for leg in legs)
+        self.assertAlmostEqual(driven, 3000.0, delta=60.0)
+        self.assertTrue(trip.daily_logs.exists())
@@ -1,12 +1,21 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import TripViewSet
-from .views import GeocodeSearchView, GeocodeReverseView
+from .views import GeocodeSearchView, GeocodeReverseView, MetricsView
+from .views import AsyncGeocodeSearchView, AsyncGeocodeReverseView
 router = DefaultRouter()
 router.register(r"trips", TripViewSet, basename="trip")
 
+# Under ASGI the geocode views wait on Nominatim without holding a thread
+if getattr(settings, "ASYNC_UPSTREAM_VIEWS", False):
+    search_view, reverse_view = AsyncGeocodeSearchView, AsyncGeocodeReverseView
+else:
+    search_view, reverse_view = GeocodeSearchView, GeocodeReverseView
+
 urlpatterns = [
     path("", include(router.urls)),
-    path("geocode/search/", GeocodeSearchView.as_view(), name="geocode-search"),
-    path("geocode/reverse/", GeocodeReverseView.as_view(), name="geocode-reverse"),
+    path("geocode/search/", search_view.as_view(), name="geocode-search"),
+    path("geocode/reverse/", reverse_view.as_view(), name="geocode-reverse"),
+    path("metrics/", MetricsView.as_view(), name="trip-metrics"),
 ]
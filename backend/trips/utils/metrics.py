@@ -0,0 +1,63 @@
+"""
+Tiny in-process metrics registry.
+
+Counters are per worker process; the metrics endpoint reports the values
+of whichever worker serves the request.
+"""
+import bisect
+import threading
+from collections import defaultdict
+
+# Upper bounds (seconds) for latency histograms; the last bucket is +Inf
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_histograms = {}
+
+
+def incr(name: str, amount: int = 1):
+    with _lock:
+        _counters[name] += amount
+
+
+def get_counter(name: str) -> int:
+    return _counters.get(name, 0)
+
+
+def observe(name: str, value: float, buckets=LATENCY_BUCKETS):
+    """Record one observation in a fixed-bucket histogram."""
+    with _lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = _histograms[name] = {
+                "buckets": list(buckets),
+                "counts": [0] * (len(buckets) + 1),
+                "count": 0,
+                "sum": 0.0,
+            }
+        hist["counts"][bisect.bisect_left(hist["buckets"], value)] += 1
+        hist["count"] += 1
+        hist["sum"] += value
+
+
+def snapshot() -> dict:
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "histograms": {
+                name: {
+                    "buckets": [*hist["buckets"], "+Inf"],
+                    "counts": list(hist["counts"]),
+                    "count": hist["count"],
+                    "sum": round(hist["sum"], 6),
+                }
+                for name, hist in _histograms.items()
+            },
+        }
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
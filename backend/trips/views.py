@@ -1,30 +1,59 @@
-from django.core.cache import cache
 from django.utils.hashable import make_hashable
 from rest_framework.views import APIView
 from rest_framework import viewsets, status
-from .models import Trip
-from .serializers import TripSerializer
+from django.db.models import Prefetch
+from .models import Trip, TripLeg, TripSegmentStep, DailyLog
+from .serializers import TripSerializer, TripSummarySerializer, PlanJobSerializer
 from .services.plan import plan_trip
+from .services.plan_jobs import async_planning_requested, enqueue_plan
 from core.authentication import CustomJWTAuthentication
 from rest_framework.permissions import AllowAny
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from .services.generate_daily_logs import generate_daily_logs
+from .services.generate_daily_logs import daily_log_as_dict, get_daily_logs
 from .serializers import DailyLogSheetSerializer
 from drf_spectacular.utils import extend_schema
 from drf_spectacular.utils import OpenApiParameter
+from drf_spectacular.types import OpenApiTypes
+import inspect
+import math
 import requests
-from .utils.cache_keys import make_cache_key
+from asgiref.sync import sync_to_async
+from .services.geocode import (
+    GEOCODER_LOCAL, GEOCODER_NOMINATIM, areverse_geocode, asearch_places, geocode_cache, geocoder_mode,
+    nominatim_bucket, reverse_geocode, reverse_place, search_places,
+)
+from .services.rate_limit import RateLimited
 from .serializers import GeocodeResultSerializer
 from .serializers import GeocodeReverseResultSerializer, SvgLogListSerializer, GenericDetailMessageSerializer
-from .services.svg_log_sheet import inject_duty_periods_into_svg
-from django.conf import settings
-from pathlib import Path
-from django.http import HttpResponse
-import cairosvg
-from io import BytesIO
-from PyPDF2 import PdfMerger
+from django.urls import reverse
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+from .services.artifacts import get_store
+from .services.log_artifacts import (
+    bundle_digest, ensure_trip_svgs, pdf_etag, rendered_trip_svgs, trip_log_document,
+)
+from .services.log_pdf import build_logs_pdf
+from .renderers import SvgRenderer
+from django.utils.decorators import method_decorator
+from django.views.decorators.gzip import gzip_page
 from core.utils.security import reject_if_untrusted
+from core.permissions import IsSuperUser
+from .utils import metrics
+from .services.ors import route_cache
+
+def etag_matches(request, etag) -> bool:
+    """Weak If-None-Match comparison (GZipMiddleware weakens the ETags it compresses)."""
+    if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+    return "*" in if_none_match or etag in {tag.removeprefix("W/") for tag in if_none_match}
+
+
+def rate_limited_response(exc: RateLimited):
+    """503 with Retry-After for a Nominatim call that found no free rate-limit slot."""
+    response = Response({"detail": "Geocoding service busy. Try again shortly."}, status=503)
+    response["Retry-After"] = str(math.ceil(exc.retry_after))
+    return response
+
 
 class TripViewSet(viewsets.ModelViewSet):
     serializer_class = TripSerializer
@@ -33,12 +62,114 @@ class TripViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         if self.request.user and not self.request.user.is_anonymous:
-            return Trip.objects.filter(user=self.request.user).order_by("-planned_at")
-        return Trip.objects.filter(user=None).order_by("-planned_at")
+            queryset = Trip.objects.filter(user=self.request.user)
+        else:
+            queryset = Trip.objects.filter(user=None)
+        queryset = queryset.order_by("-planned_at")
+        if self.action not in ("list", "retrieve"):
+            return self._with_legs(queryset)
+
+        fields = self._requested_fields()
+        if fields is None and self._include_legs():
+            return self._with_legs(queryset)
+
+        # Sparse or summary rows: read only the trip columns the response emits
+        queryset = queryset.only(*self._trip_columns(
+            TripSummarySerializer.Meta.fields if fields is None else fields
+        ))
+        if self._include_legs():
+            queryset = queryset.prefetch_related(*self._leg_prefetches())
+        return queryset
+
+    def _with_legs(self, queryset):
+        # One query each for trips, legs and steps, however many rows the page has
+        return queryset.select_related("user").prefetch_related(*self._leg_prefetches())
+
+    @staticmethod
+    def _leg_prefetches():
+        return (
+            Prefetch("legs", queryset=TripLeg.objects.order_by("leg_order")),
+            Prefetch("legs__steps", queryset=TripSegmentStep.objects.order_by("step_order")),
+        )
+
+    @staticmethod
+    def _trip_columns(names):
+        concrete = {field.name for field in Trip._meta.concrete_fields}
+        return ["id", *sorted(concrete & set(names) - {"id"})]
+
+    def get_serializer_class(self):
+        if self.action == "list" and self._requested_fields() is None and not self._include_legs():
+            return TripSummarySerializer
+        return TripSerializer
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action in ("list", "retrieve"):
+            kwargs.setdefault("fields", self._requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def _requested_fields(self):
+        """Field names from ?fields=a,b,c, or None when the parameter is absent."""
+        raw = getattr(self.request, "query_params", {}).get("fields")
+        if raw is None:
+            return None
+        return {name.strip() for name in raw.split(",") if name.strip()}
+
+    def _include_legs(self) -> bool:
+        """
+        Legs are nested by default on retrieve and only with ?expand=legs on
+        list. An explicit ?fields= list without "legs" leaves them out, one
+        naming "legs" pulls them in.
+        """
+        fields = self._requested_fields()
+        if fields is not None:
+            return "legs" in fields
+        if self.action == "list":
+            expand = getattr(self.request, "query_params", {}).get("expand", "")
+            return "legs" in {name.strip() for name in expand.split(",")}
+        return True
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(name="expand", type=str, description="Comma-separated; \"legs\" nests full legs"),
+            OpenApiParameter(name="fields", type=str, description="Comma-separated fields to return"),
+        ],
+        responses=TripSummarySerializer(many=True),
+        description="List trips as summary rows (no legs or geometry unless expanded)"
+    )
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(name="fields", type=str, description="Comma-separated fields to return"),
+        ],
+        responses=TripSerializer
+    )
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @extend_schema(
+        responses={201: TripSerializer, 202: PlanJobSerializer},
+        description="Create and plan a trip. With async planning (settings.TRIP_PLAN_ASYNC "
+                    "or ?async=true) the trip is saved, planning is queued and 202 is returned."
+    )
+    def create(self, request, *args, **kwargs):
+        if not async_planning_requested(request):
+            return super().create(request, *args, **kwargs)
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        trip = serializer.save(user=self._request_user())
+        job = enqueue_plan(trip)
+        data = PlanJobSerializer(job).data
+        data["status_url"] = request.build_absolute_uri(reverse("trip-plan-status", args=[trip.id]))
+        return Response(data, status=status.HTTP_202_ACCEPTED)
+
+    def _request_user(self):
+        return self.request.user if self.request.user and self.request.user.is_authenticated else None
 
     def perform_create(self, serializer):
-        user = self.request.user if self.request.user and self.request.user.is_authenticated else None
-        trip = serializer.save(user=user)
+        trip = serializer.save(user=self._request_user())
         plan_trip(trip)
 
     def update(self, request, *args, **kwargs):
@@ -54,10 +185,32 @@ class TripViewSet(viewsets.ModelViewSet):
         instance.delete()
 
     @extend_schema(
-    request=None,
-    responses={200: DailyLogSheetSerializer(many=True)},
-    description="Returns FMCSA-style daily logs for a specific trip"
+        responses={200: PlanJobSerializer},
+        description="Status and timings of the latest planning job for this trip"
+    )
+    @action(detail=True, methods=["get"], url_path="plan-status")
+    def plan_status(self, request, pk=None):
+        trip = self.get_object()
+        job = trip.plan_jobs.order_by("-queued_at").first()
+        if job is None:
+            return Response({"detail": "No planning job for this trip"}, status=404)
+        return Response(PlanJobSerializer(job).data)
+
+    @extend_schema(
+        request=None,
+        responses={200: DailyLogSheetSerializer(many=True)},
+        description="Returns FMCSA-style daily logs for a specific trip"
     )
+    @action(detail=True, methods=["get"], url_path="daily-logs")
+    def daily_logs(self, request, pk=None):
+        # Planned trips are answered from the (trip, date) index alone
+        logs = []
+        if str(pk).isdigit():
+            rows = DailyLog.objects.filter(trip_id=pk, trip__user=self._request_user()).order_by("date")
+            logs = [daily_log_as_dict(row) for row in rows]
+        if not logs:
+            logs = get_daily_logs(self.get_object())
+        return Response(DailyLogSheetSerializer(logs, many=True).data)
 
     @extend_schema(
         responses={200: GenericDetailMessageSerializer},
@@ -66,8 +219,7 @@ class TripViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=["post"])
     def generate_svgs(self, request, pk=None):
         trip = self.get_object()
-        logs = generate_daily_logs(trip)
-        inject_duty_periods_into_svg(logs, trip.id)
+        ensure_trip_svgs(trip)
         return Response({"detail": f"SVGs generated for trip {trip.id}"})
 
     @extend_schema(
@@ -77,19 +229,10 @@ class TripViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=["get"])
     def svg_logs(self, request, pk=None):
         trip = self.get_object()
-        trip_dir = Path(settings.MEDIA_ROOT) / str(trip.id) / "logs"
-
-        if not trip_dir.exists():
-            return Response({
-                "count": 0,
-                "svg_urls": []
-            })
-
-        svg_files = sorted(trip_dir.glob("output-*.svg"))
+        store = get_store()
         svg_urls = [
-            request.build_absolute_uri(
-                f"{settings.MEDIA_URL}{trip.id}/logs/{svg_file.name}"
-            ) for svg_file in svg_files
+            request.build_absolute_uri(store.url(path))
+            for _, path in rendered_trip_svgs(trip)
         ]
 
         return Response({
@@ -98,41 +241,91 @@ class TripViewSet(viewsets.ModelViewSet):
         })
 
     @extend_schema(
-        responses={200: "application/pdf"},
-        description="Download all SVG daily logs as a combined PDF"
+        responses={200: "application/pdf", 304: None},
+        description="Download all SVG daily logs as a combined PDF. The response carries an "
+                    "ETag; send it back in If-None-Match to get 304 while the logs are unchanged."
     )
     @action(detail=True, methods=["get"])
     def download_logs(self, request, pk=None):
         trip = self.get_object()
-        trip_dir = Path(settings.MEDIA_ROOT) / str(trip.id) / "logs"
-        svg_files = sorted(trip_dir.glob("output-*.svg"))
+        pages = rendered_trip_svgs(trip)
+
+        if not pages:
+            return HttpResponse("No SVG logs found", status=404)
+
+        keys = [row.svg_key for row, _ in pages]
+        etag = quote_etag(pdf_etag(keys))
+        if etag_matches(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            pdf_path, _ = build_logs_pdf([path for _, path in pages], keys)
+            response = FileResponse(
+                open(pdf_path, "rb"),
+                as_attachment=True,
+                filename=f"DailyLogs-{trip.id}.pdf",
+                content_type="application/pdf",
+            )
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
+    @extend_schema(
+        responses={(200, "image/svg+xml"): OpenApiTypes.BINARY, 304: None},
+        description="All generated daily logs as one SVG document (GET /trips/{id}/logs.svg): the "
+                    "log grid is defined once as a <symbol> and each day, stacked top to bottom, "
+                    "uses it and adds its own lines and text. Gzipped when the client accepts it; "
+                    "carries an ETag for If-None-Match."
+    )
+    @action(detail=True, methods=["get"], url_path="logs", renderer_classes=[SvgRenderer])
+    @method_decorator(gzip_page)
+    def logs_document(self, request, pk=None, format=None):
+        trip = self.get_object()
+        pages = rendered_trip_svgs(trip)
 
-        if not svg_files:
+        if not pages:
             return HttpResponse("No SVG logs found", status=404)
 
-        # Convert each SVG to a PDF in memory
-        pdf_streams = []
-        for svg_file in svg_files:
-            pdf_bytes = BytesIO()
-            cairosvg.svg2pdf(url=str(svg_file), write_to=pdf_bytes)
-            pdf_bytes.seek(0)
-            pdf_streams.append(pdf_bytes)
-
-        # Merge PDFs into one
-        merger = PdfMerger()
-        for pdf in pdf_streams:
-            merger.append(pdf)
-
-        output_pdf = BytesIO()
-        merger.write(output_pdf)
-        merger.close()
-        output_pdf.seek(0)
-
-        response = HttpResponse(output_pdf.read(), content_type="application/pdf")
-        response["Content-Disposition"] = f'attachment; filename="DailyLogs-{trip.id}.pdf"'
+        etag = quote_etag(bundle_digest([row.svg_key for row, _ in pages]))
+        if etag_matches(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            document, _ = trip_log_document(pages)
+            response = FileResponse(open(document, "rb"), content_type="image/svg+xml")
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
         return response
 
 
+class AsyncAPIView(APIView):
+    """
+    APIView whose handlers are coroutines, for the upstream-bound views
+    served by config.asgi. DRF's request setup (authentication, permissions)
+    may hit the database, so it runs in a thread.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if inspect.isawaitable(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
 class GeocodeSearchView(APIView):
     permission_classes = [AllowAny]
     serializer_class = GeocodeResultSerializer
@@ -141,104 +334,141 @@ class GeocodeSearchView(APIView):
         reject = reject_if_untrusted(request)
         if reject:
             return reject
-        query = request.query_params.get("q", "").strip()
-
-        # Normalize query for cache key
-        normalized_query = " ".join(query.lower().split())
-        if len(normalized_query) < 3:
-            return Response([])
-
-        user_ip = request.META.get("REMOTE_ADDR", "")
-        cache_key = make_cache_key("geocode", user_ip, normalized_query)
-        if cache.get(cache_key):
-            return Response([])
-
-        # Cache the query to avoid hammering Nominatim
-        cache.set(cache_key, True, timeout=10)
-
-        def nominatim_search(q):
-            headers = {
-                "User-Agent": "HOS-Trip-Planner/1.0 (https://hostp.webworkstt.com)",
-            }
-            return requests.get(
-                "https://nominatim.openstreetmap.org/search",
-                params={
-                    "q": q,
-                    "format": "json",
-                    "countrycodes": "us",
-                    "addressdetails": 0,
-                    "limit": 5,
-                    "dedupe": 0,
-                    "accept-language": "en",
-                },
-                headers=headers,
-                timeout=5
-            )
 
-        # Primary search
-        response = nominatim_search(query)
-        data = response.json()
+        try:
+            data = search_places(request.query_params.get("q", "").strip())
+        except requests.RequestException as exc:
+            return self.upstream_error(exc)
+        return self.results(data)
 
-        # Optional fallback: use first word if original query returns nothing
-        if not data and " " in query:
-            fallback = query.split()[0]
-            response = nominatim_search(fallback)
-            data = response.json()
+    @staticmethod
+    def upstream_error(exc):
+        if isinstance(exc, RateLimited):
+            return rate_limited_response(exc)
+        return Response({"detail": "Geocoding service unavailable"}, status=503)
 
+    def results(self, data):
         serializer = self.serializer_class(data=data, many=True)
         serializer.is_valid(raise_exception=True)
         return Response(serializer.data)
 
 
+class AsyncGeocodeSearchView(AsyncAPIView, GeocodeSearchView):
+
+    async def get(self, request):
+        reject = reject_if_untrusted(request)
+        if reject:
+            return reject
+
+        try:
+            data = await asearch_places(request.query_params.get("q", "").strip())
+        except requests.RequestException as exc:
+            return self.upstream_error(exc)
+        return self.results(data)
+
+
+REVERSE_PARAMETERS = [
+    OpenApiParameter(name="lat", required=True, type=str, description="Latitude"),
+    OpenApiParameter(name="lon", required=True, type=str, description="Longitude"),
+]
+
+
 class GeocodeReverseView(APIView):
     permission_classes = [AllowAny]
     serializer_class = GeocodeReverseResultSerializer
 
-    @extend_schema(
-        parameters=[
-            OpenApiParameter(name="lat", required=True, type=str, description="Latitude"),
-            OpenApiParameter(name="lon", required=True, type=str, description="Longitude"),
-        ],
-        responses=GeocodeReverseResultSerializer
-    )
+    @extend_schema(parameters=REVERSE_PARAMETERS, responses=GeocodeReverseResultSerializer)
     def get(self, request):
         reject = reject_if_untrusted(request)
         if reject:
             return reject
+        coordinates = self.coordinates(request)
+        if isinstance(coordinates, Response):
+            return coordinates
+
+        local = self.local_result(*coordinates)
+        if local is not None:
+            return local
+
+        try:
+            data = reverse_geocode(*coordinates)
+        except requests.RequestException as exc:
+            return self.upstream_error(exc)
+        return self.result(data)
+
+    @staticmethod
+    def coordinates(request):
+        """(lat, lon) as floats, or a 400 response."""
         lat = request.query_params.get("lat")
         lon = request.query_params.get("lon")
 
         if not lat or not lon:
             return Response({"detail": "lat and lon are required"}, status=400)
 
-        # Optional: Short-circuit repeated requests from same IP for same coordinates
-        user_ip = request.META.get("REMOTE_ADDR", "")
-        cache_key = make_cache_key("reverse", user_ip, f"{lat},{lon}")
-        if cache.get(cache_key):
-            return Response({"detail": "Too many requests. Try again shortly."}, status=429)
+        try:
+            return float(lat), float(lon)
+        except ValueError:
+            return Response({"detail": "lat and lon must be numbers"}, status=400)
+
+    def local_result(self, lat, lon):
+        """The gazetteer's answer if GEOCODER_MODE uses it, or None to ask Nominatim."""
+        if geocoder_mode() == GEOCODER_NOMINATIM:
+            return None
+        place = reverse_place(lat, lon)
+        if place is not None:
+            return self.result(place)
+        if geocoder_mode() == GEOCODER_LOCAL:
+            return Response({"detail": "No place found near these coordinates"}, status=404)
+        return None
+
+    @staticmethod
+    def upstream_error(exc):
+        if isinstance(exc, RateLimited):
+            return rate_limited_response(exc)
+        if isinstance(exc, requests.HTTPError):
+            return Response({"detail": "Reverse geocoding failed"}, status=exc.response.status_code)
+        return Response({"detail": "Reverse geocoding unavailable"}, status=503)
+
+    def result(self, data):
+        serializer = self.serializer_class(data=data)
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.data)
 
-        # 10-second limit per lat/lon/ip
-        cache.set(cache_key, True, timeout=10)
 
-        headers = {
-            "User-Agent": "HOS-Trip-Planner/1.0 (https://hostp.webworkstt.com)",
-        }
+class AsyncGeocodeReverseView(AsyncAPIView, GeocodeReverseView):
 
-        response = requests.get(
-            "https://nominatim.openstreetmap.org/reverse",
-            params={"format": "json", "lat": lat, "lon": lon, "countrycodes": "us"},
-            headers=headers,
-        )
+    @extend_schema(parameters=REVERSE_PARAMETERS, responses=GeocodeReverseResultSerializer)
+    async def get(self, request):
+        reject = reject_if_untrusted(request)
+        if reject:
+            return reject
+        coordinates = self.coordinates(request)
+        if isinstance(coordinates, Response):
+            return coordinates
 
-        if response.status_code != 200:
-            return Response({"detail": "Reverse geocoding failed"}, status=response.status_code)
+        local = await sync_to_async(self.local_result, thread_sensitive=False)(*coordinates)
+        if local is not None:
+            return local
 
-        data = response.json()
+        try:
+            data = await areverse_geocode(*coordinates)
+        except requests.RequestException as exc:
+            return self.upstream_error(exc)
+        return self.result(data)
 
-        serializer = GeocodeReverseResultSerializer(data={
-            "display_name": data.get("display_name", ""),
-            "lat": data.get("lat", ""),
-            "lon": data.get("lon", "")
-        })
-        serializer.is_valid(raise_exception=True)
-        return Response(serializer.data)
+
+class MetricsView(APIView):
+    """Per-process performance counters (superusers only)."""
+    authentication_classes = [CustomJWTAuthentication]
+    permission_classes = [IsSuperUser]
+
+    @extend_schema(
+        responses={200: dict},
+        description="Cache and upstream counters for the worker serving this request"
+    )
+    def get(self, request):
+        data = metrics.snapshot()
+        data["route_cache"] = route_cache.stats()
+        data["geocode_cache"] = geocode_cache.stats()
+        data["nominatim_rate_limit"] = nominatim_bucket.stats()
+        return Response(data)